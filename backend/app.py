@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, send_file, g, Response, stream_with_context
 import requests
 # --- CSV Sync from Render (if configured) ---
 #RENDER_CSV_URL = os.environ.get('RENDER_CSV_URL')  # e.g. 'https://your-render-app.onrender.com/api/admin/download-csv'
@@ -17,13 +17,33 @@ import requests
 # Call sync before app starts
 #sync_csv_from_render()
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 import pandas as pd
 import random
-import sqlite3
 from datetime import datetime
 import os
-import hashlib
-from question_generator import QuestionGenerator
+import hmac
+import json
+import time
+import audit_log
+import batch_verify
+import bulkhead
+import caches
+import dedupe
+import exports
+import generation_jobs
+import ingest
+import memory_report
+import metrics
+import profiling
+import question_pool
+import rate_limiter
+import review_queue
+import search_index
+import subject_stats
+from db import DB_FILE, USE_POSTGRES, SLOW_QUERY_MS, QUERY_STATS, get_db_connection
+from question_generator import get_question_generator, is_valid_question, migrate_stranded_questions
+from question_utils import compute_question_uid
 
 # Get the port from environment (Replit uses dynamic ports)
 PORT = int(os.environ.get('PORT', 5002))
@@ -35,76 +55,19 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # Configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
-DB_FILE = os.path.join(BASE_DIR, 'data', 'history.db')
-DATABASE_URL = os.environ.get('DATABASE_URL')
-USE_POSTGRES = bool(DATABASE_URL)
 NO_REPEAT_TESTS = 10
-
-class DbCursor:
-    def __init__(self, cursor):
-        self._cursor = cursor
-
-    def execute(self, query, params=None):
-        if USE_POSTGRES:
-            query = query.replace('?', '%s')
-        if params is None:
-            return self._cursor.execute(query)
-        return self._cursor.execute(query, params)
-
-    def executemany(self, query, params):
-        if USE_POSTGRES:
-            query = query.replace('?', '%s')
-        return self._cursor.executemany(query, params)
-
-    def fetchone(self):
-        return self._cursor.fetchone()
-
-    def fetchall(self):
-        return self._cursor.fetchall()
-
-    def __getattr__(self, name):
-        return getattr(self._cursor, name)
-
-class DbConnection:
-    def __init__(self, conn):
-        self._conn = conn
-
-    def cursor(self):
-        return DbCursor(self._conn.cursor())
-
-    def commit(self):
-        return self._conn.commit()
-
-    def rollback(self):
-        return self._conn.rollback()
-
-    def close(self):
-        return self._conn.close()
-
-    def __getattr__(self, name):
-        return getattr(self._conn, name)
-
-def get_db_connection(*_args, **_kwargs):
-    if USE_POSTGRES:
-        import psycopg2
-        return DbConnection(psycopg2.connect(DATABASE_URL))
-    return sqlite3.connect(DB_FILE)
-
-if USE_POSTGRES:
-    sqlite3.connect = get_db_connection
-
-def normalize_text(value):
-    text = str(value or '')
-    text = ' '.join(text.strip().split())
-    return text.lower()
-
-def compute_question_uid(subject, question, options):
-    parts = [normalize_text(subject), normalize_text(question)]
-    parts.extend([normalize_text(opt) for opt in (options or [])])
-    signature = '|'.join(parts)
-    return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+AI_LIVE_QUESTION_COUNT = 10
+AI_STREAM_MAX_QUESTIONS = 30
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
 def get_recent_question_uids(user_id, subject, limit_tests):
+    """Question uids from the user's last ``limit_tests`` tests in ``subject``.
+
+    The test ids are read every time (an indexed lookup), and the uid set is
+    cached under them. A test submitted through any worker changes the key,
+    so no worker can serve a stale set.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -116,10 +79,15 @@ def get_recent_question_uids(user_id, subject, limit_tests):
         LIMIT ?
     ''', (user_id, subject, limit_tests))
 
-    test_ids = [row[0] for row in cursor.fetchall()]
+    test_ids = tuple(row[0] for row in cursor.fetchall())
     if not test_ids:
         conn.close()
-        return set()
+        return frozenset()
+
+    cached = caches.RECENT_UIDS.get(test_ids)
+    if cached is not None:
+        conn.close()
+        return cached
 
     placeholders = ','.join(['?'] * len(test_ids))
     cursor.execute(f'''
@@ -128,8 +96,9 @@ def get_recent_question_uids(user_id, subject, limit_tests):
         WHERE test_id IN ({placeholders}) AND question_uid IS NOT NULL
     ''', test_ids)
 
-    uids = {row[0] for row in cursor.fetchall() if row[0]}
+    uids = frozenset(row[0] for row in cursor.fetchall() if row[0])
     conn.close()
+    caches.RECENT_UIDS.set(test_ids, uids)
     return uids
 
 def format_timestamp(ts_value):
@@ -249,6 +218,58 @@ def init_db():
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_verify_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL,
+                verified INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                error TEXT,
+                worker TEXT,
+                heartbeat DOUBLE PRECISION,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_jobs (
+                id TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                requested INTEGER NOT NULL,
+                chapters TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                generated INTEGER DEFAULT 0,
+                saved INTEGER DEFAULT 0,
+                batches INTEGER DEFAULT 0,
+                error TEXT,
+                worker TEXT,
+                heartbeat DOUBLE PRECISION,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS csv_ingest_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                admin_user TEXT,
+                status TEXT NOT NULL DEFAULT 'running',
+                size_bytes BIGINT DEFAULT 0,
+                rows_read INTEGER DEFAULT 0,
+                inserted INTEGER DEFAULT 0,
+                duplicates INTEGER DEFAULT 0,
+                invalid INTEGER DEFAULT 0,
+                report TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
     else:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS test_history (
@@ -350,6 +371,58 @@ def init_db():
             )
         ''')
 
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_verify_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL,
+                verified INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                error TEXT DEFAULT NULL,
+                worker TEXT DEFAULT NULL,
+                heartbeat REAL DEFAULT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME DEFAULT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_jobs (
+                id TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                requested INTEGER NOT NULL,
+                chapters TEXT DEFAULT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                generated INTEGER DEFAULT 0,
+                saved INTEGER DEFAULT 0,
+                batches INTEGER DEFAULT 0,
+                error TEXT DEFAULT NULL,
+                worker TEXT DEFAULT NULL,
+                heartbeat REAL DEFAULT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME DEFAULT NULL,
+                finished_at DATETIME DEFAULT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS csv_ingest_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT DEFAULT NULL,
+                admin_user TEXT DEFAULT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                size_bytes INTEGER DEFAULT 0,
+                rows_read INTEGER DEFAULT 0,
+                inserted INTEGER DEFAULT 0,
+                duplicates INTEGER DEFAULT 0,
+                invalid INTEGER DEFAULT 0,
+                report TEXT DEFAULT NULL,
+                error TEXT DEFAULT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME DEFAULT NULL
+            )
+        ''')
+
     if USE_POSTGRES:
         cursor.execute('''
             ALTER TABLE question_history
@@ -361,11 +434,76 @@ def init_db():
         if 'question_uid' not in existing_columns:
             cursor.execute('ALTER TABLE question_history ADD COLUMN question_uid TEXT')
 
+    # AI verification verdicts stored alongside each review question
+    verdict_columns = [
+        ('ai_verdict', 'TEXT'),
+        ('ai_correct_option', 'TEXT'),
+        ('ai_explanation', 'TEXT'),
+        ('ai_verified_at', 'TIMESTAMP' if USE_POSTGRES else 'DATETIME'),
+        ('ai_verify_job', 'TEXT'),
+        # Set when ingest dedupe kept a likely near-duplicate for the reviewer to judge
+        ('duplicate_note', 'TEXT'),
+        # Token shared by the rows of one bulk insert, used to read back their ids
+        ('ingest_batch', 'TEXT')
+    ]
+    if USE_POSTGRES:
+        for column, column_type in verdict_columns:
+            cursor.execute(f'ALTER TABLE newly_updated_questions ADD COLUMN IF NOT EXISTS {column} {column_type}')
+    else:
+        cursor.execute("PRAGMA table_info(newly_updated_questions)")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        for column, column_type in verdict_columns:
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE newly_updated_questions ADD COLUMN {column} {column_type}')
+    # Owning worker and liveness of AI verify jobs, for tables created before them
+    verify_job_columns = [('worker', 'TEXT'), ('heartbeat', 'DOUBLE PRECISION' if USE_POSTGRES else 'REAL')]
+    if USE_POSTGRES:
+        for column, column_type in verify_job_columns:
+            cursor.execute(f'ALTER TABLE ai_verify_jobs ADD COLUMN IF NOT EXISTS {column} {column_type}')
+    else:
+        cursor.execute("PRAGMA table_info(ai_verify_jobs)")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        for column, column_type in verify_job_columns:
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE ai_verify_jobs ADD COLUMN {column} {column_type}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_newly_updated_ingest_batch ON newly_updated_questions (ingest_batch)')
+    # Keyset pagination of the admin pending/approved lists
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_newly_updated_status_created
+        ON newly_updated_questions (status, created_at, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_newly_updated_status_subject_created
+        ON newly_updated_questions (status, subject, created_at, id)
+    ''')
+    # Recent-test lookups for the no-repeat rule
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_test_history_user_subject ON test_history (user_id, subject, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_history_test ON question_history (test_id)')
+    # Keyset pagination of the admin actions log
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_admin_actions_timestamp ON admin_actions (timestamp, id)')
+    search_index.create_tables(cursor)
+    subject_stats.create_table(cursor)
+
     conn.commit()
     conn.close()
 
+    # Counts existing rows before the migration below adds to them
+    subject_stats.ensure_built()
+    # Older versions saved generated questions where the review UI never looked
+    migrate_stranded_questions()
+    search_index.ensure_built()
+
 init_db()
 
+def has_admin_token():
+    """True if the request carries the configured ADMIN_TOKEN in X-Admin-Token"""
+    token = request.headers.get('X-Admin-Token')
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def admin_token_ok():
+    """Admin endpoints stay open unless an ADMIN_TOKEN is configured"""
+    return not ADMIN_TOKEN or has_admin_token()
+
 # User Tracking Function
 
 def get_client_ip():
@@ -381,7 +519,7 @@ def get_user_agent():
 def log_visitor(user_id, user_name, visit_type, page_visited):
     """Log visitor activity"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         ip_address = get_client_ip()
@@ -401,12 +539,14 @@ def log_visitor(user_id, user_name, visit_type, page_visited):
 def update_user_session(user_id, user_name):
     """Update or create user session"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if user exists
-        cursor.execute('SELECT id, total_visits FROM user_sessions WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
+        # Check if user exists (known sessions skip the lookup)
+        result = caches.SESSION_STORE.get(user_id) is not None
+        if not result:
+            cursor.execute('SELECT id, total_visits FROM user_sessions WHERE user_id = ?', (user_id,))
+            result = cursor.fetchone() is not None
         
         if result:
             # Update existing user
@@ -424,6 +564,7 @@ def update_user_session(user_id, user_name):
         
         conn.commit()
         conn.close()
+        caches.SESSION_STORE.set(user_id, user_name)
         
     except Exception as e:
         print(f"Error updating user session: {e}")
@@ -431,7 +572,7 @@ def update_user_session(user_id, user_name):
 def log_test_attempt(user_id, user_name, subject, test_id, score, duration_seconds=None):
     """Log test attempt"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -493,12 +634,20 @@ def fix_encoding(text):
     return text
 
 # Load questions from CSV
+@metrics.timed('load_questions')
 def load_questions(subject):
     """Load questions from CSV file for a given subject"""
     try:
-        if not os.path.exists(DATA_FILE):
+        signature = caches.file_signature(DATA_FILE)
+        if signature is None:
             print(f"❌ CSV file not found: {DATA_FILE}")
             return []
+
+        # Parsed per-subject lists are reused until the CSV changes on disk
+        cache_key = subject.lower().strip()
+        cached = caches.QUESTION_BANK.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
         
         print(f"📂 Reading CSV: {DATA_FILE}")
         
@@ -539,6 +688,7 @@ def load_questions(subject):
         
         # Convert to list of dictionaries
         questions = subject_df.to_dict('records')
+        caches.QUESTION_BANK.set(cache_key, (signature, questions))
         
         return questions
         
@@ -549,18 +699,169 @@ def load_questions(subject):
         return []
 
 def log_admin_action(action_type, target_id, details, admin_user='admin'):
-    """Log admin actions"""
+    """Log admin actions (queued and written in batches by audit_log)"""
+    audit_log.record(action_type, target_id, details, admin_user)
+
+def format_ai_question(q, index, subject):
+    """Shape a generated question the way test.js expects"""
+    # Create the options array that the frontend expects
+    options = [
+        q.get('Option A', '').strip(),
+        q.get('Option B', '').strip(),
+        q.get('Option C', '').strip(),
+        q.get('Option D', '').strip()
+    ]
+    
+    # Get the correct answer text
+    correct_letter = q.get('Correct Option', 'A').strip().upper()
+    letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+    correct_index = letter_to_index.get(correct_letter, 0)
+    correct_text = options[correct_index]
+
+    return {
+        'id': index + 1,
+        'question': q.get('Question', '').strip(),
+        'options': options,
+        'option_a': options[0],
+        'option_b': options[1],
+        'option_c': options[2],
+        'option_d': options[3],
+        'correct_option': correct_letter,
+        'correct_answer': correct_text,
+        'explanation': q.get('Explanation', ''),
+        'chapter_name': q.get('Chapter Name', 'General'),
+        'subject': subject,
+        'type': q.get('Type', 'Standard'),
+        'source': 'ai_live'
+    }
+
+def generate_pool_questions(subject, count):
+    return get_question_generator().generate_questions(subject, count=count,
+                                                       priority=rate_limiter.PRIORITY_BACKGROUND)
+
+def subject_catalog():
+    """Sorted subjects of the question bank CSV, cached until the file changes"""
+    signature = caches.file_signature(DATA_FILE)
+    cached = caches.SUBJECT_CATALOG.get('subjects')
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    df = pd.read_csv(DATA_FILE, encoding='utf-8', dtype=str, usecols=['Subject'])
+    # Fix typo in Physics
+    df['Subject'] = df['Subject'].str.replace('Physcis', 'Physics', case=False)
+    # Fix encoding in subject names
+    df['Subject'] = df['Subject'].apply(lambda x: fix_encoding(str(x)) if pd.notna(x) else x)
+    subjects = sorted(df['Subject'].dropna().unique().tolist())
+    caches.SUBJECT_CATALOG.set('subjects', (signature, subjects))
+    return subjects
+
+def is_pool_subject(subject):
+    """Only bank subjects and AI_POOL_SUBJECTS get a warm pool, not any string in a URL"""
+    key = str(subject or '').strip().lower()
+    allowed = [s.strip().lower() for s in question_pool.AI_POOL_SUBJECTS]
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO admin_actions (action_type, target_id, details, admin_user)
-            VALUES (?, ?, ?, ?)
-        ''', (action_type, target_id, details, admin_user))
-        conn.commit()
-        conn.close()
+        allowed += [str(s).strip().lower() for s in subject_catalog()]
     except Exception as e:
-        print(f"Error logging admin action: {e}")
+        print(f"⚠️ Could not read the subject catalog: {e}")
+    return bool(key) and key in allowed
+
+def backup_ai_questions(generator, questions):
+    """Save AI questions served to a student to the review table"""
+    try:
+        generator.save_questions_to_db(questions, status='pending_review')
+    except Exception as save_err:
+        print(f"⚠️ Could not backup questions to DB: {save_err}")
+
+# Warm pool of pre-generated AI questions so /api/questions/ai-live answers instantly
+QUESTION_POOL = None
+if question_pool.AI_POOL_ENABLED:
+    QUESTION_POOL = question_pool.QuestionPool(
+        generate_pool_questions,
+        validate_fn=is_valid_question,
+        allow_fn=is_pool_subject
+    )
+    for pool_subject in question_pool.AI_POOL_SUBJECTS:
+        QUESTION_POOL.request_refill(pool_subject)
+
+# Picks up generation jobs queued earlier or left running by a stopped worker
+generation_jobs.ensure_dispatcher()
+
+# ============================================================================
+# REQUEST INSTRUMENTATION
+# ============================================================================
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc(route=g.metrics_route)
+    if request.content_length:
+        metrics.HTTP_REQUEST_BYTES.inc(request.content_length, route=g.metrics_route)
+
+@app.after_request
+def record_request_metrics(response):
+    route = g.get('metrics_route')
+    if route is None:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    metrics.HTTP_LATENCY.observe(elapsed, route=route, method=request.method)
+    metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    if not response.is_streamed and response.content_length:
+        metrics.HTTP_RESPONSE_BYTES.inc(response.content_length, route=route)
+    if SERVER_TIMING or app.debug:
+        response.headers['Server-Timing'] = metrics.server_timing_header(
+            g.get('metrics_spans', []), total=elapsed)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(_exc):
+    route = g.pop('metrics_route', None)
+    if route is not None:
+        metrics.HTTP_IN_FLIGHT.dec(route=route)
+
+@app.before_request
+def start_request_profile():
+    requested = 'X-Profile' in request.headers and has_admin_token()
+    if profiling.should_profile(requested):
+        g.profiler = profiling.start()
+
+@app.after_request
+def save_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        name = profiling.stop(profiler, f'{request.method} {request.path}')
+        response.headers['X-Profile-Name'] = name
+    return response
+
+@app.teardown_request
+def discard_request_profile(_exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiling.stop(profiler)
+
+@app.before_request
+def enter_bulkhead():
+    # asgi.py admits AI requests on its own pool before they get here
+    if request.environ.get(bulkhead.ADMITTED_ENVIRON_KEY):
+        return None
+    name, admitted = bulkhead.admit(request.method, request.path)
+    if not admitted:
+        retry_after = bulkhead.BULKHEADS[name].retry_after()
+        response = jsonify({'error': bulkhead.busy_message(name), 'retry_after': retry_after})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.bulkhead = name
+
+@app.teardown_request
+def leave_bulkhead(_exc):
+    name = g.pop('bulkhead', None)
+    if name is not None:
+        bulkhead.release(name)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request and operation metrics in Prometheus text format"""
+    return Response(metrics.render_latest(), content_type=metrics.CONTENT_TYPE)
 
 # ============================================================================
 # PUBLIC API ENDPOINTS (for students)
@@ -570,13 +871,7 @@ def log_admin_action(action_type, target_id, details, admin_user='admin'):
 def get_subjects():
     """Get list of available subjects from the CSV file"""
     try:
-        df = pd.read_csv(DATA_FILE, encoding='utf-8', dtype=str)
-        # Fix typo in Physics
-        df['Subject'] = df['Subject'].str.replace('Physcis', 'Physics', case=False)
-        # Fix encoding in subject names
-        df['Subject'] = df['Subject'].apply(lambda x: fix_encoding(str(x)) if pd.notna(x) else x)
-        subjects = sorted(df['Subject'].unique().tolist())
-        return jsonify({'subjects': subjects})
+        return jsonify({'subjects': subject_catalog()})
     except Exception as e:
         return jsonify({'subjects': []})
 
@@ -593,60 +888,41 @@ def get_ai_live_questions(subject):
         print(f"🤖 User requested live AI questions for: {subject}")
         print(f"========================================")
         
-        generator = QuestionGenerator()
-        # Generate 10 questions for speed (user experience)
-        raw_questions = generator.generate_questions(subject, count=10)
-        
-        if not raw_questions:
-            print(f"❌ Generation failed: generator.generate_questions returned empty list")
-            return jsonify({'error': 'AI failed to generate questions. This might be due to a JSON parsing error or API limit. Please check the terminal logs.'}), 500
-        
-        # --- NEW: Automatically back up these questions to the DB for later review ---
-        try:
-            generator.save_questions_to_db(raw_questions, status='pending_review')
-        except Exception as save_err:
-            print(f"⚠️ Could not backup questions to DB: {save_err}")
-        # ----------------------------------------------------------------------------
+        # Pooled questions were validated when generated
+        raw_questions = None
+        if QUESTION_POOL is not None:
+            raw_questions = QUESTION_POOL.take(subject, AI_LIVE_QUESTION_COUNT)
+        served_from = 'pool' if raw_questions else 'live'
+        generator = get_question_generator()
 
-        formatted_questions = []
-        for i, q in enumerate(raw_questions):
-            # Create the options array that the frontend expects
-            options = [
-                q.get('Option A', '').strip(),
-                q.get('Option B', '').strip(),
-                q.get('Option C', '').strip(),
-                q.get('Option D', '').strip()
-            ]
+        if not raw_questions:
+            # Generate 10 questions for speed (user experience)
+            raw_questions = generator.generate_questions_fanout(subject, count=AI_LIVE_QUESTION_COUNT)
             
-            # Get the correct answer text
-            correct_letter = q.get('Correct Option', 'A').strip().upper()
-            letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-            correct_index = letter_to_index.get(correct_letter, 0)
-            correct_text = options[correct_index]
-
-            formatted_questions.append({
-                'id': i + 1,
-                'question': q.get('Question', '').strip(),
-                'options': options,
-                'option_a': options[0],
-                'option_b': options[1],
-                'option_c': options[2],
-                'option_d': options[3],
-                'correct_option': correct_letter,
-                'correct_answer': correct_text,
-                'explanation': q.get('Explanation', ''),
-                'chapter_name': q.get('Chapter Name', 'General'),
-                'subject': subject,
-                'type': q.get('Type', 'Standard'),
-                'source': 'ai_live'
-            })
+            if not raw_questions:
+                print(f"❌ Generation failed: generator.generate_questions returned empty list")
+                return jsonify({'error': 'AI failed to generate questions. This might be due to a JSON parsing error or API limit. Please check the terminal logs.'}), 500
+
+        # Served questions, pooled or live, are backed up to the DB for later review
+        backup_ai_questions(generator, raw_questions)
+
+        formatted_questions = [format_ai_question(q, i, subject) for i, q in enumerate(raw_questions)]
             
-        print(f"✅ Successfully generated and returned {len(formatted_questions)} live questions")
+        print(f"✅ Successfully returned {len(formatted_questions)} AI questions ({served_from})")
         return jsonify({
             'questions': formatted_questions,
-            'source': 'ai_live_generation'
+            'source': 'ai_live_generation',
+            'served_from': served_from
         })
         
+    except rate_limiter.RateLimitExceeded as e:
+        print(f"❌ Live AI generation rate limited: {e}")
+        if not e.daily:
+            return ai_busy_response(e)
+        return jsonify({
+            'error': "AI Daily Quota Exceeded. You have used all available AI generations for today. Please wait for the daily reset or try a different subject later.",
+            'is_quota_error': True
+        }), 429
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Error in live AI generation: {error_msg}")
@@ -660,6 +936,74 @@ def get_ai_live_questions(subject):
             
         return jsonify({'error': f"AI Error: {error_msg}"}), 500
 
+def ai_busy_message(e):
+    return f"AI is busy right now. Please try again in {ai_retry_after(e)} seconds."
+
+def ai_retry_after(e):
+    return int(e.retry_after or 0) + 1
+
+def ai_busy_response(e):
+    """503 for a request that found no AI request slot in time (the daily budget still has room)"""
+    response = jsonify({'error': ai_busy_message(e), 'is_quota_error': False, 'retry_after': ai_retry_after(e)})
+    response.headers['Retry-After'] = str(ai_retry_after(e))
+    return response, 503
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/questions/ai-stream/<subject>', methods=['GET'])
+def stream_ai_live_questions(subject):
+    """Push AI questions to the test page one at a time as server-sent events"""
+    count = min(request.args.get('count', AI_LIVE_QUESTION_COUNT, type=int), AI_STREAM_MAX_QUESTIONS)
+    print(f"🤖 User requested streamed AI questions for: {subject} ({count})")
+
+    def generate():
+        pooled = QUESTION_POOL.take(subject, count) if QUESTION_POOL is not None else None
+        generator = get_question_generator()
+        yield sse_event('meta', {'expected': count, 'served_from': 'pool' if pooled else 'live'})
+        if pooled:
+            try:
+                for i, q in enumerate(pooled):
+                    yield sse_event('question', format_ai_question(q, i, subject))
+                yield sse_event('done', {'count': len(pooled)})
+            finally:
+                backup_ai_questions(generator, pooled)
+            return
+
+        generated = []
+        try:
+            for q in generator.generate_questions_stream(subject, count=count):
+                if not is_valid_question(q):
+                    continue
+                generated.append(q)
+                yield sse_event('question', format_ai_question(q, len(generated) - 1, subject))
+                if len(generated) >= count:
+                    break
+            yield sse_event('done', {'count': len(generated)})
+        except rate_limiter.RateLimitExceeded as e:
+            print(f"❌ Streamed AI generation rate limited: {e}")
+            if e.daily:
+                yield sse_event('failed', {'error': f"AI Error: {e}", 'is_quota_error': True})
+            else:
+                yield sse_event('failed', {'error': ai_busy_message(e), 'is_quota_error': False,
+                                           'retry_after': ai_retry_after(e)})
+        except Exception as e:
+            error_msg = str(e)
+            print(f"❌ Error in streamed AI generation: {error_msg}")
+            yield sse_event('failed', {
+                'error': f"AI Error: {error_msg}",
+                'is_quota_error': 'Quota Exceeded' in error_msg
+            })
+        finally:
+            # Runs on client disconnect too, so nothing already generated is lost
+            if generated:
+                backup_ai_questions(generator, generated)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/check')
 def check_api():
     return jsonify({'status': 'ok', 'message': 'API is working'})
@@ -684,9 +1028,11 @@ def get_questions(subject):
         user_id = request.args.get('user_id')
         recent_uids = set()
         if user_id:
-            recent_uids = get_recent_question_uids(user_id, subject, NO_REPEAT_TESTS)
+            with metrics.span('recent_history'):
+                recent_uids = get_recent_question_uids(user_id, subject, NO_REPEAT_TESTS)
 
-        questions = load_questions(subject)
+        with metrics.span('bank_load'):
+            questions = load_questions(subject)
         
         if not questions:
             print(f"❌ No questions found for subject: {subject}")
@@ -702,100 +1048,103 @@ def get_questions(subject):
             return text
 
         questions_with_uid = []
-        for q in questions:
-            question_text = str(q.get('Question', '')).strip()
-            option_a = normalize_option(q.get('Option A', ''), 'Option A')
-            option_b = normalize_option(q.get('Option B', ''), 'Option B')
-            option_c = normalize_option(q.get('Option C', ''), 'Option C')
-            option_d = normalize_option(q.get('Option D', ''), 'Option D')
-            options = [option_a, option_b, option_c, option_d]
-            question_uid = compute_question_uid(subject, question_text, options)
-            questions_with_uid.append((question_uid, q))
-
-        eligible_questions = [item for item in questions_with_uid if item[0] not in recent_uids]
-        pool = eligible_questions if len(eligible_questions) >= 10 else questions_with_uid
-        selected_questions = random.sample(pool, min(20, len(pool)))
+        with metrics.span('uid_compute'):
+            for q in questions:
+                question_text = str(q.get('Question', '')).strip()
+                option_a = normalize_option(q.get('Option A', ''), 'Option A')
+                option_b = normalize_option(q.get('Option B', ''), 'Option B')
+                option_c = normalize_option(q.get('Option C', ''), 'Option C')
+                option_d = normalize_option(q.get('Option D', ''), 'Option D')
+                options = [option_a, option_b, option_c, option_d]
+                question_uid = compute_question_uid(subject, question_text, options)
+                questions_with_uid.append((question_uid, q))
+
+        with metrics.span('sampling'):
+            eligible_questions = [item for item in questions_with_uid if item[0] not in recent_uids]
+            pool = eligible_questions if len(eligible_questions) >= 10 else questions_with_uid
+            selected_questions = random.sample(pool, min(20, len(pool)))
         
         formatted_questions = []
         
-        for i, item in enumerate(selected_questions):
-            try:
-                question_uid, q = item
-                # Extract fields
-                question_text = str(q.get('Question', '')).strip()
-                option_a = str(q.get('Option A', '')).strip()
-                option_b = str(q.get('Option B', '')).strip()
-                option_c = str(q.get('Option C', '')).strip()
-                option_d = str(q.get('Option D', '')).strip()
+        with metrics.span('formatting'):
+            for i, item in enumerate(selected_questions):
+                try:
+                    question_uid, q = item
+                    # Extract fields
+                    question_text = str(q.get('Question', '')).strip()
+                    option_a = str(q.get('Option A', '')).strip()
+                    option_b = str(q.get('Option B', '')).strip()
+                    option_c = str(q.get('Option C', '')).strip()
+                    option_d = str(q.get('Option D', '')).strip()
                 
-                # Now using "Correct Answer" column
-                correct_answer_raw = str(q.get('Correct Answer', '')).strip().upper()
+                    # Now using "Correct Answer" column
+                    correct_answer_raw = str(q.get('Correct Answer', '')).strip().upper()
                 
-                # Difficulty column exists but we'll ignore it for now
-                # difficulty = str(q.get('Difficulty', '')).strip()
+                    # Difficulty column exists but we'll ignore it for now
+                    # difficulty = str(q.get('Difficulty', '')).strip()
                 
-                # Debug first question
-                if i == 0:
-                    print(f"\n📝 Sample question:")
-                    print(f"   Question: {question_text[:60]}...")
-                    print(f"   Option A: {option_a[:40]}...")
-                    print(f"   Option B: {option_b[:40]}...")
-                    print(f"   Option C: {option_c[:40]}...")
-                    print(f"   Option D: {option_d[:40]}...")
-                    print(f"   Correct Answer (raw): '{correct_answer_raw}'")
+                    # Debug first question
+                    if i == 0:
+                        print(f"\n📝 Sample question:")
+                        print(f"   Question: {question_text[:60]}...")
+                        print(f"   Option A: {option_a[:40]}...")
+                        print(f"   Option B: {option_b[:40]}...")
+                        print(f"   Option C: {option_c[:40]}...")
+                        print(f"   Option D: {option_d[:40]}...")
+                        print(f"   Correct Answer (raw): '{correct_answer_raw}'")
                 
-                # Skip if essential data is missing
-                if not question_text or question_text.lower() == 'nan':
-                    print(f"⚠️  Skipping Q{i+1}: Missing question text")
-                    continue
+                    # Skip if essential data is missing
+                    if not question_text or question_text.lower() == 'nan':
+                        print(f"⚠️  Skipping Q{i+1}: Missing question text")
+                        continue
                 
-                if not correct_answer_raw or correct_answer_raw == 'NAN':
-                    print(f"⚠️  Skipping Q{i+1}: Missing correct answer")
-                    continue
+                    if not correct_answer_raw or correct_answer_raw == 'NAN':
+                        print(f"⚠️  Skipping Q{i+1}: Missing correct answer")
+                        continue
                 
-                # Handle empty options
-                if not option_a or option_a.lower() == 'nan':
-                    option_a = 'Option A'
-                if not option_b or option_b.lower() == 'nan':
-                    option_b = 'Option B'
-                if not option_c or option_c.lower() == 'nan':
-                    option_c = 'Option C'
-                if not option_d or option_d.lower() == 'nan':
-                    option_d = 'Option D'
+                    # Handle empty options
+                    if not option_a or option_a.lower() == 'nan':
+                        option_a = 'Option A'
+                    if not option_b or option_b.lower() == 'nan':
+                        option_b = 'Option B'
+                    if not option_c or option_c.lower() == 'nan':
+                        option_c = 'Option C'
+                    if not option_d or option_d.lower() == 'nan':
+                        option_d = 'Option D'
                 
-                # Create options array
-                options = [option_a, option_b, option_c, option_d]
+                    # Create options array
+                    options = [option_a, option_b, option_c, option_d]
                 
-                # Normalize correct answer (handle space before letter: " A" -> "A")
-                correct_letter = correct_answer_raw.strip()
+                    # Normalize correct answer (handle space before letter: " A" -> "A")
+                    correct_letter = correct_answer_raw.strip()
                 
-                # Validate it's A, B, C, or D
-                if correct_letter not in ['A', 'B', 'C', 'D']:
-                    print(f"⚠️  Skipping Q{i+1}: Invalid correct answer '{correct_answer_raw}' (after strip: '{correct_letter}')")
-                    continue
+                    # Validate it's A, B, C, or D
+                    if correct_letter not in ['A', 'B', 'C', 'D']:
+                        print(f"⚠️  Skipping Q{i+1}: Invalid correct answer '{correct_answer_raw}' (after strip: '{correct_letter}')")
+                        continue
                 
-                # Get full text of correct answer
-                letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-                correct_index = letter_to_index[correct_letter]
-                correct_text = options[correct_index]
+                    # Get full text of correct answer
+                    letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+                    correct_index = letter_to_index[correct_letter]
+                    correct_text = options[correct_index]
                 
-                formatted_question = {
-                    'id': i,
-                    'question': question_text,
-                    'options': options,
-                    'correct_answer': correct_text,  # Full text for backend comparison
-                    'correct_answer_letter': correct_letter,  # Letter for reference
-                    'question_type': 'Standard',  # Default type since we're not using Difficulty
-                    'question_uid': question_uid
-                }
+                    formatted_question = {
+                        'id': i,
+                        'question': question_text,
+                        'options': options,
+                        'correct_answer': correct_text,  # Full text for backend comparison
+                        'correct_answer_letter': correct_letter,  # Letter for reference
+                        'question_type': 'Standard',  # Default type since we're not using Difficulty
+                        'question_uid': question_uid
+                    }
                 
-                formatted_questions.append(formatted_question)
+                    formatted_questions.append(formatted_question)
                 
-            except Exception as e:
-                print(f"⚠️  Error formatting Q{i+1}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+                except Exception as e:
+                    print(f"⚠️  Error formatting Q{i+1}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    continue
         
         print(f"\n📊 Results:")
         print(f"   Formatted: {len(formatted_questions)} questions")
@@ -822,17 +1171,16 @@ def get_questions(subject):
 def get_genai_questions(subject):
     """Generate 20 questions using GenAI and save for admin review"""
     try:
-        generator = QuestionGenerator()
-        questions = generator.generate_questions(subject)
+        generator = get_question_generator()
+        questions = generator.generate_questions_fanout(subject, priority=rate_limiter.PRIORITY_INTERACTIVE)
         
         if not questions:
             return jsonify({'error': 'Failed to generate questions'}), 500
         
-        # Use the generator's robust save method
-        success = generator.save_questions_to_db(questions, status='pending_review')
+        saved_ids = generator.save_questions_to_db(questions, status='pending_review')
         
-        if success:
-            saved_count = len(questions)
+        if saved_ids is not None:
+            saved_count = len(saved_ids)
             log_admin_action('ai_generation', None, 
                             f'Generated {saved_count} questions for {subject}', 'system')
             
@@ -841,12 +1189,22 @@ def get_genai_questions(subject):
                 'status': 'pending_review',
                 'note': 'Questions are pending admin review before being added to question bank',
                 'question_count': saved_count,
+                'question_ids': saved_ids,
                 'subject': subject,
                 'instruction': 'Go to Admin Panel to review and approve these questions'
             })
         else:
             return jsonify({'error': 'Failed to save generated questions to database'}), 500
         
+    except rate_limiter.RateLimitExceeded as e:
+        print(f"Error in GenAI generation: {e}")
+        if not e.daily:
+            return ai_busy_response(e)
+        return jsonify({
+            'error': 'Gemini API daily quota used up',
+            'message': 'Please try again after the daily reset, or use Question Bank mode instead.',
+            'suggestion': 'Switch to Question Bank (📚) for immediate access to 2000+ questions'
+        }), 429
     except Exception as e:
         error_msg = str(e)
         print(f"Error in GenAI generation: {error_msg}")
@@ -891,72 +1249,77 @@ def submit_test():
         correct_count = 0
         results = []
         
-        for i, answer in enumerate(answers):
-            user_answer_letter = str(answer.get('user_answer', 'Not Answered')).strip().upper()
-            correct_answer_text = str(answer.get('correct_answer', '')).strip()
+        with metrics.span('scoring'):
+            for i, answer in enumerate(answers):
+                user_answer_letter = str(answer.get('user_answer', 'Not Answered')).strip().upper()
+                correct_answer_text = str(answer.get('correct_answer', '')).strip()
             
-            # Get the options for this question
-            question_data = answer.get('question_data', {})
-            options = question_data.get('options', [])
+                # Get the options for this question
+                question_data = answer.get('question_data', {})
+                options = question_data.get('options', [])
             
-            # Map letters to options
-            letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+                # Map letters to options
+                letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
             
-            # --- AI Mode Fix: Map correct_option to correct_answer_text if missing ---
-            if not correct_answer_text:
-                correct_letter_ai = question_data.get('correct_option', 'A').strip().upper()
-                idx_ai = letter_to_index.get(correct_letter_ai, 0)
-                if idx_ai < len(options):
-                    correct_answer_text = options[idx_ai].strip()
-            # -----------------------------------------------------------------------
-
-            # Convert user's letter to actual option text
-            user_answer_text = user_answer_letter
-            if user_answer_letter in ['A', 'B', 'C', 'D'] and options:
-                option_index = letter_to_index.get(user_answer_letter)
-                if option_index is not None and option_index < len(options):
-                    user_answer_text = options[option_index].strip()
+                # --- AI Mode Fix: Map correct_option to correct_answer_text if missing ---
+                if not correct_answer_text:
+                    correct_letter_ai = question_data.get('correct_option', 'A').strip().upper()
+                    idx_ai = letter_to_index.get(correct_letter_ai, 0)
+                    if idx_ai < len(options):
+                        correct_answer_text = options[idx_ai].strip()
+                # -----------------------------------------------------------------------
+
+                # Convert user's letter to actual option text
+                user_answer_text = user_answer_letter
+                if user_answer_letter in ['A', 'B', 'C', 'D'] and options:
+                    option_index = letter_to_index.get(user_answer_letter)
+                    if option_index is not None and option_index < len(options):
+                        user_answer_text = options[option_index].strip()
             
-            # Find which letter corresponds to the correct answer
-            correct_answer_letter = None
-            for letter, index in letter_to_index.items():
-                if index < len(options):
-                    if options[index].strip().lower() == correct_answer_text.lower():
-                        correct_answer_letter = letter
-                        break
+                # Find which letter corresponds to the correct answer
+                correct_answer_letter = None
+                for letter, index in letter_to_index.items():
+                    if index < len(options):
+                        if options[index].strip().lower() == correct_answer_text.lower():
+                            correct_answer_letter = letter
+                            break
             
-            # If correct answer wasn't found in options, check if it's already a letter
-            if not correct_answer_letter and correct_answer_text.upper() in ['A', 'B', 'C', 'D']:
-                correct_answer_letter = correct_answer_text.upper()
-                option_index = letter_to_index.get(correct_answer_letter)
-                if option_index is not None and option_index < len(options):
-                    correct_answer_text = options[option_index].strip()
+                # If correct answer wasn't found in options, check if it's already a letter
+                if not correct_answer_letter and correct_answer_text.upper() in ['A', 'B', 'C', 'D']:
+                    correct_answer_letter = correct_answer_text.upper()
+                    option_index = letter_to_index.get(correct_answer_letter)
+                    if option_index is not None and option_index < len(options):
+                        correct_answer_text = options[option_index].strip()
             
-            print(f"\nQ{i+1}:")
-            print(f"  User: {user_answer_letter} → {user_answer_text}")
-            print(f"  Correct: {correct_answer_letter} → {correct_answer_text}")
+                print(f"\nQ{i+1}:")
+                print(f"  User: {user_answer_letter} → {user_answer_text}")
+                print(f"  Correct: {correct_answer_letter} → {correct_answer_text}")
             
-            # Compare the actual text (case-insensitive)
-            is_correct = user_answer_text.lower().strip() == correct_answer_text.lower().strip()
-            print(f"  Match: {is_correct}")
+                # Compare the actual text (case-insensitive)
+                is_correct = user_answer_text.lower().strip() == correct_answer_text.lower().strip()
+                print(f"  Match: {is_correct}")
 
-            question_uid = question_data.get('question_uid')
-            if not question_uid:
-                question_uid = compute_question_uid(subject, answer.get('question', ''), options)
-            
-            if is_correct:
-                correct_count += 1
+                if is_correct:
+                    correct_count += 1
             
-            results.append({
-                'question': answer['question'],
-                'user_answer_letter': user_answer_letter,  # A, B, C, D or Not Answered
-                'user_answer_text': user_answer_text,      # Full text of option
-                'correct_answer_letter': correct_answer_letter or '?',  # A, B, C, D
-                'correct_answer_text': correct_answer_text,  # Full text
-                'is_correct': is_correct,
-                'all_options': options,  # Include all options for reference
-                'question_uid': question_uid
-            })
+                results.append({
+                    'question': answer['question'],
+                    'user_answer_letter': user_answer_letter,  # A, B, C, D or Not Answered
+                    'user_answer_text': user_answer_text,      # Full text of option
+                    'correct_answer_letter': correct_answer_letter or '?',  # A, B, C, D
+                    'correct_answer_text': correct_answer_text,  # Full text
+                    'is_correct': is_correct,
+                    'all_options': options  # Include all options for reference
+                })
+
+        with metrics.span('uid_compute'):
+            for answer, result in zip(answers, results):
+                question_data = answer.get('question_data', {})
+                question_uid = question_data.get('question_uid')
+                if not question_uid:
+                    question_uid = compute_question_uid(subject, answer.get('question', ''),
+                                                        question_data.get('options', []))
+                result['question_uid'] = question_uid
         
         score = (correct_count / total_questions) * 100
         print(f"\n✅ Final Score: {correct_count}/{total_questions} = {score}%\n")
@@ -966,48 +1329,50 @@ def submit_test():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        print("📝 Inserting into test_history...")
-        if USE_POSTGRES:
-            cursor.execute('''
-                INSERT INTO test_history (subject, total_questions, correct_answers, score, user_id, user_name)
-                VALUES (?, ?, ?, ?, ?, ?)
-                RETURNING id
-            ''', (subject, total_questions, correct_count, score, user_id, user_name))
-            test_id = cursor.fetchone()[0]
-        else:
-            cursor.execute('''
-                INSERT INTO test_history (subject, total_questions, correct_answers, score, user_id, user_name)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (subject, total_questions, correct_count, score, user_id, user_name))
-            test_id = cursor.lastrowid
-        print(f"✅ Generated Test ID: {test_id}")
-        
-        # Save individual question results
-        print("📝 Inserting question results...")
-        for result in results:
-            cursor.execute('''
+        with metrics.span('db_insert'):
+            print("📝 Inserting into test_history...")
+            if USE_POSTGRES:
+                cursor.execute('''
+                    INSERT INTO test_history (subject, total_questions, correct_answers, score, user_id, user_name)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    RETURNING id
+                ''', (subject, total_questions, correct_count, score, user_id, user_name))
+                test_id = cursor.fetchone()[0]
+            else:
+                cursor.execute('''
+                    INSERT INTO test_history (subject, total_questions, correct_answers, score, user_id, user_name)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (subject, total_questions, correct_count, score, user_id, user_name))
+                test_id = cursor.lastrowid
+            print(f"✅ Generated Test ID: {test_id}")
+        
+            # Save individual question results
+            print("📝 Inserting question results...")
+            cursor.executemany('''
                 INSERT INTO question_history (test_id, question, user_answer, correct_answer, is_correct, question_uid)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            ''', [(
                 test_id, 
                 result['question'], 
                 f"{result['user_answer_letter']}) {result['user_answer_text']}", 
                 f"{result['correct_answer_letter']}) {result['correct_answer_text']}", 
                 result['is_correct'],
                 result.get('question_uid')
-            ))
+            ) for result in results])
         
-        conn.commit()
+        with metrics.span('db_commit'):
+            conn.commit()
         conn.close()
         print("✅ Database commit successful")
         
         # Try to log tracking
-        try:
-            if user_id and user_id != 'anonymous':
-                log_test_attempt(user_id, user_name, subject, test_id, score, duration_seconds)
-                log_visitor(user_id, user_name, 'test_completed', f'test-{subject}')
-        except Exception as tracking_error:
-            print(f"⚠️ Tracking failed: {tracking_error}")
+        with metrics.span('tracking'):
+            try:
+                if user_id and user_id != 'anonymous':
+                    log_test_attempt(user_id, user_name, subject, test_id, score, duration_seconds)
+                    log_visitor(user_id, user_name, 'test_completed', f'test-{subject}')
+            except Exception as tracking_error:
+                print(f"⚠️ Tracking failed: {tracking_error}")
         
         return jsonify({
             'test_id': test_id,
@@ -1031,7 +1396,7 @@ def get_history():
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -1061,7 +1426,7 @@ def get_history():
 @app.route('/api/admin/history', methods=['GET'])
 def get_admin_history():
     """Get test history for all users (admin)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -1096,7 +1461,7 @@ def get_test_details(test_id):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Get test info
@@ -1186,7 +1551,7 @@ def track_test_start():
 @app.route('/api/admin/users', methods=['GET'])
 def get_all_users():
     """Get all tracked users"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -1216,7 +1581,7 @@ def get_visitor_logs():
     limit = request.args.get('limit', 100, type=int)
     user_id = request.args.get('user_id', None)
     
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     if user_id:
@@ -1256,7 +1621,7 @@ def get_test_attempts():
     user_id = request.args.get('user_id', None)
     subject = request.args.get('subject', None)
     
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     query = '''
@@ -1297,7 +1662,7 @@ def get_test_attempts():
 @app.route('/api/admin/user-stats/<user_id>', methods=['GET'])
 def get_user_stats(user_id):
     """Get detailed stats for a specific user"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Get user info
@@ -1360,7 +1725,7 @@ def get_user_stats(user_id):
 @app.route('/api/admin/analytics', methods=['GET'])
 def get_analytics():
     """Get overall analytics"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Total users
@@ -1448,23 +1813,23 @@ def get_analytics():
 def admin_generate_questions(subject):
     """Admin endpoint to trigger AI generation"""
     try:
-        generator = QuestionGenerator()
-        questions = generator.generate_questions(subject)
+        generator = get_question_generator()
+        questions = generator.generate_questions_fanout(subject, priority=rate_limiter.PRIORITY_BULK)
         
         if not questions:
             return jsonify({'error': 'Failed to generate questions'}), 500
         
-        # Use the generator's robust save method
-        success = generator.save_questions_to_db(questions, status='pending_review')
+        saved_ids = generator.save_questions_to_db(questions, status='pending_review')
         
-        if success:
-            saved_count = len(questions)
+        if saved_ids is not None:
+            saved_count = len(saved_ids)
             log_admin_action('admin_generation', None, 
                             f'Admin generated {saved_count} questions for {subject}')
             
             return jsonify({
                 'message': f'Generated {saved_count} questions for review',
                 'question_count': saved_count,
+                'question_ids': saved_ids,
                 'status': 'pending_review'
             })
         else:
@@ -1473,191 +1838,173 @@ def admin_generate_questions(subject):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/generate-jobs', methods=['POST'])
+def create_generation_job():
+    """Queue a background job that generates questions in batches for review"""
+    data = request.get_json(silent=True) or {}
+    subject = str(data.get('subject') or '').strip()
+    if not subject:
+        return jsonify({'error': 'subject is required'}), 400
+    try:
+        count = int(data.get('count', 20))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count must be a number'}), 400
+    if not 1 <= count <= generation_jobs.AI_JOB_MAX_COUNT:
+        return jsonify({'error': f'count must be between 1 and {generation_jobs.AI_JOB_MAX_COUNT}'}), 400
+    chapters = data.get('chapters') or []
+    if isinstance(chapters, str):
+        chapters = chapters.split(',')
+    if not isinstance(chapters, list):
+        return jsonify({'error': 'chapters must be a list'}), 400
+
+    job = generation_jobs.submit_job(subject, count, chapters)
+    log_admin_action('admin_generation_job', None,
+                     f'Queued job {job["job_id"]} to generate {count} questions for {subject}',
+                     data.get('admin_user', 'admin'))
+    return jsonify(job), 202
+
+@app.route('/api/admin/generate-jobs', methods=['GET'])
+def list_generation_jobs():
+    """Most recent generation jobs with their progress"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    generation_jobs.ensure_dispatcher()
+    return jsonify({'jobs': generation_jobs.list_jobs(limit)})
+
+@app.route('/api/admin/generate-jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """Progress of one generation job"""
+    job = generation_jobs.job_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/admin/generate-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_generation_job(job_id):
+    """Cancel a queued job, or stop a running one after its current batch"""
+    job = generation_jobs.job_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in generation_jobs.FINISHED_STATUSES:
+        return jsonify({'error': f'Job already {job["status"]}', 'job': job}), 409
+    return jsonify(generation_jobs.cancel_job(job_id))
+
+def _list_review_questions(status, key):
+    """A cursor page of review-queue questions filtered by the LIST_FILTERS query parameters"""
+    filters = {name: request.args.get(name) for name in review_queue.LIST_FILTERS}
+    limit = request.args.get('limit', review_queue.LIST_PAGE_SIZE, type=int)
+    try:
+        questions, next_cursor, total = review_queue.list_questions(
+            status, filters, request.args.get('cursor') or None, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({key: questions, 'count': len(questions), 'total': total, 'next_cursor': next_cursor})
+
 @app.route('/api/admin/pending-questions', methods=['GET'])
 def get_pending_questions():
-    """Get all pending review questions"""
-    subject = request.args.get('subject', None)
-    
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    if subject:
-        cursor.execute('''
-            SELECT id, subject, question, option_a, option_b, option_c, option_d, 
-                   correct_option, question_type, created_at, status, chapter_name, explanation
-            FROM newly_updated_questions
-            WHERE status = 'pending_review' AND subject = ? AND is_active = 1
-            ORDER BY created_at DESC
-        ''', (subject,))
-    else:
-        cursor.execute('''
-            SELECT id, subject, question, option_a, option_b, option_c, option_d, 
-                   correct_option, question_type, created_at, status, chapter_name, explanation
-            FROM newly_updated_questions
-            WHERE status = 'pending_review' AND is_active = 1
-            ORDER BY created_at DESC
-        ''')
-    
-    questions = []
-    for row in cursor.fetchall():
-        questions.append({
-            'id': row[0],
-            'subject': row[1],
-            'question': row[2],
-            'option_a': row[3],
-            'option_b': row[4],
-            'option_c': row[5],
-            'option_d': row[6],
-            'correct_option': row[7],
-            'question_type': row[8],
-            'created_at': row[9],
-            'status': row[10],
-            'chapter_name': row[11] if len(row) > 11 else 'General',
-            'explanation': row[12] if len(row) > 12 else ''
-        })
-    
-    conn.close()
-    return jsonify({'pending_questions': questions, 'count': len(questions)})
+    """Get a page of pending review questions (?subject=&chapter=&source=&verdict=&cursor=&limit=)"""
+    return _list_review_questions('pending_review', 'pending_questions')
+
+@app.route('/api/admin/questions/<int:question_id>', methods=['GET'])
+def get_review_question(question_id):
+    """Get one review-queue question (e.g. to fill the edit form)"""
+    question = review_queue.get_question(question_id)
+    if question is None:
+        return jsonify({'error': 'Question not found'}), 404
+    return jsonify(question)
+
+@app.route('/api/admin/search', methods=['GET'])
+def search_questions():
+    """Ranked full-text search over the question bank and review queue (?q=&subject=&source=bank|review&limit=)"""
+    source = request.args.get('source') or None
+    if source not in (None, 'bank', 'review'):
+        return jsonify({'error': 'source must be bank or review'}), 400
+    try:
+        results, ranked = search_index.search(request.args.get('q', ''), request.args.get('subject') or None,
+                                              source, request.args.get('limit', 20, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'count': len(results), 'ranked': ranked})
+
+@app.route('/api/admin/search/rebuild', methods=['POST'])
+def rebuild_search_index():
+    """Re-index everything, e.g. after the bank CSV was replaced by hand"""
+    try:
+        count = search_index.rebuild()
+    except Exception as e:
+        return jsonify({'error': f'Rebuild failed: {str(e)}'}), 500
+    return jsonify({'message': f'Search index rebuilt with {count} questions', 'count': count})
+
+def _question_ids_from(data):
+    """Validated question_ids list from a bulk request body, or None"""
+    question_ids = data.get('question_ids')
+    if not isinstance(question_ids, list) or not question_ids:
+        return None
+    try:
+        return review_queue.clean_ids(question_ids)
+    except (TypeError, ValueError):
+        return None
 
 @app.route('/api/admin/approve-question/<int:question_id>', methods=['POST'])
 def approve_question(question_id):
     """Approve a single question and add to CSV Question Bank"""
-    data = request.json
+    data = request.json or {}
     admin_user = data.get('admin_user', 'admin')
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Get the question
-    cursor.execute('''
-        SELECT subject, question, option_a, option_b, option_c, option_d, correct_option
-        FROM newly_updated_questions
-        WHERE id = ? AND status = 'pending_review'
-    ''', (question_id,))
-    
-    row = cursor.fetchone()
+    try:
+        approved = review_queue.approve_questions([question_id], admin_user)
+    except Exception as e:
+        print(f"❌ Error adding to CSV: {e}")
+        return jsonify({'error': f'Failed to add to CSV: {str(e)}'}), 500
     
-    if not row:
-        conn.close()
+    if not approved:
         return jsonify({'error': 'Question not found or already processed'}), 404
     
-    # Update status in database
-    cursor.execute('''
-        UPDATE newly_updated_questions
-        SET status = 'approved',
-            reviewed_at = CURRENT_TIMESTAMP,
-            reviewed_by = ?
-        WHERE id = ?
-    ''', (admin_user, question_id))
+    log_admin_action('approve_question', question_id, 
+                    f'Approved and added to CSV by {admin_user}', admin_user)
     
-    conn.commit()
-    conn.close()
+    print(f"✅ Question {question_id} approved and added to CSV by {admin_user}")
     
-    # Add to main CSV file
-    try:
-        df = pd.read_csv(DATA_FILE, encoding='utf-8', dtype=str)
-        
-        new_question = pd.DataFrame([{
-            'Subject': row[0],
-            'Question': row[1],
-            'Option A': row[2],
-            'Option B': row[3],
-            'Option C': row[4],
-            'Option D': row[5],
-            'Correct Option': row[6]
-        }])
-        
-        df = pd.concat([df, new_question], ignore_index=True)
-        df.to_csv(DATA_FILE, index=False, encoding='utf-8')
-        
-        log_admin_action('approve_question', question_id, 
-                        f'Approved and added to CSV by {admin_user}', admin_user)
-        
-        print(f"✅ Question {question_id} approved and added to CSV by {admin_user}")
-        
-        return jsonify({
-            'message': 'Question approved and added to main question bank (CSV)',
-            'question_id': question_id
-        })
-        
-    except Exception as e:
-        print(f"❌ Error adding to CSV: {e}")
-        return jsonify({'error': f'Failed to add to CSV: {str(e)}'}), 500
+    return jsonify({
+        'message': 'Question approved and added to main question bank (CSV)',
+        'question_id': question_id
+    })
 
 @app.route('/api/admin/approve-bulk', methods=['POST'])
 def approve_bulk_questions():
-    """Approve multiple questions at once"""
-    data = request.json
-    question_ids = data.get('question_ids', [])
+    """Approve multiple questions at once (one UPDATE, one bank append)"""
+    data = request.json or {}
     admin_user = data.get('admin_user', 'admin')
+    question_ids = _question_ids_from(data)
     
     if not question_ids:
         return jsonify({'error': 'No question IDs provided'}), 400
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    try:
+        approved = review_queue.approve_questions(question_ids, admin_user)
+    except Exception as e:
+        print(f"❌ Error adding to CSV: {e}")
+        return jsonify({'error': f'Failed to add to CSV: {str(e)}'}), 500
     
-    approved_questions = []
+    if not approved:
+        return jsonify({'error': 'No valid questions to approve'}), 400
     
-    for qid in question_ids:
-        # Get the question
-        cursor.execute('''
-            SELECT subject, question, option_a, option_b, option_c, option_d, correct_option
-            FROM newly_updated_questions
-            WHERE id = ? AND status = 'pending_review'
-        ''', (qid,))
-        
-        row = cursor.fetchone()
-        
-        if row:
-            # Update status
-            cursor.execute('''
-                UPDATE newly_updated_questions
-                SET status = 'approved',
-                    reviewed_at = CURRENT_TIMESTAMP,
-                    reviewed_by = ?
-                WHERE id = ?
-            ''', (admin_user, qid))
-            
-            approved_questions.append({
-                'Subject': row[0],
-                'Question': row[1],
-                'Option A': row[2],
-                'Option B': row[3],
-                'Option C': row[4],
-                'Option D': row[5],
-                'Correct Option': row[6]
-            })
+    approved_ids = [row['id'] for row in approved]
+    log_admin_action('bulk_approve', None, 
+                    f'Bulk approved {len(approved)} questions by {admin_user}', 
+                    admin_user)
     
-    conn.commit()
-    conn.close()
+    print(f"✅ Bulk approved {len(approved)} questions")
     
-    # Add all approved questions to CSV
-    if approved_questions:
-        try:
-            df = pd.read_csv(DATA_FILE, encoding='utf-8', dtype=str)
-            new_df = pd.DataFrame(approved_questions)
-            df = pd.concat([df, new_df], ignore_index=True)
-            df.to_csv(DATA_FILE, index=False, encoding='utf-8')
-            
-            log_admin_action('bulk_approve', None, 
-                            f'Bulk approved {len(approved_questions)} questions by {admin_user}', 
-                            admin_user)
-            
-            print(f"✅ Bulk approved {len(approved_questions)} questions")
-            
-            return jsonify({
-                'message': f'Successfully approved {len(approved_questions)} questions',
-                'approved_count': len(approved_questions)
-            })
-        except Exception as e:
-            return jsonify({'error': f'Failed to add to CSV: {str(e)}'}), 500
-    else:
-        return jsonify({'error': 'No valid questions to approve'}), 400
+    return jsonify({
+        'message': f'Successfully approved {len(approved)} questions',
+        'approved_count': len(approved),
+        'approved_ids': approved_ids,
+        'skipped_ids': [qid for qid in question_ids if qid not in approved_ids]
+    })
 
 @app.route('/api/admin/upload-csv', methods=['POST'])
 def upload_csv_questions():
-    """Upload a CSV file and append questions to the main question bank"""
+    """Upload a CSV file of questions into the review queue (large files run as a background job)"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
 
@@ -1667,128 +2014,44 @@ def upload_csv_questions():
 
     admin_user = request.form.get('admin_user', 'admin')
 
-    try:
-        try:
-            df_upload = pd.read_csv(upload_file, dtype=str, encoding='utf-8')
-        except UnicodeDecodeError:
-            df_upload = pd.read_csv(upload_file, dtype=str, encoding='utf-8-sig')
-
-        if df_upload.empty:
-            return jsonify({'error': 'Uploaded CSV is empty'}), 400
-
-        def normalize_col(name):
-            import re
-            text = str(name).strip().lower()
-            text = text.replace('_', '').replace(' ', '')
-            return re.sub(r'[^a-z0-9]', '', text)
-
-        col_map = {normalize_col(col): col for col in df_upload.columns}
-        required = {
-            'subject': 'Subject',
-            'question': 'Question',
-            'optiona': 'Option A',
-            'optionb': 'Option B',
-            'optionc': 'Option C',
-            'optiond': 'Option D',
-            'correctoption': 'Correct Option'
-        }
-
-        missing = [name for key, name in required.items() if key not in col_map]
-        if missing:
-            return jsonify({
-                'error': f"Missing required columns: {', '.join(missing)}"
-            }), 400
-
-        df_normalized = df_upload[[
-            col_map['subject'],
-            col_map['question'],
-            col_map['optiona'],
-            col_map['optionb'],
-            col_map['optionc'],
-            col_map['optiond'],
-            col_map['correctoption']
-        ]].copy()
-
-        df_normalized.columns = [
-            'Subject',
-            'Question',
-            'Option A',
-            'Option B',
-            'Option C',
-            'Option D',
-            'Correct Option'
-        ]
-
-        for col in df_normalized.columns:
-            df_normalized[col] = df_normalized[col].fillna('').astype(str).str.strip()
-
-        df_normalized = df_normalized[
-            (df_normalized['Subject'] != '') & (df_normalized['Question'] != '')
-        ]
-
-        if df_normalized.empty:
-            return jsonify({'error': 'No valid rows found after cleaning'}), 400
-
-        # Insert each question into newly_updated_questions with status 'pending_review'
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        inserted = 0
-        for _, row in df_normalized.iterrows():
-            try:
-                cursor.execute('''
-                    INSERT INTO newly_updated_questions
-                    (subject, question, option_a, option_b, option_c, option_d, correct_option, question_type, status, source)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    row['Subject'],
-                    row['Question'],
-                    row['Option A'],
-                    row['Option B'],
-                    row['Option C'],
-                    row['Option D'],
-                    row['Correct Option'],
-                    'Standard',
-                    'pending_review',
-                    'csv'
-                ))
-                inserted += 1
-            except Exception as e:
-                print(f"Error inserting question from CSV: {e}")
-        conn.commit()
-        conn.close()
-
+    def log_upload(job):
         log_admin_action('csv_upload', None,
-                         f'Uploaded {inserted} questions to pending review', admin_user)
+                         f"Uploaded {job['inserted']} questions to pending review", admin_user)
 
-        return jsonify({
-            'message': 'CSV uploaded. All questions are now pending for review.',
-            'added_count': inserted
-        })
+    try:
+        job_id, path = ingest.save_upload(upload_file)
+        job = ingest.start_job(job_id, path, upload_file.filename, admin_user, on_finish=log_upload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+    if job['status'] == 'running':
+        return jsonify(dict(job, message='CSV received. Questions are being added for review in the background.')), 202
+    if job['status'] == 'failed':
+        return jsonify(dict(job, error=f"Upload failed: {job['error']}")), 500
+    if job['inserted'] == 0 and job['invalid'] and not job['duplicates']:
+        return jsonify(dict(job, error='No valid rows found after cleaning')), 400
+    return jsonify(dict(job, message='CSV uploaded. All questions are now pending for review.',
+                        added_count=job['inserted']))
+
+@app.route('/api/admin/upload-csv/<job_id>', methods=['GET'])
+def get_csv_upload(job_id):
+    """Progress and skipped-row report of a CSV upload"""
+    job = ingest.job_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(dict(job, added_count=job['inserted']))
+
 @app.route('/api/admin/reject-question/<int:question_id>', methods=['POST'])
 def reject_question(question_id):
     """Reject a question (soft delete)"""
-    data = request.json
+    data = request.json or {}
     admin_user = data.get('admin_user', 'admin')
     reason = data.get('reason', 'No reason provided')
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE newly_updated_questions
-        SET status = 'rejected',
-            is_active = 0,
-            reviewed_at = CURRENT_TIMESTAMP,
-            reviewed_by = ?,
-            review_notes = ?
-        WHERE id = ?
-    ''', (admin_user, reason, question_id))
-    
-    conn.commit()
-    conn.close()
+    if not review_queue.reject_questions([question_id], admin_user, reason):
+        return jsonify({'error': 'Question not found or already processed'}), 404
     
     log_admin_action('reject_question', question_id, 
                     f'Rejected by {admin_user}: {reason}', admin_user)
@@ -1798,37 +2061,46 @@ def reject_question(question_id):
         'question_id': question_id
     })
 
+@app.route('/api/admin/reject-bulk', methods=['POST'])
+def reject_bulk_questions():
+    """Reject multiple questions at once with one UPDATE"""
+    data = request.json or {}
+    admin_user = data.get('admin_user', 'admin')
+    reason = data.get('reason', 'No reason provided')
+    question_ids = _question_ids_from(data)
+    
+    if not question_ids:
+        return jsonify({'error': 'No question IDs provided'}), 400
+    
+    try:
+        rejected = review_queue.reject_questions(question_ids, admin_user, reason)
+    except Exception as e:
+        print(f"❌ Error rejecting questions: {e}")
+        return jsonify({'error': f'Failed to reject questions: {str(e)}'}), 500
+    if not rejected:
+        return jsonify({'error': 'No valid questions to reject'}), 400
+    
+    rejected_ids = [row['id'] for row in rejected]
+    log_admin_action('bulk_reject', None, 
+                    f'Bulk rejected {len(rejected)} questions by {admin_user}: {reason}', 
+                    admin_user)
+    
+    return jsonify({
+        'message': f'Successfully rejected {len(rejected)} questions',
+        'rejected_count': len(rejected),
+        'rejected_ids': rejected_ids,
+        'skipped_ids': [qid for qid in question_ids if qid not in rejected_ids]
+    })
+
 @app.route('/api/admin/edit-question/<int:question_id>', methods=['PUT'])
 def edit_question(question_id):
     """Edit a question before approval"""
-    data = request.json
-    
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE newly_updated_questions
-        SET question = ?,
-            option_a = ?,
-            option_b = ?,
-            option_c = ?,
-            option_d = ?,
-            correct_option = ?,
-            question_type = ?
-        WHERE id = ?
-    ''', (
-        data.get('question'),
-        data.get('option_a'),
-        data.get('option_b'),
-        data.get('option_c'),
-        data.get('option_d'),
-        data.get('correct_option'),
-        data.get('question_type'),
-        question_id
-    ))
+    data = request.json or {}
+    changes = {field: data.get(field) for field in
+               ('question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'question_type')}
     
-    conn.commit()
-    conn.close()
+    if not review_queue.edit_questions([question_id], changes):
+        return jsonify({'error': 'Question not found or already processed'}), 404
     
     log_admin_action('edit_question', question_id, 
                     'Question edited before approval', 
@@ -1839,183 +2111,184 @@ def edit_question(question_id):
         'question_id': question_id
     })
 
-@app.route('/api/admin/approved-questions', methods=['GET'])
-def get_approved_questions():
-    """Get all approved questions that were added to CSV"""
-    subject = request.args.get('subject', None)
-    
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+@app.route('/api/admin/edit-bulk', methods=['PUT'])
+def edit_bulk_questions():
+    """Apply the same field changes (e.g. chapter or type) to many questions with one UPDATE"""
+    data = request.json or {}
+    question_ids = _question_ids_from(data)
+    changes = data.get('changes')
     
-    if subject:
-        cursor.execute('''
-            SELECT id, subject, question, option_a, option_b, option_c, option_d,
-                   correct_option, question_type, reviewed_at, reviewed_by
-            FROM newly_updated_questions
-            WHERE status = 'approved' AND subject = ? AND is_active = 1
-            ORDER BY reviewed_at DESC
-        ''', (subject,))
-    else:
-        cursor.execute('''
-            SELECT id, subject, question, option_a, option_b, option_c, option_d,
-                   correct_option, question_type, reviewed_at, reviewed_by
-            FROM newly_updated_questions
-            WHERE status = 'approved' AND is_active = 1
-            ORDER BY reviewed_at DESC
-        ''')
-    
-    questions = []
-    for row in cursor.fetchall():
-        questions.append({
-            'id': row[0],
-            'subject': row[1],
-            'question': row[2],
-            'option_a': row[3],
-            'option_b': row[4],
-            'option_c': row[5],
-            'option_d': row[6],
-            'correct_option': row[7],
-            'question_type': row[8],
-            'reviewed_at': row[9],
-            'reviewed_by': row[10]
-        })
+    if not question_ids:
+        return jsonify({'error': 'No question IDs provided'}), 400
+    if not isinstance(changes, dict) or not any(field in changes for field in review_queue.EDITABLE_FIELDS):
+        return jsonify({'error': f'changes must set at least one of: {", ".join(review_queue.EDITABLE_FIELDS)}'}), 400
+    try:
+        changes = review_queue.clean_changes(changes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn.close()
-    return jsonify({'approved_questions': questions, 'count': len(questions)})
-
-@app.route('/api/admin/stats', methods=['GET'])
-def get_admin_stats():
-    """Get statistics for admin dashboard"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    try:
+        edited = review_queue.edit_questions(question_ids, changes)
+    except Exception as e:
+        print(f"❌ Error editing questions: {e}")
+        return jsonify({'error': f'Failed to edit questions: {str(e)}'}), 500
+    if not edited:
+        return jsonify({'error': 'No valid questions to edit'}), 400
+    
+    edited_ids = [row['id'] for row in edited]
+    log_admin_action('bulk_edit', None, 
+                    f'Bulk edited {len(edited)} questions ({", ".join(sorted(changes))})', 
+                    data.get('admin_user', 'admin'))
     
-    # Get subjects from CSV
-    def normalize_subject_key(value):
-        import re
-        text = str(value or '')
-        text = text.replace('\ufeff', '').replace('\u200b', '').replace('\u00a0', ' ')
-        text = re.sub(r'\s+', '', text.strip().lower())
-        text = re.sub(r'[^a-z0-9]', '', text)
-        return text
+    return jsonify({
+        'message': f'Successfully updated {len(edited)} questions',
+        'edited_count': len(edited),
+        'edited_ids': edited_ids,
+        'skipped_ids': [qid for qid in question_ids if qid not in edited_ids]
+    })
 
-    subject_labels = {}
+@app.route('/api/admin/approved-questions', methods=['GET'])
+def get_approved_questions():
+    """Get a page of approved questions that were added to CSV (same filters as pending-questions)"""
+    return _list_review_questions('approved', 'approved_questions')
+
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+def export_questions(dataset):
+    """Download the question bank or approved questions as CSV or XLSX, streamed in chunks"""
+    fmt = request.args.get('format', 'csv').lower()
+    if dataset not in exports.DATASETS:
+        return jsonify({'error': f"Unknown export '{dataset}'; use one of: {', '.join(exports.DATASETS)}"}), 404
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': 'format must be csv or xlsx'}), 400
+    subject = request.args.get('subject') or None
     try:
-        df = pd.read_csv(DATA_FILE, encoding='utf-8', dtype=str)
-        df['Subject'] = df['Subject'].str.replace('Physcis', 'Physics', case=False)
-        df['Subject'] = df['Subject'].fillna('').astype(str)
-
-        for subject in df['Subject'].tolist():
-            if not subject:
-                continue
-            cleaned = subject.replace('\ufeff', '').replace('\u200b', '').replace('\u00a0', ' ').strip()
-            key = normalize_subject_key(cleaned)
-            if key and key not in subject_labels:
-                subject_labels[key] = cleaned
-    except Exception:
-        subject_labels = {
-            'physics': 'Physics',
-            'chemistry': 'Chemistry',
-            'maths': 'Maths',
-            'biology': 'Biology'
-        }
-
-    cursor.execute('''
-        SELECT subject, status, COUNT(*)
-        FROM newly_updated_questions
-        WHERE is_active = 1
-        GROUP BY subject, status
-    ''')
-
-    stats_by_key = {}
-    for row in cursor.fetchall():
-        subject_raw = row[0]
-        status = row[1]
-        count = row[2]
-        key = normalize_subject_key(subject_raw)
-        if not key:
-            continue
-        if key not in stats_by_key:
-            stats_by_key[key] = {'pending': 0, 'approved': 0, 'rejected': 0}
-        if status == 'pending_review':
-            stats_by_key[key]['pending'] += count
-        elif status == 'approved':
-            stats_by_key[key]['approved'] += count
-        elif status == 'rejected':
-            stats_by_key[key]['rejected'] += count
-
-    # Ensure every CSV subject shows up at least once
-    for key in subject_labels.keys():
-        stats_by_key.setdefault(key, {'pending': 0, 'approved': 0, 'rejected': 0})
-
-    canonical_labels = {
-        key: (label or '').replace('\ufeff', '').replace('\u200b', '').replace('\u00a0', ' ').strip()
-        for key, label in subject_labels.items()
-        if key
-    }
+        chunks = exports.export(dataset, fmt, subject)
+    except FileNotFoundError:
+        return jsonify({'error': 'Question bank file not found'}), 404
+    filename = f"{dataset}{'-' + subject if subject else ''}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=exports.FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{secure_filename(filename)}"'
+    })
 
-    stats = {}
-    for key in sorted(stats_by_key.keys()):
-        label = canonical_labels.get(key) or key.title()
-        counts = stats_by_key.get(key, {'pending': 0, 'approved': 0, 'rejected': 0})
-        if label not in stats:
-            stats[label] = {
-                'pending': counts['pending'],
-                'approved': counts['approved'],
-                'rejected': counts['rejected'],
-                'total': counts['pending'] + counts['approved']
-            }
-        else:
-            stats[label]['pending'] += counts['pending']
-            stats[label]['approved'] += counts['approved']
-            stats[label]['rejected'] += counts['rejected']
-            stats[label]['total'] = stats[label]['pending'] + stats[label]['approved']
-
-    # Final cleanup: merge by trimmed label and drop zero-total entries
-    merged_stats = {}
-    for label, counts in stats.items():
-        clean_label = str(label).replace('\ufeff', '').replace('\u200b', '').replace('\u00a0', ' ').strip()
-        if counts.get('total', 0) == 0 and counts.get('pending', 0) == 0 and counts.get('approved', 0) == 0:
-            continue
-        if clean_label not in merged_stats:
-            merged_stats[clean_label] = counts
-        else:
-            merged_stats[clean_label]['pending'] += counts.get('pending', 0)
-            merged_stats[clean_label]['approved'] += counts.get('approved', 0)
-            merged_stats[clean_label]['rejected'] += counts.get('rejected', 0)
-            merged_stats[clean_label]['total'] = (
-                merged_stats[clean_label]['pending'] + merged_stats[clean_label]['approved']
-            )
-    
-    conn.close()
-    return jsonify({'stats': merged_stats})
+@app.route('/api/admin/stats', methods=['GET'])
+def get_admin_stats():
+    """Get statistics for admin dashboard from the per-subject counters"""
+    return jsonify({'stats': subject_stats.read()})
 
 @app.route('/api/admin/actions', methods=['GET'])
 def get_admin_actions():
-    """Get recent admin actions log"""
+    """Get a page of the admin actions log, newest first (?cursor=&limit=)"""
+    limit = request.args.get('limit', audit_log.ACTIONS_PAGE_SIZE, type=int)
+    try:
+        actions, next_cursor = audit_log.list_actions(request.args.get('cursor') or None, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'actions': actions, 'count': len(actions), 'next_cursor': next_cursor})
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List captured request profiles, newest first"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    profiles = profiling.PROFILES.list()
+    return jsonify({'profiles': profiles, 'count': len(profiles)})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """Download a captured profile (.prof for pstats/snakeviz, or ?format=text)"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    path = profiling.PROFILES.path_for(name)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'text':
+        limit = request.args.get('limit', 40, type=int)
+        sort = request.args.get('sort', 'cumulative')
+        try:
+            text = profiling.PROFILES.render_text(name, limit=limit, sort=sort)
+        except KeyError:
+            return jsonify({'error': f'Unknown sort key: {sort}'}), 400
+        return Response(text, mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+@app.route('/api/admin/ai-pool', methods=['GET'])
+def get_ai_pool_stats():
+    """Depth and age of the pre-generated AI question pool in this worker"""
+    if QUESTION_POOL is None:
+        return jsonify({'enabled': False, 'subjects': {}})
+    return jsonify(QUESTION_POOL.stats())
+
+@app.route('/api/admin/dedupe', methods=['GET'])
+def get_dedupe_stats():
+    """Size and settings of this worker's duplicate-detection index"""
+    return jsonify(dedupe.stats())
+
+@app.route('/api/admin/ai-quota', methods=['GET'])
+def get_ai_quota():
+    """Shared Gemini request budget: minute bucket, daily usage and any quota pause"""
+    return jsonify(rate_limiter.LIMITER.snapshot())
+
+@app.route('/api/admin/bulkheads', methods=['GET'])
+def get_bulkhead_stats():
+    """Concurrency limits, slots in use, waiters and shed requests per traffic class in this worker"""
+    return jsonify(bulkhead.stats())
+
+@app.route('/api/admin/memory', methods=['GET'])
+def get_memory_report():
+    """Top allocation sites, snapshot diff and per-cache memory usage"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    limit = request.args.get('limit', 20, type=int)
+    key_type = request.args.get('group_by', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'group_by must be lineno, filename or traceback'}), 400
+    report = {
+        'tracing': memory_report.is_tracing(),
+        'traced_memory': memory_report.traced_memory(),
+        'max_rss_bytes': memory_report.process_max_rss_bytes(),
+        'caches': caches.all_cache_stats(),
+        'top_allocations': memory_report.top_allocations(limit, key_type)
+    }
+    if memory_report.has_baseline():
+        report['diff_since_baseline'] = memory_report.diff_allocations(limit, key_type)
+    return jsonify(report)
+
+@app.route('/api/admin/memory/snapshot', methods=['POST'])
+def take_memory_snapshot():
+    """Start tracemalloc (if needed) and record a baseline snapshot for diffs"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    memory_report.take_baseline()
+    return jsonify({'message': 'Baseline snapshot recorded', 'tracing': True})
+
+@app.route('/api/admin/memory/stop', methods=['POST'])
+def stop_memory_tracing():
+    """Stop tracemalloc and drop the baseline snapshot"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    memory_report.stop()
+    return jsonify({'message': 'Memory tracing stopped', 'tracing': False})
+
+@app.route('/api/admin/db-stats', methods=['GET'])
+def get_db_stats():
+    """Per-statement-template counters, latency percentiles and captured slow-query plans"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
     limit = request.args.get('limit', 50, type=int)
-    
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT action_type, target_id, details, admin_user, timestamp
-        FROM admin_actions
-        ORDER BY timestamp DESC
-        LIMIT ?
-    ''', (limit,))
-    
-    actions = []
-    for row in cursor.fetchall():
-        actions.append({
-            'action_type': row[0],
-            'target_id': row[1],
-            'details': row[2],
-            'admin_user': row[3],
-            'timestamp': row[4]
-        })
-    
-    conn.close()
-    return jsonify({'actions': actions, 'count': len(actions)})
+    templates = QUERY_STATS.snapshot()
+    return jsonify({
+        'slow_query_ms': SLOW_QUERY_MS,
+        'statements': templates[:limit],
+        'count': len(templates)
+    })
+
+@app.route('/api/admin/db-stats/reset', methods=['POST'])
+def reset_db_stats():
+    """Clear the per-statement counters"""
+    if not admin_token_ok():
+        return jsonify({'error': 'Admin token required'}), 403
+    QUERY_STATS.reset()
+    return jsonify({'message': 'Query statistics reset'})
 
 @app.before_request
 def log_request_info():
@@ -2041,8 +2314,9 @@ def verify_with_ai():
         if not question_text or not options:
             return jsonify({'success': False, 'error': 'Missing question or options'}), 200
             
-        generator = QuestionGenerator()
-        ai_result = generator.verify_answer(question_text, options, suggested_answer)
+        generator = get_question_generator()
+        ai_result = generator.verify_answer(question_text, options, suggested_answer,
+                                            priority=rate_limiter.PRIORITY_INTERACTIVE)
         
         if not ai_result:
             return jsonify({
@@ -2075,6 +2349,34 @@ def verify_with_ai():
             'error': str(e)
         }), 200
 
+@app.route('/api/admin/verify-batch', methods=['POST'])
+def start_batch_verification():
+    """Verify many pending questions with AI in packed, rate-limited batches"""
+    data = request.json or {}
+    question_ids = data.get('question_ids')
+    try:
+        if not question_ids:
+            # Everything the pending list shows with these filters, not just the loaded pages
+            question_ids = review_queue.matching_ids('pending_review', data)
+
+        job = batch_verify.start_job(question_ids)
+        if job is None:
+            return jsonify({'error': 'No matching questions to verify'}), 400
+        return jsonify(job), 202
+    except (TypeError, ValueError):
+        return jsonify({'error': 'question_ids must be a list of question ids'}), 400
+    except Exception as e:
+        print(f"❌ Could not start batch verification: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/verify-batch/<job_id>', methods=['GET'])
+def get_batch_verification(job_id):
+    """Progress and verdicts so far for a batch verification job"""
+    job = batch_verify.job_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown verification job'}), 404
+    return jsonify(job)
+
 # ============================================================================
 # FRONTEND ROUTES
 # ============================================================================
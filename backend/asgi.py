@@ -0,0 +1,134 @@
+"""ASGI entry point that keeps slow AI routes from starving the rest of the app.
+
+Under sync gunicorn workers each Gemini call (10-20 s) holds a whole
+worker, so a handful of students in AI mode can queue every CSV-mode
+request behind them. Serve through this module instead:
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:application
+
+AI requests (bulkhead.AI_ROUTES) are awaited on their own thread pool, at
+most AI_ASYNC_MAX_CONCURRENT at a time per worker. Requests over the cap
+wait on the event loop without holding a thread, and after
+AI_ASYNC_QUEUE_TIMEOUT seconds they get a 503 with Retry-After. They skip the
+app's ai bulkhead, which would otherwise shed them at once. Every other route
+runs on a separate pool of ASGI_WSGI_THREADS threads that AI requests never
+touch, under the app's other bulkheads. Both pools run the same Flask app,
+so routes, auth, metrics and the rate limiter behave exactly as they do
+under gunicorn.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+import bulkhead
+import metrics
+from app import app
+
+AI_ASYNC_MAX_CONCURRENT = int(os.environ.get('AI_ASYNC_MAX_CONCURRENT', '64'))
+AI_ASYNC_QUEUE_TIMEOUT = float(os.environ.get('AI_ASYNC_QUEUE_TIMEOUT', '30'))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+
+AI_IN_FLIGHT = metrics.gauge(
+    'mcq_asgi_ai_in_flight',
+    'AI requests running on the ASGI AI thread pool.'
+)
+AI_WAITING = metrics.gauge(
+    'mcq_asgi_ai_waiting',
+    'AI requests waiting for a slot under AI_ASYNC_MAX_CONCURRENT.'
+)
+AI_REJECTED = metrics.counter(
+    'mcq_asgi_ai_rejected_total',
+    'AI requests turned away with 503 after waiting AI_ASYNC_QUEUE_TIMEOUT seconds.'
+)
+
+_run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+_ai_executor = ThreadPoolExecutor(max_workers=AI_ASYNC_MAX_CONCURRENT, thread_name_prefix='asgi-ai')
+_web_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='asgi-web')
+_ai_slots = None
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    """asgiref's WSGI bridge, run on the given thread pool.
+
+    Plain WsgiToAsgi is thread-sensitive: every request shares one thread,
+    which would serialise the whole app.
+    """
+
+    def __init__(self, wsgi_application, executor, extra_environ=None):
+        super().__init__(wsgi_application)
+        self.executor = executor
+        self.extra_environ = extra_environ or {}
+
+    def build_environ(self, scope, body):
+        environ = super().build_environ(scope, body)
+        environ.update(self.extra_environ)
+        return environ
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(_run_wsgi_app, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+async def _send_busy(send):
+    retry_after = max(1, int(AI_ASYNC_QUEUE_TIMEOUT))
+    body = json.dumps({
+        'error': bulkhead.busy_message('ai'),
+        'retry_after': retry_after
+    }).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': 503, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+        (b'retry-after', str(retry_after).encode('ascii'))
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _ai_executor.shutdown(wait=False)
+            _web_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _serve_ai(scope, receive, send):
+    global _ai_slots
+    if _ai_slots is None:
+        # Made on first use so it belongs to the serving loop
+        _ai_slots = asyncio.Semaphore(AI_ASYNC_MAX_CONCURRENT)
+    AI_WAITING.inc()
+    try:
+        await asyncio.wait_for(_ai_slots.acquire(), AI_ASYNC_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        AI_REJECTED.inc()
+        await _send_busy(send)
+        return
+    finally:
+        AI_WAITING.dec()
+
+    AI_IN_FLIGHT.inc()
+    try:
+        await PooledWsgiInstance(app, _ai_executor, {bulkhead.ADMITTED_ENVIRON_KEY: 'ai'})(scope, receive, send)
+    finally:
+        AI_IN_FLIGHT.dec()
+        _ai_slots.release()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] != 'http':
+        # No websocket routes; returning without accepting closes the connection
+        return
+    elif bulkhead.AI_ROUTES.match(scope['path']):
+        await _serve_ai(scope, receive, send)
+    else:
+        await PooledWsgiInstance(app, _web_executor)(scope, receive, send)
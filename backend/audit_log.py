@@ -0,0 +1,165 @@
+"""Write-behind admin audit log (the admin_actions table).
+
+record() queues an action in memory and returns without touching the
+database. A daemon thread writes the queue in one executemany and one
+commit, every AUDIT_FLUSH_SECONDS or as soon as AUDIT_BATCH_SIZE actions are
+waiting. Each action keeps the time record() was called, not the flush
+time. The queue is flushed at interpreter exit and before the log is read,
+so only a hard crash can lose the last few seconds of actions. Set
+AUDIT_BUFFER_ENABLED=0 to write every action synchronously instead. Buffers
+are per worker process.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+
+import metrics
+from db import get_db_connection
+from review_queue import decode_cursor, encode_cursor
+
+AUDIT_BUFFER_ENABLED = os.environ.get('AUDIT_BUFFER_ENABLED', '1').lower() in ('1', 'true', 'yes')
+AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', '2'))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '100'))
+# Beyond this the oldest unwritten actions are dropped (the database is down)
+AUDIT_MAX_BUFFERED = int(os.environ.get('AUDIT_MAX_BUFFERED', '10000'))
+ACTIONS_PAGE_SIZE = 50
+ACTIONS_MAX_PAGE_SIZE = 500
+
+AUDIT_WRITES = metrics.counter(
+    'mcq_admin_audit_actions_total',
+    'Admin actions written to admin_actions (written) or lost from a full buffer (dropped).',
+    ('result',)
+)
+AUDIT_FLUSHES = metrics.counter(
+    'mcq_admin_audit_flushes_total',
+    'Audit log flushes, by outcome.',
+    ('outcome',)
+)
+
+_lock = threading.Lock()
+# Serializes flushes so queued actions are written in order
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_pending = []
+_flusher = None
+_flusher_pid = None
+
+
+def _now():
+    # Same format and clock (UTC) as the column's CURRENT_TIMESTAMP default
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _write(rows):
+    conn = get_db_connection()
+    try:
+        conn.cursor().executemany('''
+            INSERT INTO admin_actions (action_type, target_id, details, admin_user, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _ensure_flusher():
+    global _flusher, _flusher_pid
+    if _flusher is not None and _flusher.is_alive() and _flusher_pid == os.getpid():
+        return
+    # Threads do not survive fork(); each worker process starts its own
+    _flusher_pid = os.getpid()
+    _flusher = threading.Thread(target=_flush_loop, name='admin-audit-flusher', daemon=True)
+    _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        _wakeup.wait(timeout=AUDIT_FLUSH_SECONDS)
+        _wakeup.clear()
+        flush()
+
+
+def record(action_type, target_id, details, admin_user='admin'):
+    """Queue one admin action for the next flush"""
+    row = (action_type, target_id, details, admin_user, _now())
+    if not AUDIT_BUFFER_ENABLED:
+        try:
+            _write([row])
+            AUDIT_WRITES.inc(result='written')
+        except Exception as e:
+            print(f"Error logging admin action: {e}")
+        return
+    with _lock:
+        _pending.append(row)
+        overflow = len(_pending) - AUDIT_MAX_BUFFERED
+        if overflow > 0:
+            del _pending[:overflow]
+            AUDIT_WRITES.inc(overflow, result='dropped')
+        full = len(_pending) >= AUDIT_BATCH_SIZE
+        _ensure_flusher()
+    if full:
+        _wakeup.set()
+
+
+def flush():
+    """Write every queued action in one transaction; returns how many were written"""
+    with _flush_lock:
+        with _lock:
+            rows = list(_pending)
+            del _pending[:]
+        if not rows:
+            return 0
+        try:
+            _write(rows)
+        except Exception as e:
+            print(f"⚠️ Could not write {len(rows)} admin actions, will retry: {e}")
+            AUDIT_FLUSHES.inc(outcome='error')
+            with _lock:
+                # Put them back ahead of anything queued since
+                _pending[:0] = rows[-AUDIT_MAX_BUFFERED:]
+            return 0
+    AUDIT_FLUSHES.inc(outcome='ok')
+    AUDIT_WRITES.inc(len(rows), result='written')
+    return len(rows)
+
+
+atexit.register(flush)
+
+
+def list_actions(cursor=None, limit=ACTIONS_PAGE_SIZE):
+    """One page of admin actions, newest first by (timestamp, id).
+
+    Returns (actions, next_cursor); next_cursor is None on the last page.
+    """
+    flush()
+    limit = max(1, min(int(limit), ACTIONS_MAX_PAGE_SIZE))
+    where, params = '', []
+    if cursor is not None:
+        timestamp, last_id = decode_cursor(cursor)
+        where, params = 'WHERE (timestamp, id) < (?, ?)', [timestamp, int(last_id)]
+    conn = get_db_connection()
+    try:
+        db_cursor = conn.cursor()
+        db_cursor.execute(f'''
+            SELECT id, action_type, target_id, details, admin_user, timestamp
+            FROM admin_actions
+            {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit + 1))
+        rows = db_cursor.fetchall()
+    finally:
+        conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+    return [{
+        'id': row[0],
+        'action_type': row[1],
+        'target_id': row[2],
+        'details': row[3],
+        'admin_user': row[4],
+        'timestamp': row[5]
+    } for row in rows], next_cursor
@@ -0,0 +1,327 @@
+"""Batch AI verification of pending review questions.
+
+start_job() packs AI_VERIFY_BATCH_SIZE questions into each prompt and runs
+the batches on a small per-worker thread pool (AI_VERIFY_MAX_CONCURRENCY)
+at bulk priority, so the shared rate limiter paces them behind live traffic.
+Each batch writes its verdicts to newly_updated_questions and bumps the
+counters in ai_verify_jobs, so any worker can answer a progress poll.
+Running jobs carry the owning worker and a heartbeat. A poll that finds a
+job whose worker died (restart, deploy, crash) takes it over and verifies
+the questions that have no verdict yet.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from db import get_db_connection
+from question_generator import get_question_generator
+from rate_limiter import PRIORITY_BULK, is_quota_error
+
+AI_VERIFY_BATCH_SIZE = int(os.environ.get('AI_VERIFY_BATCH_SIZE', '10'))
+AI_VERIFY_MAX_CONCURRENCY = int(os.environ.get('AI_VERIFY_MAX_CONCURRENCY', '3'))
+AI_VERIFY_MAX_QUESTIONS = int(os.environ.get('AI_VERIFY_MAX_QUESTIONS', '500'))
+AI_VERIFY_HEARTBEAT_SECONDS = float(os.environ.get('AI_VERIFY_HEARTBEAT_SECONDS', '10'))
+# A running job whose heartbeat is older than this belongs to a dead worker
+AI_VERIFY_STALE_SECONDS = float(os.environ.get('AI_VERIFY_STALE_SECONDS', '60'))
+
+VERIFIED_QUESTIONS = metrics.counter(
+    'mcq_ai_verified_questions_total',
+    'Questions checked by batch AI verification, by verdict.',
+    ('verdict',)
+)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_lock = threading.Lock()
+_running = set()
+_heartbeat_thread = None
+_heartbeat_pid = None
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Pool threads do not survive fork(); each worker builds its own
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=AI_VERIFY_MAX_CONCURRENCY,
+                                           thread_name_prefix='ai-verify')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _ensure_heartbeat():
+    """Start this worker's heartbeat thread if it is not running"""
+    global _heartbeat_thread, _heartbeat_pid, _running
+    with _lock:
+        if _heartbeat_thread is not None and _heartbeat_thread.is_alive() and _heartbeat_pid == os.getpid():
+            return
+        # Threads do not survive fork(); each worker process starts its own
+        if _heartbeat_pid != os.getpid():
+            _heartbeat_pid = os.getpid()
+            _running = set()
+        _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name='ai-verify-heartbeat', daemon=True)
+        _heartbeat_thread.start()
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(AI_VERIFY_HEARTBEAT_SECONDS)
+        with _lock:
+            job_ids = list(_running)
+        if not job_ids:
+            continue
+        placeholders = ', '.join('?' for _ in job_ids)
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.cursor().execute(f'''
+                UPDATE ai_verify_jobs SET heartbeat = ?
+                WHERE worker = ? AND status = 'running' AND id IN ({placeholders})
+            ''', (time.time(), _worker_name(), *job_ids))
+            conn.commit()
+        except Exception as e:
+            print(f"⚠️ AI verify heartbeat error: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+
+def _load_questions(question_ids=None, job_id=None):
+    """Active questions by id, or those of ``job_id`` that have no verdict yet"""
+    if job_id is not None:
+        where, params = 'ai_verify_job = ? AND ai_verdict IS NULL', (job_id,)
+    else:
+        where, params = f"id IN ({', '.join('?' for _ in question_ids)})", tuple(question_ids)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, question, option_a, option_b, option_c, option_d, correct_option
+            FROM newly_updated_questions
+            WHERE {where} AND is_active = 1
+            ORDER BY id
+        ''', params)
+        return [{
+            'id': row[0],
+            'question': row[1],
+            'options': {'A': row[2], 'B': row[3], 'C': row[4], 'D': row[5]},
+            'suggested_answer': row[6]
+        } for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def start_job(question_ids):
+    """Queue verification of ``question_ids``; returns the job summary, or None if none exist"""
+    ids = []
+    seen = set()
+    for question_id in question_ids:
+        question_id = int(question_id)
+        if question_id not in seen:
+            seen.add(question_id)
+            ids.append(question_id)
+    ids = ids[:AI_VERIFY_MAX_QUESTIONS]
+    if not ids:
+        return None
+    items = _load_questions(ids)
+    if not items:
+        return None
+
+    job_id = uuid.uuid4().hex[:16]
+    placeholders = ', '.join('?' for _ in items)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO ai_verify_jobs (id, status, total, worker, heartbeat) VALUES (?, 'running', ?, ?, ?)
+        ''', (job_id, len(items), _worker_name(), time.time()))
+        cursor.execute(f'''
+            UPDATE newly_updated_questions
+            SET ai_verify_job = ?, ai_verdict = NULL, ai_correct_option = NULL,
+                ai_explanation = NULL, ai_verified_at = NULL
+            WHERE id IN ({placeholders})
+        ''', (job_id, *[item['id'] for item in items]))
+        conn.commit()
+    finally:
+        conn.close()
+
+    batches = _submit(job_id, items)
+    print(f"🧪 AI verify job {job_id}: {len(items)} questions in {len(batches)} batches")
+    return {'job_id': job_id, 'total': len(items), 'batches': len(batches), 'status': 'running'}
+
+
+def _submit(job_id, items):
+    """Run ``items`` as batches on this worker's pool; returns the batches"""
+    batches = [items[i:i + AI_VERIFY_BATCH_SIZE] for i in range(0, len(items), AI_VERIFY_BATCH_SIZE)]
+    state = {'remaining': len(batches), 'quota_error': None, 'lock': threading.Lock()}
+    _ensure_heartbeat()
+    with _lock:
+        _running.add(job_id)
+    executor = _get_executor()
+    for batch in batches:
+        executor.submit(_run_batch, job_id, batch, state)
+    return batches
+
+
+def _take_over_stale(job_id):
+    """Resume a running job whose worker stopped heartbeating; True if this worker took it"""
+    cutoff = time.time() - AI_VERIFY_STALE_SECONDS
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Jobs started before heartbeats existed have none; their worker is gone after the upgrade
+        stale = "status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)"
+        cursor.execute(f'SELECT 1 FROM ai_verify_jobs WHERE id = ? AND {stale}', (job_id, cutoff))
+        if cursor.fetchone() is None:
+            return False
+        # Only one of several polling workers wins the job
+        cursor.execute(f'UPDATE ai_verify_jobs SET worker = ?, heartbeat = ? WHERE id = ? AND {stale}',
+                       (_worker_name(), time.time(), job_id, cutoff))
+        taken = cursor.rowcount == 1
+        conn.commit()
+    finally:
+        conn.close()
+    if not taken:
+        return False
+    items = _load_questions(job_id=job_id)
+    if not items:
+        _finish_job(job_id, None)
+        return True
+    batches = _submit(job_id, items)
+    print(f"♻️ AI verify job {job_id} resumed from a stopped worker: {len(items)} questions in {len(batches)} batches")
+    return True
+
+
+def _verdict_row(item, verdict, error):
+    if verdict is None:
+        return ('error', None, error or 'The model returned no verdict for this question', item['id'])
+    is_correct = verdict.get('is_correct')
+    if isinstance(is_correct, str):
+        is_correct = is_correct.strip().lower() == 'true'
+    correct_option = str(verdict.get('correct_option') or '').strip().upper()[:1] or None
+    return ('correct' if is_correct else 'incorrect', correct_option,
+            str(verdict.get('explanation') or ''), item['id'])
+
+
+def _run_batch(job_id, batch, state):
+    verdicts = {}
+    error = state['quota_error']
+    if error is None:
+        try:
+            verdicts = get_question_generator().verify_answers_batch(batch, priority=PRIORITY_BULK)
+        except Exception as e:
+            error = str(e)
+            if is_quota_error(e) or 'Quota Exceeded' in error:
+                # Remaining batches would fail the same way; skip their model calls
+                state['quota_error'] = error
+
+    rows = [_verdict_row(item, verdicts.get(str(item['id'])), error) for item in batch]
+    failed = sum(1 for row in rows if row[0] == 'error')
+    for row in rows:
+        VERIFIED_QUESTIONS.inc(verdict=row[0])
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE newly_updated_questions
+            SET ai_verdict = ?, ai_correct_option = ?, ai_explanation = ?, ai_verified_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', rows)
+        cursor.execute('UPDATE ai_verify_jobs SET verified = verified + ?, failed = failed + ? WHERE id = ?',
+                       (len(rows) - failed, failed, job_id))
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Could not store AI verify results for job {job_id}: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+    # Only the batch that finishes last, after its own write, closes the job
+    with state['lock']:
+        state['remaining'] -= 1
+        last = state['remaining'] == 0
+    if last:
+        _finish_job(job_id, state['quota_error'])
+        with _lock:
+            _running.discard(job_id)
+
+
+def _finish_job(job_id, error):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        # A worker whose job was taken over after it stalled leaves closing it to the new owner
+        cursor.execute('''
+            UPDATE ai_verify_jobs SET status = 'completed', error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker = ?
+        ''', (error, job_id, _worker_name()))
+        conn.commit()
+        if cursor.rowcount:
+            print(f"✅ AI verify job {job_id} finished")
+    except Exception as e:
+        print(f"❌ Could not close AI verify job {job_id}: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+def job_status(job_id):
+    """Progress counters plus every verdict stored so far, or None for an unknown job.
+
+    A running job whose worker stopped is resumed by the worker answering the poll.
+    """
+    try:
+        _take_over_stale(job_id)
+    except Exception as e:
+        print(f"⚠️ Could not resume AI verify job {job_id}: {e}")
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, status, total, verified, failed, error, created_at, finished_at
+            FROM ai_verify_jobs WHERE id = ?
+        ''', (job_id,))
+        job = cursor.fetchone()
+        if job is None:
+            return None
+        cursor.execute('''
+            SELECT id, correct_option, ai_verdict, ai_correct_option, ai_explanation
+            FROM newly_updated_questions
+            WHERE ai_verify_job = ? AND ai_verdict IS NOT NULL
+            ORDER BY id
+        ''', (job_id,))
+        results = [{
+            'id': row[0],
+            'suggested_answer': row[1],
+            'verdict': row[2],
+            'is_correct': row[2] == 'correct',
+            'correct_option': row[3],
+            'explanation': row[4]
+        } for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    return {
+        'job_id': job[0],
+        'status': job[1],
+        'total': job[2],
+        'verified': job[3],
+        'failed': job[4],
+        'error': job[5],
+        'created_at': job[6],
+        'finished_at': job[7],
+        'results': results
+    }
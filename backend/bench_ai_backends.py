@@ -0,0 +1,100 @@
+"""Exercise QuestionGenerator's AI paths offline with the fake model and the record/replay cache.
+
+Times single-call, fan-out and streamed generation against FakeModel with
+Gemini-like latency, checks that a recorded session replays byte-for-byte
+with no model calls, and runs a burst of calls through the rate limiter
+while the fake model fails a share of them.
+
+Usage: python bench_ai_backends.py [rounds]
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix='ai-backends-')
+os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+os.environ['AI_RATE_LIMIT_FILE'] = os.path.join(WORK_DIR, 'rate_limit.db')
+os.environ.setdefault('AI_RETRY_BASE_DELAY', '0.05')
+# Exercise retries and backoff, not the per-minute pacing
+os.environ.setdefault('AI_RPM', '6000')
+
+import rate_limiter
+from model_backends import CacheMiss, CachingModel, FakeModel
+from question_generator import QuestionGenerator
+
+
+def quiet(fn):
+    devnull = open(os.devnull, 'w')
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        return fn()
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        quiet(fn)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(samples)
+
+
+def first_item_ms(generator):
+    start = time.perf_counter()
+    stream = generator.generate_questions_stream('Physics', count=20)
+    quiet(lambda: next(stream))
+    first = (time.perf_counter() - start) * 1000
+    quiet(lambda: list(stream))
+    return first
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    try:
+        # Roughly Gemini Flash: fixed overhead plus output time per question
+        fake = FakeModel(latency=0.2, latency_per_question=0.03)
+        generator = QuestionGenerator(model=fake)
+        print(f"Generating 20 Physics questions with FakeModel (0.2 s + 0.03 s/question), {rounds} rounds")
+        print(f"  single call          {timed(lambda: generator.generate_questions('Physics', 20), rounds):8.1f} ms")
+        print(f"  fan-out              {timed(lambda: generator.generate_questions_fanout('Physics', 20), rounds):8.1f} ms")
+        print(f"  stream, first item   {statistics.mean(first_item_ms(generator) for _ in range(rounds)):8.1f} ms")
+
+        cache_dir = os.path.join(WORK_DIR, 'cache')
+        recorder = QuestionGenerator(model=CachingModel(FakeModel(latency=0.2, latency_per_question=0.03),
+                                                        cache_dir=cache_dir, model_name='fake'))
+        recorded = quiet(lambda: recorder.generate_questions_fanout('Chemistry', 20))
+        replay_model = CachingModel(cache_dir=cache_dir, model_name='fake')
+        replayer = QuestionGenerator(model=replay_model)
+        replayed = quiet(lambda: replayer.generate_questions_fanout('Chemistry', 20))
+        print()
+        print(f"Record/replay: {len(recorded)} questions recorded, replay identical: {recorded == replayed}")
+        print(f"  replayed fan-out     {timed(lambda: replayer.generate_questions_fanout('Chemistry', 20), rounds):8.1f} ms")
+        try:
+            replay_model.generate_content('a prompt nobody recorded')
+            strict = False
+        except CacheMiss:
+            strict = True
+        print(f"  unrecorded prompt raises CacheMiss: {strict}")
+
+        flaky = FakeModel(error_rate=0.2, quota_error_rate=0.1, seed=7)
+        limited = QuestionGenerator(model=flaky)
+        calls = 40
+        start = time.perf_counter()
+        answered = sum(1 for _ in range(calls) if quiet(lambda: limited.verify_answer('Q?', {'A': '1', 'B': '2'}, 'A')))
+        elapsed = time.perf_counter() - start
+        print()
+        print(f"Rate limiter with 30% failing model calls (limiter enabled: {rate_limiter.AI_RATE_LIMIT_ENABLED})")
+        print(f"  {answered}/{calls} verifications answered after {flaky.calls} model calls in {elapsed:.1f} s")
+        return 0 if recorded == replayed and strict else 1
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
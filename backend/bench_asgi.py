@@ -0,0 +1,147 @@
+"""Compare CSV-mode latency under sync gunicorn and the ASGI entry point while AI requests are in flight.
+
+Starts each server on a copy of the local database with the fake model
+backend (AI_FAKE_LATENCY seconds per call, default 3), measures CSV-mode
+requests on an idle server, then again while a burst of AI-mode requests
+is waiting on the model.
+
+Usage: python bench_asgi.py [ai_requests] [probes]
+"""
+import http.client
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+WORKERS = '2'
+CSV_PATH = '/api/questions/Physics'
+AI_PATH = '/api/questions/ai-live/Physics'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(port, path, timeout=300):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def wait_ready(port, process):
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            if get(port, '/api/check', timeout=2) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def probe(port, count, keep_going=lambda: True):
+    samples = []
+    while len(samples) < count and keep_going():
+        start = time.perf_counter()
+        get(port, CSV_PATH)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples):
+    if len(samples) < 2:
+        return f"{len(samples)} samples"
+    p99 = statistics.quantiles(samples, n=100)[98]
+    return f"p50 {statistics.median(samples):7.1f} ms   p99 {p99:8.1f} ms   ({len(samples)} requests)"
+
+
+def run(label, command, env, ai_requests, probes):
+    port = free_port()
+    process = subprocess.Popen([arg.replace('{port}', str(port)) for arg in command], cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, process)
+        probe(port, 5)
+        idle = probe(port, probes)
+
+        statuses = []
+        ai_times = []
+
+        def ai_call():
+            start = time.perf_counter()
+            try:
+                statuses.append(get(port, AI_PATH))
+            except OSError:
+                statuses.append('error')
+            ai_times.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=ai_call) for _ in range(ai_requests)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        busy = probe(port, probes, lambda: any(thread.is_alive() for thread in threads))
+        for thread in threads:
+            thread.join()
+
+        print(label)
+        print(f"  CSV idle            {summary(idle)}")
+        print(f"  CSV with AI burst   {summary(busy)}")
+        print(f"  AI burst            {statuses.count(200)}/{ai_requests} ok, "
+              f"slowest {max(ai_times):.1f} s")
+        return busy
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    ai_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    probes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    work_dir = tempfile.mkdtemp(prefix='bench-asgi-')
+    db_file = os.path.join(work_dir, 'history.db')
+    local_db = os.path.join(BASE_DIR, 'data', 'history.db')
+    if os.path.exists(local_db):
+        shutil.copy(local_db, db_file)
+    env = dict(os.environ,
+               SQLITE_DB_FILE=db_file,
+               GEMINI_API_KEY=os.environ.get('GEMINI_API_KEY', 'bench-key'),
+               AI_BACKEND='fake',
+               AI_FAKE_LATENCY=os.environ.get('AI_FAKE_LATENCY', '3'),
+               AI_POOL_ENABLED='0',
+               AI_JOBS_ENABLED='0',
+               AI_RATE_LIMIT_ENABLED='0',
+               AI_RATE_LIMIT_FILE=os.path.join(work_dir, 'rate_limit.db'),
+               PYTHONUNBUFFERED='1')
+    env.pop('DATABASE_URL', None)
+    print(f"{ai_requests} AI requests at {env['AI_FAKE_LATENCY']} s each, {WORKERS} workers per server\n")
+    try:
+        run('gunicorn, sync workers (app:app)',
+            [sys.executable, '-m', 'gunicorn', '-w', WORKERS, '-b', '127.0.0.1:{port}', '--timeout', '300', 'app:app'],
+            env, ai_requests, probes)
+        print()
+        run('uvicorn, ASGI entry point (asgi:application)',
+            [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', '{port}',
+             '--workers', WORKERS, '--log-level', 'warning'],
+            env, ai_requests, probes)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Check and benchmark json_stream.extract_json against malformed model outputs (no network).
+
+Runs the corpus in data/malformed_model_outputs.json through the tolerant
+extractor and through the old parse chain, fuzzes the extractor with random
+truncation and corruption of the clean cases, then times both parsers.
+
+Usage: python bench_json_extract.py [fuzz_iterations]
+"""
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from json_stream import IncrementalArrayParser, extract_json, extract_question_list
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'malformed_model_outputs.json')
+# \frac read as a formfeed, \theta as a tab, \beta as a backspace...
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def legacy_parse_questions(text):
+    """The parse chain generate_questions() used before the tolerant extractor"""
+    def strip_fences(raw):
+        if "```" not in raw:
+            return raw
+        parts = raw.split("```")
+        if len(parts) >= 3:
+            return parts[1].lstrip("json\n").lstrip("JSON\n").strip()
+        return raw
+
+    def clean(raw):
+        return re.sub(r",\s*([}\]])", r"\1", raw)
+
+    stripped = strip_fences(text.strip())
+    candidate = stripped
+    if not (stripped.startswith('[') and stripped.endswith(']')) and not stripped.startswith('{'):
+        start, end = stripped.find('['), stripped.rfind(']') + 1
+        if start != -1 and end > start:
+            candidate = stripped[start:end]
+    for raw in (clean(candidate), text):
+        try:
+            parsed = json.loads(clean(strip_fences(raw.strip())))
+            return parsed.get('questions') if isinstance(parsed, dict) and 'questions' in parsed else parsed
+        except Exception:
+            pass
+    start = text.find('[')
+    depth = 0
+    if start != -1:
+        for i, char in enumerate(text[start:], start):
+            if char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(clean(text[start:i + 1]))
+                    except Exception:
+                        return None
+    return None
+
+
+def legacy_parse_verdict(text):
+    """The greedy-regex extraction verify_answer() used before"""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        start = text.find('{')
+        depth = 0
+        for i in range(start, len(text)):
+            if text[i] == '{':
+                depth += 1
+            elif text[i] == '}':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:i + 1])
+                    except json.JSONDecodeError:
+                        return None
+    return None
+
+
+def check_case(case, questions_fn, verdict_fn):
+    """True if the parser recovered what the case expects, without mangled LaTeX"""
+    if case['kind'] == 'questions':
+        questions = questions_fn(case['text'])
+        if not isinstance(questions, list) or len(questions) != case['expect_count']:
+            return False
+        return not any(_CONTROL_CHARS.search(str(value)) for q in questions for value in q.values())
+    verdict = verdict_fn(case['text'])
+    return isinstance(verdict, dict) and all(key in verdict for key in case['expect_keys'])
+
+
+def new_questions(text):
+    return extract_question_list(text)[0]
+
+
+def new_verdict(text):
+    return extract_json(text)[0]
+
+
+def fuzz(clean_questions, iterations, seed=1234):
+    """Randomly truncate and corrupt a clean response; the extractor must never raise or lose a complete object"""
+    rng = random.Random(seed)
+    failures = []
+    for n in range(iterations):
+        encoded = [json.dumps(q, ensure_ascii=False) for q in clean_questions]
+        separator = rng.choice([',', ',\n', ', ', ',\n\n  '])
+        text = '[' + separator.join(encoded) + ']'
+        ends = []
+        offset = 1
+        for piece in encoded:
+            offset += len(piece)
+            ends.append(offset)
+            offset += len(separator)
+
+        expected = len(clean_questions)
+        mutation = rng.choice(['truncate', 'trailing_comma', 'fence', 'prose', 'stream'])
+        if mutation == 'truncate':
+            cut = rng.randrange(1, len(text))
+            text = text[:cut]
+            expected = sum(1 for end in ends if end <= cut)
+        elif mutation == 'trailing_comma':
+            text = text[:-1] + ',]'
+        elif mutation == 'fence':
+            text = '```json\n' + text + '\n```'
+        elif mutation == 'prose':
+            text = 'Sure! Here are the questions [as JSON]:\n' + text + '\nHope this helps {student}.'
+
+        try:
+            if mutation == 'stream':
+                parser = IncrementalArrayParser()
+                got = []
+                step = rng.randint(1, 40)
+                for i in range(0, len(text), step):
+                    got.extend(parser.feed(text[i:i + step]))
+            else:
+                got = new_questions(text) or []
+        except Exception as e:
+            failures.append((n, mutation, f'raised {e!r}'))
+            continue
+        if got[:expected] != clean_questions[:expected] or len(got) != expected:
+            failures.append((n, mutation, f'recovered {len(got)} of {expected}'))
+    return failures
+
+
+def time_parser(fn, texts, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        samples.append((time.perf_counter() - start) * 1e6 / len(texts))
+    return statistics.mean(samples)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(CORPUS_FILE) as f:
+        cases = json.load(f)['cases']
+
+    print(f"{'case':<40} {'tolerant':>9} {'legacy':>7}")
+    new_ok = legacy_ok = 0
+    for case in cases:
+        new_pass = check_case(case, new_questions, new_verdict)
+        legacy_pass = check_case(case, legacy_parse_questions, legacy_parse_verdict)
+        new_ok += new_pass
+        legacy_ok += legacy_pass
+        print(f"{case['name']:<40} {'ok' if new_pass else 'FAIL':>9} {'ok' if legacy_pass else 'FAIL':>7}")
+    print(f"{'recovered correctly':<40} {new_ok:>6}/{len(cases)} {legacy_ok:>4}/{len(cases)}")
+
+    clean = new_questions(next(c['text'] for c in cases if c['name'] == 'clean_array'))
+    failures = fuzz(clean, iterations)
+    print()
+    print(f"Fuzz: {iterations} mutated responses, {len(failures)} failures")
+    for failure in failures[:10]:
+        print('  ', failure)
+
+    question_texts = [c['text'] for c in cases if c['kind'] == 'questions']
+    print()
+    print(f"Mean parse time per question response over {len(question_texts)} corpus cases")
+    print(f"  tolerant extractor  {time_parser(new_questions, question_texts, 200):8.1f} us")
+    print(f"  legacy chain        {time_parser(legacy_parse_questions, question_texts, 200):8.1f} us")
+    clean_text = [cases[0]['text']]
+    print(f"  clean response: tolerant {time_parser(new_questions, clean_text, 2000):.1f} us, "
+          f"json.loads {time_parser(json.loads, clean_text, 2000):.1f} us")
+    return 1 if failures or new_ok != len(cases) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
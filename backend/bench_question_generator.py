@@ -0,0 +1,137 @@
+"""Benchmark QuestionGenerator against local stub models (no network).
+
+Measures per-request construction overhead, and single-call vs fan-out
+generation wall-clock time with a model whose latency grows with output length.
+
+Usage: python bench_question_generator.py [iterations]
+"""
+import itertools
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+# Measure the generator itself, not the shared quota pacing
+os.environ.setdefault('AI_RATE_LIMIT_ENABLED', '0')
+
+from google.generativeai import client as genai_client
+
+import question_generator
+from question_generator import QuestionGenerator, get_question_generator, load_api_key
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Returns a fixed, schema-valid JSON array instantly"""
+
+    def __init__(self, count=10):
+        self._text = json.dumps([{
+            'Question': f'Stub question {i}?',
+            'Option A': 'a', 'Option B': 'b', 'Option C': 'c', 'Option D': 'd',
+            'Correct Option': 'A', 'Explanation': 'stub', 'Type': 'Standard',
+            'Chapter Name': 'General', 'Subject': 'Physics'
+        } for i in range(count)])
+
+    def generate_content(self, prompt, **_kwargs):
+        return StubResponse(self._text)
+
+
+class LatencyModel(StubModel):
+    """Sleeps ``base + per_question * count`` seconds, like a model streaming its output"""
+
+    def __init__(self, base=0.05, per_question=0.02):
+        super().__init__()
+        self.base = base
+        self.per_question = per_question
+        self._calls = itertools.count(1)
+
+    def generate_content(self, prompt, **_kwargs):
+        match = re.search(r'Generate (\d+) high-quality', prompt)
+        count = int(match.group(1)) if match else 10
+        time.sleep(self.base + self.per_question * count)
+        call = next(self._calls)
+        return StubResponse(json.dumps([{
+            'Question': f'Latency question {call}-{i}?',
+            'Option A': 'a', 'Option B': 'b', 'Option C': 'c', 'Option D': 'd',
+            'Correct Option': 'A', 'Explanation': 'stub', 'Type': 'Standard',
+            'Chapter Name': 'General', 'Subject': 'Physics'
+        } for i in range(count)]))
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def per_request_construction(stub):
+    """Old behaviour: every request rescans config, reconfigures and builds a model"""
+    load_api_key.cache_clear()
+    question_generator.reset_question_generator()
+    generator = QuestionGenerator()
+    # The real model builds (or reuses) its gRPC client on first use
+    genai_client.get_default_generative_client()
+    generator.model = stub
+    generator.generate_questions('Physics', count=10)
+
+
+def shared_generator(stub):
+    generator = get_question_generator()
+    genai_client.get_default_generative_client()
+    generator.model = stub
+    generator.generate_questions('Physics', count=10)
+
+
+def report(label, samples):
+    ordered = sorted(samples)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(f"{label:<28} mean {statistics.mean(samples):8.3f} ms   "
+          f"p50 {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    stub = StubModel()
+    # Silence the generator's per-call logging while timing
+    devnull = open(os.devnull, 'w')
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        before = _timed(lambda: per_request_construction(stub), iterations)
+        question_generator.reset_question_generator()
+        after = _timed(lambda: shared_generator(stub), iterations)
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    print(f"QuestionGenerator overhead over {iterations} stubbed generate_questions() calls")
+    report('new generator per request', before)
+    report('shared generator', after)
+
+    generator = QuestionGenerator(model=LatencyModel())
+    rounds = 5
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        single = _timed(lambda: generator.generate_questions('Physics', count=20), rounds)
+        fanout = _timed(lambda: generator.generate_questions_fanout('Physics', count=20, batch_size=5), rounds)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print()
+    print(f"20 questions, model latency 50 ms + 20 ms/question, {rounds} rounds")
+    report('single call (1x20)', single)
+    report('fan-out (4x5)', fanout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Measure question search latency on a synthetic corpus.
+
+Builds a throwaway SQLite database and bank CSV holding ``questions``
+questions (default 100000). Four fifths go in the bank and the rest wait in
+the review queue. Word frequencies follow a Zipf-like curve, so common
+terms match tens of thousands of rows and rare ones a handful. The script
+rebuilds the search index, then times each query type.
+
+Usage: python bench_search.py [questions] [runs_per_query]
+"""
+import csv
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SUBJECTS = ['Physics', 'Chemistry', 'Maths', 'Biology']
+TOPIC_WORDS = ['velocity', 'acceleration', 'momentum', 'energy', 'force', 'friction', 'gravity', 'current',
+               'voltage', 'resistance', 'magnetic', 'electron', 'proton', 'neutron', 'isotope', 'molecule',
+               'reaction', 'oxidation', 'reduction', 'equilibrium', 'acid', 'base', 'salt', 'enzyme', 'cell',
+               'mitosis', 'meiosis', 'photosynthesis', 'respiration', 'chromosome', 'integral', 'derivative',
+               'matrix', 'vector', 'probability', 'triangle', 'circle', 'polynomial', 'logarithm', 'sequence']
+FILLER_WORDS = ['the', 'of', 'a', 'is', 'which', 'what', 'when', 'following', 'value', 'correct', 'statement',
+                'given', 'find', 'if', 'and', 'in', 'to', 'for', 'with', 'body', 'system', 'unit', 'ratio']
+
+
+def make_vocabulary(rng, size=20000):
+    words = list(TOPIC_WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))))
+    # Zipf-like weights: the k-th word is drawn about 1/k as often as the first
+    return words, [1.0 / rank for rank in range(1, len(words) + 1)]
+
+
+def make_question(rng, words, weights):
+    body = rng.choices(words, weights, k=rng.randint(8, 18)) + rng.sample(FILLER_WORDS, 4)
+    rng.shuffle(body)
+    options = [' '.join(rng.choices(words, weights, k=rng.randint(1, 4))) for _ in range(4)]
+    return [rng.choice(SUBJECTS), ' '.join(body).capitalize() + '?'] + options + [rng.choice('ABCD')]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    work_dir = tempfile.mkdtemp(prefix='bench-search-')
+    os.environ['SQLITE_DB_FILE'] = os.path.join(work_dir, 'search.db')
+    os.environ.pop('DATABASE_URL', None)
+    # The rebuild's bulk inserts would otherwise all be logged as slow queries
+    os.environ.setdefault('SLOW_QUERY_MS', '60000')
+    sys.path.insert(0, BASE_DIR)
+    try:
+        import search_index
+        from db import get_db_connection
+
+        rng = random.Random(42)
+        words, weights = make_vocabulary(rng)
+        questions = [make_question(rng, words, weights) for _ in range(total)]
+        bank, review = questions[:total * 4 // 5], questions[total * 4 // 5:]
+
+        search_index.BANK_FILE = os.path.join(work_dir, 'bank.csv')
+        with open(search_index.BANK_FILE, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Subject', 'Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Correct Option'])
+            writer.writerows(bank)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        # Just the review-queue columns the index reads
+        cursor.execute('''
+            CREATE TABLE newly_updated_questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, subject TEXT, question TEXT,
+                option_a TEXT, option_b TEXT, option_c TEXT, option_d TEXT, correct_option TEXT,
+                chapter_name TEXT DEFAULT 'General', status TEXT DEFAULT 'pending_review',
+                is_active BOOLEAN DEFAULT 1, ingest_batch TEXT
+            )
+        ''')
+        cursor.executemany('''
+            INSERT INTO newly_updated_questions (subject, question, option_a, option_b, option_c, option_d,
+                                                 correct_option)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', review)
+        search_index.create_tables(cursor)
+        conn.commit()
+        conn.close()
+
+        start = time.perf_counter()
+        count = search_index.rebuild()
+        print(f"Indexed {count} questions ({len(bank)} bank, {len(review)} review) "
+              f"in {time.perf_counter() - start:.1f} s\n")
+
+        queries = [
+            ('common word', 'velocity', None),
+            ('common word, subject filter', 'energy', 'Physics'),
+            ('two common words', 'force friction', None),
+            ('three words', 'acid base reaction', None),
+            ('mid-frequency word', words[60], None),
+            ('rare word', words[15000], None),
+            ('prefix as typed', 'photo', None),
+            ('short prefix', 'el', None),
+            ('no match', 'zzzzqqqq', None),
+        ]
+        print(f"{'query':32} {'hits':>5} {'ranked':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        worst = 0.0
+        for label, query, subject in queries:
+            results, ranked = search_index.search(query, subject)
+            samples = []
+            for _ in range(runs):
+                t = time.perf_counter()
+                search_index.search(query, subject)
+                samples.append((time.perf_counter() - t) * 1000)
+            worst = max(worst, percentile(samples, 0.95))
+            print(f"{label:32} {len(results):5} {'yes' if ranked else 'no':>6} {statistics.median(samples):8.2f} "
+                  f"{percentile(samples, 0.95):8.2f} {max(samples):8.2f}")
+        print(f"\nWorst p95: {worst:.1f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Admission control: separate concurrency limits per class of traffic.
+
+Every request is classified as student_read, student_write, ai or admin,
+and each class has its own limit (BULKHEAD_<CLASS>_LIMIT) on concurrent
+requests. It also has its own wait (BULKHEAD_<CLASS>_WAIT seconds) for a
+slot. A request that cannot get a slot in time is shed with a 503 and
+Retry-After. AI requests do not wait by default, so a burst of generation
+calls is turned away at once instead of occupying threads that test
+submissions need. Admin work is capped low enough that bulk approvals and
+CSV rewrites cannot crowd out students either.
+
+Limits are per worker process. They bite with threaded workers (gunicorn
+--threads, or asgi.py, which also gives AI its own thread pool and
+admits AI requests itself).
+"""
+import os
+import re
+import threading
+import time
+
+import metrics
+
+BULKHEAD_ENABLED = os.environ.get('BULKHEAD_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Set by asgi.py on requests it has already admitted
+ADMITTED_ENVIRON_KEY = 'mcq.bulkhead.admitted'
+
+# Routes that wait on Gemini for seconds at a time
+AI_ROUTES = re.compile(
+    r'^/api/(?:ai|questions/ai-live|questions/ai-stream|questions/genai|admin/generate)/[^/]+$'
+    r'|^/api/admin/verify-with-ai$'
+)
+# Never shed: scrapes and health checks must work when the app is saturated
+EXEMPT_PATHS = ('/metrics', '/api/check')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# class: (default limit, default wait in seconds)
+DEFAULTS = {
+    'student_read': (32, 5.0),
+    'student_write': (16, 15.0),
+    'ai': (4, 0.0),
+    'admin': (4, 2.0),
+}
+
+BULKHEAD_IN_USE = metrics.gauge(
+    'mcq_bulkhead_in_use',
+    'Requests holding a slot, by traffic class.',
+    ('bulkhead',)
+)
+BULKHEAD_WAITING = metrics.gauge(
+    'mcq_bulkhead_waiting',
+    'Requests waiting for a slot, by traffic class.',
+    ('bulkhead',)
+)
+BULKHEAD_REJECTED = metrics.counter(
+    'mcq_bulkhead_rejected_total',
+    'Requests shed with 503 because their class was full, by traffic class.',
+    ('bulkhead',)
+)
+BULKHEAD_WAIT = metrics.histogram(
+    'mcq_bulkhead_wait_seconds',
+    'Time admitted requests waited for a slot, by traffic class.',
+    ('bulkhead',)
+)
+
+
+class Bulkhead:
+    """A counting semaphore with a bounded wait and some bookkeeping"""
+
+    def __init__(self, name, limit, wait):
+        self.name = name
+        self.limit = limit
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        BULKHEAD_WAITING.inc(bulkhead=self.name)
+        try:
+            if self.wait > 0:
+                acquired = self._slots.acquire(timeout=self.wait)
+            else:
+                acquired = self._slots.acquire(blocking=False)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+            BULKHEAD_WAITING.dec(bulkhead=self.name)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            BULKHEAD_REJECTED.inc(bulkhead=self.name)
+            return False
+        with self._lock:
+            self.in_use += 1
+        BULKHEAD_IN_USE.inc(bulkhead=self.name)
+        BULKHEAD_WAIT.observe(time.perf_counter() - start, bulkhead=self.name)
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        BULKHEAD_IN_USE.dec(bulkhead=self.name)
+        self._slots.release()
+
+    def retry_after(self):
+        """Seconds a shed client should wait before retrying"""
+        return max(1, int(self.wait) or 5)
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'wait_seconds': self.wait, 'in_use': self.in_use,
+                    'waiting': self.waiting, 'rejected': self.rejected}
+
+
+def _from_env(name):
+    limit, wait = DEFAULTS[name]
+    prefix = f'BULKHEAD_{name.upper()}'
+    return Bulkhead(name, int(os.environ.get(f'{prefix}_LIMIT', limit)),
+                    float(os.environ.get(f'{prefix}_WAIT', wait)))
+
+
+BULKHEADS = {name: _from_env(name) for name in DEFAULTS}
+
+
+def classify(method, path):
+    """Traffic class for a request, or None if it is never limited"""
+    if path in EXEMPT_PATHS:
+        return None
+    if AI_ROUTES.match(path):
+        return 'ai'
+    if path.startswith('/api/admin/'):
+        return 'admin'
+    if path.startswith('/api/') and method in WRITE_METHODS:
+        return 'student_write'
+    # Question reads, history and the static frontend
+    return 'student_read'
+
+
+def admit(method, path):
+    """Take a slot for the request; returns (class, admitted)"""
+    name = classify(method, path) if BULKHEAD_ENABLED else None
+    if name is None:
+        return None, True
+    return name, BULKHEADS[name].acquire()
+
+
+def release(name):
+    BULKHEADS[name].release()
+
+
+def busy_message(name):
+    if name == 'ai':
+        return 'AI generation is busy right now. Please retry shortly, or use Question Bank mode.'
+    return 'The server is busy right now. Please retry shortly.'
+
+
+def stats():
+    return {'enabled': BULKHEAD_ENABLED, 'bulkheads': {name: b.stats() for name, b in BULKHEADS.items()}}
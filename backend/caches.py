@@ -0,0 +1,151 @@
+"""Named in-process LRU caches with per-cache memory budgets.
+
+Each gunicorn worker holds its own copy of every cache, so budgets are per
+worker. Budgets are read from CACHE_BUDGET_<NAME>_MB at import time; a
+cache that goes over budget evicts its least recently used entries.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(obj, _seen=None):
+    """Rough deep size of ``obj`` in bytes (DataFrames use pandas' own accounting)"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    memory_usage = getattr(obj, 'memory_usage', None)
+    if callable(memory_usage) and hasattr(obj, 'columns'):
+        return int(memory_usage(deep=True).sum())
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, _seen) + estimate_size(value, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, _seen)
+    return size
+
+
+class BudgetedCache:
+    """Thread-safe LRU cache bounded by an estimated byte budget and optional TTL"""
+
+    def __init__(self, name, budget_bytes, ttl_seconds=None):
+        self.name = name
+        self.budget_bytes = budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.budget_bytes:
+                # Larger than the whole budget: never cache it
+                self.evictions += 1
+                return False
+            self._entries[key] = (value, size, time.monotonic())
+            self._size_bytes += size
+            while self._size_bytes > self.budget_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def _remove(self, key):
+        _value, size, _stored_at = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'budget_bytes': self.budget_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+_REGISTRY = {}
+
+
+def named_cache(name, default_budget_mb, ttl_seconds=None):
+    """Create and register a cache whose budget can be overridden by CACHE_BUDGET_<NAME>_MB"""
+    env_name = f'CACHE_BUDGET_{name.upper()}_MB'
+    budget_mb = float(os.environ.get(env_name, default_budget_mb))
+    cache = BudgetedCache(name, int(budget_mb * 1024 * 1024), ttl_seconds)
+    _REGISTRY[name] = cache
+    return cache
+
+
+def all_cache_stats():
+    return [cache.stats() for cache in _REGISTRY.values()]
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, used to invalidate caches derived from it"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Per-subject question lists parsed from the bank CSV
+QUESTION_BANK = named_cache('question_bank', 64)
+# Subject list derived from the bank CSV
+SUBJECT_CATALOG = named_cache('subject_catalog', 1)
+# user_id -> user_name for users known to have a user_sessions row
+SESSION_STORE = named_cache('session_store', 8)
+# Ids of a user's recent tests in a subject -> question uids seen in them
+RECENT_UIDS = named_cache('recent_uids', 16, ttl_seconds=int(os.environ.get('RECENT_UIDS_TTL_SECONDS', '300')))
@@ -0,0 +1,254 @@
+"""Database connection layer shared by the Flask app and background workers.
+
+Every statement goes through DbCursor, which translates placeholders for
+Postgres, times the statement, keeps per-template counters and logs slow
+statements together with their query plan.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import metrics
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_FILE = os.environ.get('SQLITE_DB_FILE') or os.path.join(BASE_DIR, 'data', 'history.db')
+DATABASE_URL = os.environ.get('DATABASE_URL')
+USE_POSTGRES = bool(DATABASE_URL)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', '').lower() in ('1', 'true', 'yes')
+QUERY_SAMPLE_SIZE = 512
+
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))+\s*\)')
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def normalize_statement(query):
+    """Collapse whitespace and IN-lists so equivalent statements share a template"""
+    text = ' '.join(str(query).split())
+    return _IN_LIST.sub('(?, ...)', text)
+
+
+def redact_params(params):
+    """Describe statement parameters without leaking user data into the logs"""
+    if params is None:
+        return None
+    if SLOW_QUERY_LOG_PARAMS:
+        return [p if not isinstance(p, str) or len(p) <= 80 else p[:77] + '...' for p in params]
+    redacted = []
+    for p in params:
+        if isinstance(p, str):
+            redacted.append(f'<str:{len(p)}>')
+        else:
+            redacted.append(p)
+    return redacted
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class QueryStats:
+    """Per-template call counts, latency samples and captured plans"""
+
+    def __init__(self, sample_size=QUERY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._templates = {}
+
+    def _entry(self, template):
+        entry = self._templates.get(template)
+        if entry is None:
+            entry = {
+                'count': 0,
+                'errors': 0,
+                'slow_count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'samples': deque(maxlen=self.sample_size),
+                'plan': None,
+                'last_slow': None
+            }
+            self._templates[template] = entry
+        return entry
+
+    def record(self, template, elapsed_ms, error=False):
+        with self._lock:
+            entry = self._entry(template)
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['samples'].append(elapsed_ms)
+            if error:
+                entry['errors'] += 1
+
+    def record_slow(self, template, elapsed_ms, params):
+        with self._lock:
+            entry = self._entry(template)
+            entry['slow_count'] += 1
+            entry['last_slow'] = {
+                'duration_ms': round(elapsed_ms, 3),
+                'params': params,
+                'at': time.time()
+            }
+
+    def needs_plan(self, template):
+        with self._lock:
+            entry = self._templates.get(template)
+            return entry is not None and entry['plan'] is None
+
+    def set_plan(self, template, plan):
+        with self._lock:
+            self._entry(template)['plan'] = plan
+
+    def snapshot(self):
+        with self._lock:
+            items = [(template, dict(entry, samples=list(entry['samples'])))
+                     for template, entry in self._templates.items()]
+        rows = []
+        for template, entry in items:
+            samples = entry.pop('samples')
+            rows.append(dict(
+                entry,
+                template=template,
+                total_ms=round(entry['total_ms'], 3),
+                max_ms=round(entry['max_ms'], 3),
+                avg_ms=round(entry['total_ms'] / entry['count'], 3) if entry['count'] else 0.0,
+                p50_ms=round(_percentile(samples, 50), 3),
+                p95_ms=round(_percentile(samples, 95), 3)
+            ))
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._templates.clear()
+
+
+QUERY_STATS = QueryStats()
+
+
+def explain_statement(connection, query, params=None):
+    """Return the plan for a statement (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres)"""
+    if not query.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    cursor = connection.cursor()
+    try:
+        prefix = 'EXPLAIN ' if USE_POSTGRES else 'EXPLAIN QUERY PLAN '
+        if USE_POSTGRES:
+            # A failed EXPLAIN must not abort the caller's transaction
+            cursor.execute('SAVEPOINT mcq_explain')
+        try:
+            if params is None:
+                cursor.execute(prefix + query)
+            else:
+                cursor.execute(prefix + query, params)
+            rows = cursor.fetchall()
+        finally:
+            if USE_POSTGRES:
+                cursor.execute('ROLLBACK TO SAVEPOINT mcq_explain')
+    finally:
+        cursor.close()
+    if USE_POSTGRES:
+        return [row[0] for row in rows]
+    return [row[-1] for row in rows]
+
+
+class DbCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _run(self, method, query, params, many=False):
+        if USE_POSTGRES:
+            query = query.replace('?', '%s')
+        template = normalize_statement(query)
+        start = time.perf_counter()
+        try:
+            if params is None:
+                result = method(query)
+            else:
+                result = method(query, params)
+        except Exception:
+            QUERY_STATS.record(template, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        QUERY_STATS.record(template, elapsed_ms)
+        if elapsed_ms >= SLOW_QUERY_MS:
+            self._log_slow(template, query, params, elapsed_ms, many)
+        return result
+
+    def _log_slow(self, template, query, params, elapsed_ms, many):
+        if many:
+            shown = f'<{len(params)} rows>' if hasattr(params, '__len__') else '<batch>'
+        else:
+            shown = redact_params(params)
+        QUERY_STATS.record_slow(template, elapsed_ms, shown)
+        print(f"🐢 Slow query ({elapsed_ms:.1f} ms): {template} params={shown}")
+        if many or not QUERY_STATS.needs_plan(template):
+            return
+        try:
+            QUERY_STATS.set_plan(template, explain_statement(self._cursor.connection, query, params))
+        except Exception as e:
+            QUERY_STATS.set_plan(template, [f'EXPLAIN failed: {e}'])
+
+    def execute(self, query, params=None):
+        return self._run(self._cursor.execute, query, params)
+
+    def executemany(self, query, params):
+        return self._run(self._cursor.executemany, query, params, many=True)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class DbConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return DbCursor(self._conn.cursor())
+
+    def commit(self):
+        with metrics.timed('db_commit'):
+            return self._conn.commit()
+
+    def rollback(self):
+        return self._conn.rollback()
+
+    def close(self):
+        return self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def get_db_connection(*_args, **_kwargs):
+    if USE_POSTGRES:
+        import psycopg2
+        return DbConnection(psycopg2.connect(DATABASE_URL))
+    return DbConnection(_sqlite_connect(DB_FILE))
+
+
+_sqlite_connect = sqlite3.connect
+
+
+def connect_sqlite_file(path, **kwargs):
+    """Open a local SQLite file, even when sqlite3.connect is redirected to Postgres"""
+    return _sqlite_connect(path, **kwargs)
+
+
+if USE_POSTGRES:
+    sqlite3.connect = get_db_connection
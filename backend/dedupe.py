@@ -0,0 +1,309 @@
+"""Ingest-time duplicate detection for AI-generated questions.
+
+filter_questions() checks each new question against the CSV bank and the
+review queue (pending and approved rows of newly_updated_questions). It
+first looks for an exact question_uid match, then for a near-duplicate:
+question text and options are cut into word shingles, summarised with
+MinHash and bucketed with LSH, and candidates sharing a bucket are kept
+only if their real Jaccard similarity reaches AI_DEDUPE_THRESHOLD.
+
+Exact duplicates are always dropped. Near-duplicates are dropped, or kept
+with a note for the reviewer when AI_DEDUPE_MODE=flag. The index lives in
+each worker. It picks up new review rows by id on every check and is
+updated directly by approve, reject and edit. Approvals append to the bank
+CSV and hand the new rows over too, so the bank is only reloaded when
+something else changed the file.
+"""
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import caches
+import metrics
+from db import get_db_connection
+from question_utils import compute_question_uid, normalize_text
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BANK_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
+AI_DEDUPE_MODE = os.environ.get('AI_DEDUPE_MODE', 'drop').strip().lower()
+AI_DEDUPE_THRESHOLD = float(os.environ.get('AI_DEDUPE_THRESHOLD', '0.6'))
+AI_DEDUPE_SHINGLE_SIZE = int(os.environ.get('AI_DEDUPE_SHINGLE_SIZE', '2'))
+# 32 bands of 4 rows: pairs at Jaccard 0.5 share a bucket ~87% of the time, at 0.6 ~99%
+NUM_PERM = 128
+BANDS = 32
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+DEDUPE_RESULTS = metrics.counter(
+    'mcq_ai_dedupe_total',
+    'Generated questions checked for duplicates, by result (unique, exact, near).',
+    ('result',)
+)
+
+
+def _fields(q, subject=None):
+    """(subject, question, options) from a generated dict or a review row dict"""
+    subject = subject or q.get('Subject') or q.get('subject') or ''
+    question = q.get('Question', q.get('question', ''))
+    options = [q.get(f'Option {letter}', q.get(f'option_{letter.lower()}', '')) for letter in 'ABCD']
+    return subject, question, options
+
+
+def _shingles(question, options, size=AI_DEDUPE_SHINGLE_SIZE):
+    words = _NON_WORD.sub(' ', normalize_text(question)).split()
+    if len(words) < size:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    # Options count as whole tokens, so reordered answer choices still match
+    shingles.update('opt:' + _NON_WORD.sub(' ', normalize_text(option)).strip() for option in options if option)
+    return frozenset(shingles)
+
+
+def _minhash(shingles):
+    hashes = np.fromiter((hash(s) % _PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+    if not len(hashes):
+        hashes = np.zeros(1, dtype=np.uint64)
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class DedupeIndex:
+    """Exact uid set plus a MinHash/LSH index over shingled question text, per subject"""
+
+    def __init__(self, threshold=AI_DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self._entries = {}
+        self._buckets = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, subject, question, options, source, ref=None):
+        uid = compute_question_uid(subject, question, options)
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None:
+                # Already known: a review row approved into the bank becomes 'bank', never the reverse
+                if entry['source'] != 'bank':
+                    entry['source'] = source
+                    entry['ref'] = ref if ref is not None else entry['ref']
+                return uid
+            shingles = _shingles(question, options)
+            keys = [(normalize_text(subject),) + key for key in _band_keys(_minhash(shingles))]
+            self._entries[uid] = {'source': source, 'ref': ref, 'question': str(question or ''),
+                                  'shingles': shingles, 'keys': keys}
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(uid)
+        return uid
+
+    def remove(self, subject, question, options, keep_bank=True):
+        uid = compute_question_uid(subject, question, options)
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None or (keep_bank and entry['source'] == 'bank'):
+                return False
+            self._drop(uid)
+        return True
+
+    def _drop(self, uid):
+        entry = self._entries.pop(uid)
+        for key in entry['keys']:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(uid)
+                if not bucket:
+                    del self._buckets[key]
+
+    def set_source(self, subject, question, options, source):
+        uid = compute_question_uid(subject, question, options)
+        with self._lock:
+            if uid in self._entries:
+                self._entries[uid]['source'] = source
+
+    def remove_source(self, source):
+        with self._lock:
+            for uid in [uid for uid, entry in self._entries.items() if entry['source'] == source]:
+                self._drop(uid)
+
+    def has_uid(self, uid):
+        with self._lock:
+            return uid in self._entries
+
+    def find(self, subject, question, options):
+        """The best existing match as a dict (kind, similarity, source, ref, question), or None"""
+        uid = compute_question_uid(subject, question, options)
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None:
+                return {'kind': 'exact', 'similarity': 1.0, 'source': entry['source'],
+                        'ref': entry['ref'], 'question': entry['question']}
+            shingles = _shingles(question, options)
+            subject_key = normalize_text(subject)
+            candidates = set()
+            for key in _band_keys(_minhash(shingles)):
+                candidates.update(self._buckets.get((subject_key,) + key, ()))
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                score = _jaccard(shingles, self._entries[candidate]['shingles'])
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is None or best_score < self.threshold:
+                return None
+            entry = self._entries[best]
+            return {'kind': 'near', 'similarity': round(best_score, 3), 'source': entry['source'],
+                    'ref': entry['ref'], 'question': entry['question']}
+
+    def stats(self):
+        with self._lock:
+            by_source = {}
+            for entry in self._entries.values():
+                by_source[entry['source']] = by_source.get(entry['source'], 0) + 1
+            return {'entries': len(self._entries), 'buckets': len(self._buckets), 'by_source': by_source}
+
+
+INDEX = DedupeIndex()
+_refresh_lock = threading.Lock()
+_bank_signature = None
+_last_review_id = 0
+
+
+def _load_bank():
+    df = pd.read_csv(BANK_FILE, encoding='utf-8', dtype=str, on_bad_lines='skip')
+    df.columns = df.columns.str.strip()
+    columns = ['Subject', 'Question', 'Option A', 'Option B', 'Option C', 'Option D']
+    if any(column not in df.columns for column in columns):
+        return 0
+    df = df[columns].fillna('')
+    for row_number, row in enumerate(df.itertuples(index=False, name=None)):
+        INDEX.add(row[0], row[1], list(row[2:]), 'bank', row_number)
+    return len(df)
+
+
+def refresh():
+    """Bring the index up to date with the bank CSV and newly inserted review rows"""
+    global _bank_signature, _last_review_id
+    with _refresh_lock:
+        signature = caches.file_signature(BANK_FILE)
+        if signature != _bank_signature:
+            INDEX.remove_source('bank')
+            count = _load_bank() if signature is not None else 0
+            _bank_signature = signature
+            # Approved review rows are bank questions too; reload them with the rest
+            _last_review_id = 0
+            print(f"🧬 Dedupe index loaded {count} bank questions")
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, subject, question, option_a, option_b, option_c, option_d, status
+                FROM newly_updated_questions
+                WHERE id > ? AND is_active = 1 AND status IN ('pending_review', 'approved')
+                ORDER BY id
+            ''', (_last_review_id,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            INDEX.add(row[1], row[2], list(row[3:7]), 'bank' if row[7] == 'approved' else 'review', row[0])
+            _last_review_id = max(_last_review_id, row[0])
+
+
+def duplicate_note(match):
+    where = 'question bank' if match['source'] == 'bank' else 'review queue'
+    return f"Possible duplicate ({match['similarity']:.0%} similar) of {where} question: {match['question'][:160]}"
+
+
+def filter_questions(questions, subject=None):
+    """Split generated questions into ``(kept, dropped)``.
+
+    ``kept`` is a list of ``(question, note)`` pairs; ``note`` is None unless
+    the question is a flagged near-duplicate. ``dropped`` is a list of
+    ``(question, match)`` pairs. Kept questions join the index straight away,
+    so repeats within one batch are caught too; call discard() for them if
+    they are not saved after all.
+    """
+    if AI_DEDUPE_MODE == 'off':
+        return [(q, None) for q in questions], []
+    try:
+        refresh()
+    except Exception as e:
+        # A stale index still catches most repeats; never block saving on it
+        print(f"⚠️ Dedupe index refresh failed: {e}")
+
+    kept, dropped = [], []
+    for q in questions:
+        q_subject, question, options = _fields(q, subject)
+        match = INDEX.find(q_subject, question, options)
+        if match is None:
+            DEDUPE_RESULTS.inc(result='unique')
+            INDEX.add(q_subject, question, options, 'new')
+            kept.append((q, None))
+            continue
+        DEDUPE_RESULTS.inc(result=match['kind'])
+        if match['kind'] == 'near' and AI_DEDUPE_MODE == 'flag':
+            INDEX.add(q_subject, question, options, 'new')
+            kept.append((q, duplicate_note(match)))
+        else:
+            dropped.append((q, match))
+    if dropped:
+        print(f"🧬 Dropped {len(dropped)} duplicate generated questions "
+              f"({sum(1 for _, m in dropped if m['kind'] == 'exact')} exact)")
+    return kept, dropped
+
+
+def discard(questions, subject=None):
+    """Forget kept questions whose insert failed, so a retry is not dropped as their duplicate"""
+    for q in questions:
+        INDEX.remove(*_fields(q, subject))
+
+
+def record_approved(rows, first_row, bank_before, bank_after):
+    """Approved review rows (dicts with subject, question, option_a-d) were appended to the bank.
+
+    They are bank rows ``first_row``, ``first_row + 1``, ... now (counting
+    from 1). If the index had loaded the bank as it was just before the
+    append (signature ``bank_before``), it takes ``bank_after`` as its own, so
+    the next refresh() does not reload the whole file for this append.
+    """
+    global _bank_signature
+    with _refresh_lock:
+        for row_number, row in enumerate(rows, start=first_row - 1):
+            INDEX.add(*_fields(row), 'bank', row_number)
+        if _bank_signature is not None and _bank_signature == bank_before:
+            _bank_signature = bank_after
+
+
+def forget(rows):
+    """Rejected review rows no longer block new questions (bank copies still do)"""
+    for row in rows:
+        INDEX.remove(*_fields(row))
+
+
+def record_edited(old_row, new_row, question_id):
+    """Re-index a review row whose text or options were edited"""
+    INDEX.remove(*_fields(old_row))
+    INDEX.add(*_fields(new_row), 'review', question_id)
+
+
+def stats():
+    return dict(INDEX.stats(), mode=AI_DEDUPE_MODE, threshold=INDEX.threshold,
+                bank_loaded=_bank_signature is not None, last_review_id=_last_review_id)
@@ -0,0 +1,144 @@
+"""Streaming CSV and XLSX exports of the question bank and approved questions.
+
+Rows are read EXPORT_CHUNK_ROWS at a time: the bank CSV with pandas'
+chunked reader, approved questions by id ranges. Memory use therefore stays
+flat whatever the size. CSV output is sent as it is produced. XLSX is
+written with openpyxl's write-only mode to a temporary file, because the
+zip container is only complete once the last row is written, and is then
+sent in chunks.
+"""
+import csv
+import io
+import os
+import tempfile
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from db import get_db_connection
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BANK_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '1000'))
+SEND_CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+APPROVED_COLUMNS = [
+    ('id', 'ID'),
+    ('subject', 'Subject'),
+    ('question', 'Question'),
+    ('option_a', 'Option A'),
+    ('option_b', 'Option B'),
+    ('option_c', 'Option C'),
+    ('option_d', 'Option D'),
+    ('correct_option', 'Correct Option'),
+    ('question_type', 'Type'),
+    ('chapter_name', 'Chapter Name'),
+    ('explanation', 'Explanation'),
+    ('source', 'Source'),
+    ('reviewed_at', 'Reviewed At'),
+    ('reviewed_by', 'Reviewed By')
+]
+
+
+def bank_rows(subject=None):
+    """(header, row iterator) for the question bank CSV"""
+    header = list(pd.read_csv(BANK_FILE, dtype=str, encoding='utf-8', nrows=0).columns)
+
+    def rows():
+        for chunk in pd.read_csv(BANK_FILE, dtype=str, encoding='utf-8', keep_default_na=False,
+                                 on_bad_lines='skip', chunksize=EXPORT_CHUNK_ROWS):
+            if subject:
+                chunk = chunk[chunk['Subject'].str.strip() == subject]
+            yield from chunk.itertuples(index=False, name=None)
+
+    return header, rows()
+
+
+def approved_rows(subject=None):
+    """(header, row iterator) for approved review questions, read in id ranges"""
+    columns = ', '.join(column for column, _title in APPROVED_COLUMNS)
+
+    def rows():
+        last_id = 0
+        while True:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                query = f'''
+                    SELECT {columns} FROM newly_updated_questions
+                    WHERE status = 'approved' AND is_active = 1 AND id > ?
+                '''
+                params = [last_id]
+                if subject:
+                    query += ' AND subject = ?'
+                    params.append(subject)
+                cursor.execute(query + ' ORDER BY id LIMIT ?', (*params, EXPORT_CHUNK_ROWS))
+                batch = cursor.fetchall()
+            finally:
+                conn.close()
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1][0]
+
+    return [title for _column, title in APPROVED_COLUMNS], rows()
+
+
+DATASETS = {'bank': bank_rows, 'approved': approved_rows}
+
+
+def stream_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(['' if value is None else value for value in row])
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _xlsx_cell(sheet, value):
+    if not isinstance(value, str):
+        # Numbers, dates and None are written as they are
+        return value
+    cell = WriteOnlyCell(sheet, ILLEGAL_CHARACTERS_RE.sub('', value))
+    # A question starting with "=" is text, not a formula
+    cell.data_type = 's'
+    return cell
+
+
+def stream_xlsx(header, rows):
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Questions')
+        sheet.append(header)
+        for row in rows:
+            sheet.append([_xlsx_cell(sheet, value) for value in row])
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(SEND_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export(dataset, fmt, subject=None):
+    """Byte chunks of ``dataset`` ('bank' or 'approved') as ``fmt`` ('csv' or 'xlsx')"""
+    header, rows = DATASETS[dataset](subject)
+    if fmt == 'xlsx':
+        return stream_xlsx(header, rows)
+    return stream_csv(header, rows)
@@ -0,0 +1,354 @@
+"""Background AI question generation jobs for admins.
+
+submit_job() stores a queued row in generation_jobs and returns at once. A
+dispatcher thread in each worker claims queued jobs, never letting more than
+AI_JOBS_MAX_CONCURRENT run across all workers, and generates them in
+batches of AI_JOB_BATCH_SIZE at bulk priority. Each batch is saved to
+newly_updated_questions for review and bumps the job's counters, so any
+worker can answer a progress poll. Running jobs carry a heartbeat; jobs
+whose worker died (restart, deploy, crash) are re-queued and resume from
+the number of questions already saved.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from db import USE_POSTGRES, get_db_connection
+from question_generator import get_question_generator, is_valid_question, save_generated_questions
+from question_utils import generated_question_uid
+from rate_limiter import PRIORITY_BULK, is_quota_error
+
+AI_JOBS_ENABLED = os.environ.get('AI_JOBS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+AI_JOBS_MAX_CONCURRENT = int(os.environ.get('AI_JOBS_MAX_CONCURRENT', '2'))
+AI_JOB_BATCH_SIZE = int(os.environ.get('AI_JOB_BATCH_SIZE', '10'))
+AI_JOB_MAX_COUNT = int(os.environ.get('AI_JOB_MAX_COUNT', '500'))
+AI_JOB_MAX_EMPTY_BATCHES = int(os.environ.get('AI_JOB_MAX_EMPTY_BATCHES', '3'))
+AI_JOBS_POLL_SECONDS = float(os.environ.get('AI_JOBS_POLL_SECONDS', '3'))
+# A running job whose heartbeat is older than this belongs to a dead worker
+AI_JOBS_STALE_SECONDS = float(os.environ.get('AI_JOBS_STALE_SECONDS', '60'))
+
+FINISHED_STATUSES = ('completed', 'cancelled', 'failed')
+# Postgres advisory lock held by transactions that claim a job
+CLAIM_LOCK_ID = 7460212
+
+JOB_QUESTIONS = metrics.counter(
+    'mcq_ai_job_questions_total',
+    'Questions saved for review by background generation jobs, by subject.',
+    ('subject',)
+)
+JOBS_FINISHED = metrics.counter(
+    'mcq_ai_jobs_finished_total',
+    'Background generation jobs finished, by final status.',
+    ('status',)
+)
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_dispatcher = None
+_dispatcher_pid = None
+_executor = None
+_running = set()
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_dispatcher():
+    """Start this worker's dispatcher thread if it is not running"""
+    global _dispatcher, _dispatcher_pid, _executor, _running
+    if not AI_JOBS_ENABLED:
+        return
+    with _lock:
+        if _dispatcher is not None and _dispatcher.is_alive() and _dispatcher_pid == os.getpid():
+            return
+        # Threads do not survive fork(); each worker process starts its own
+        _dispatcher_pid = os.getpid()
+        _executor = ThreadPoolExecutor(max_workers=AI_JOBS_MAX_CONCURRENT, thread_name_prefix='ai-job')
+        _running = set()
+        _dispatcher = threading.Thread(target=_dispatch_loop, name='ai-job-dispatcher', daemon=True)
+        _dispatcher.start()
+
+
+def _dispatch_loop():
+    while True:
+        try:
+            _heartbeat()
+            _requeue_stale()
+            while True:
+                with _lock:
+                    if len(_running) >= AI_JOBS_MAX_CONCURRENT:
+                        break
+                job_id = _claim_next()
+                if job_id is None:
+                    break
+                with _lock:
+                    _running.add(job_id)
+                _executor.submit(_run_job, job_id)
+        except Exception as e:
+            print(f"⚠️ AI job dispatcher error: {e}")
+        _wakeup.wait(timeout=AI_JOBS_POLL_SECONDS)
+        _wakeup.clear()
+
+
+def _heartbeat():
+    with _lock:
+        job_ids = list(_running)
+    if not job_ids:
+        return
+    placeholders = ', '.join('?' for _ in job_ids)
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute(f'UPDATE generation_jobs SET heartbeat = ? WHERE id IN ({placeholders})',
+                              (time.time(), *job_ids))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _requeue_stale():
+    cutoff = time.time() - AI_JOBS_STALE_SECONDS
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE generation_jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'cancelling' AND heartbeat < ?
+        ''', (cutoff,))
+        cursor.execute('''
+            UPDATE generation_jobs SET status = 'queued', worker = NULL
+            WHERE status = 'running' AND heartbeat < ?
+        ''', (cutoff,))
+        if cursor.rowcount:
+            print(f"♻️ Re-queued {cursor.rowcount} generation jobs left behind by a stopped worker")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _claim_next():
+    """Mark the oldest queued job as running in this worker, if the global limit allows"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            # Workers claim one at a time, so each running-count check sees every earlier claim.
+            # SQLite gets the same from the write lock its UPDATE takes.
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (CLAIM_LOCK_ID,))
+        cursor.execute("SELECT id FROM generation_jobs WHERE status = 'queued' ORDER BY created_at, id LIMIT 1")
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        # The running-count check and the claim are one statement, under the claim lock on Postgres
+        cursor.execute('''
+            UPDATE generation_jobs
+            SET status = 'running', worker = ?, heartbeat = ?, started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+            WHERE id = ? AND status = 'queued'
+              AND (SELECT COUNT(*) FROM generation_jobs WHERE status IN ('running', 'cancelling')) < ?
+        ''', (_worker_name(), time.time(), row[0], AI_JOBS_MAX_CONCURRENT))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        return row[0] if claimed else None
+    finally:
+        conn.close()
+
+
+def submit_job(subject, count, chapters=None):
+    """Queue generation of ``count`` questions for ``subject``; returns the job summary"""
+    chapters = [str(c).strip() for c in (chapters or []) if str(c).strip()]
+    job_id = uuid.uuid4().hex[:16]
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('''
+            INSERT INTO generation_jobs (id, subject, requested, chapters, status)
+            VALUES (?, ?, ?, ?, 'queued')
+        ''', (job_id, subject, count, json.dumps(chapters) if chapters else None))
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"🗂️ Queued generation job {job_id}: {count} {subject} questions")
+    ensure_dispatcher()
+    _wakeup.set()
+    return job_status(job_id)
+
+
+def cancel_job(job_id):
+    """Cancel a queued job now, or ask a running one to stop after its current batch"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE generation_jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'queued'
+        ''', (job_id,))
+        cursor.execute("UPDATE generation_jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'",
+                       (job_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    return job_status(job_id)
+
+
+def _batch_focus(job, batch_number):
+    chapters = job['chapters']
+    if chapters:
+        chapter = chapters[batch_number % len(chapters)]
+        return f'Write every question about the chapter "{chapter}".'
+    return (f"This is batch {batch_number + 1} of a larger set. Cover different chapters and "
+            f"sub-topics than earlier batches would; avoid the most common textbook examples.")
+
+
+def _save_batch(job_id, subject, questions):
+    """Save a batch for review (deduped) and bump the job's counters"""
+    ids = save_generated_questions(questions, subject=subject)
+    if ids is None:
+        raise RuntimeError('Could not save generated questions')
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('''
+            UPDATE generation_jobs
+            SET saved = saved + ?, batches = batches + 1, heartbeat = ?
+            WHERE id = ?
+        ''', (len(ids), time.time(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+    JOB_QUESTIONS.inc(len(ids), subject=subject)
+    return ids
+
+
+def _set_generated(job_id, count):
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('UPDATE generation_jobs SET generated = generated + ? WHERE id = ?', (count, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _finish(job_id, status, error=None):
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('''
+            UPDATE generation_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, error, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+    JOBS_FINISHED.inc(status=status)
+    print(f"{'✅' if status == 'completed' else '⏹️'} Generation job {job_id} {status}{f': {error}' if error else ''}")
+
+
+def _run_job(job_id):
+    try:
+        _generate_job(job_id)
+    except Exception as e:
+        print(f"❌ Generation job {job_id} crashed: {e}")
+        try:
+            _finish(job_id, 'failed', str(e))
+        except Exception as db_error:
+            print(f"❌ Could not mark generation job {job_id} failed: {db_error}")
+    finally:
+        with _lock:
+            _running.discard(job_id)
+        _wakeup.set()
+
+
+def _generate_job(job_id):
+    job = job_status(job_id)
+    generator = get_question_generator()
+    # Drops repeats across this run's batches; a resumed job continues from its saved count
+    seen = set()
+    empty_batches = 0
+    batch_number = job['batches']
+    while True:
+        job = job_status(job_id)
+        if job['status'] == 'cancelling':
+            _finish(job_id, 'cancelled')
+            return
+        remaining = job['requested'] - job['saved']
+        if remaining <= 0:
+            _finish(job_id, 'completed')
+            return
+        if empty_batches >= AI_JOB_MAX_EMPTY_BATCHES:
+            _finish(job_id, 'failed', f'{empty_batches} batches in a row produced no usable questions')
+            return
+
+        size = min(AI_JOB_BATCH_SIZE, remaining)
+        try:
+            raw = generator.generate_questions(job['subject'], count=size,
+                                               focus=_batch_focus(job, batch_number),
+                                               priority=PRIORITY_BULK) or []
+        except Exception as e:
+            if is_quota_error(e) or 'Quota Exceeded' in str(e):
+                _finish(job_id, 'failed', str(e))
+                return
+            print(f"⚠️ Generation job {job_id} batch failed: {e}")
+            raw = []
+        batch_number += 1
+        _set_generated(job_id, len(raw))
+
+        questions = []
+        for q in raw:
+            if not isinstance(q, dict) or not is_valid_question(q):
+                continue
+            uid = generated_question_uid(q, job['subject'])
+            if uid in seen:
+                continue
+            seen.add(uid)
+            questions.append(q)
+        saved = _save_batch(job_id, job['subject'], questions[:remaining])
+        empty_batches = 0 if saved else empty_batches + 1
+
+
+def _row_to_job(row):
+    return {
+        'job_id': row[0],
+        'subject': row[1],
+        'requested': row[2],
+        'chapters': json.loads(row[3]) if row[3] else [],
+        'status': row[4],
+        'generated': row[5],
+        'saved': row[6],
+        'batches': row[7],
+        'error': row[8],
+        'worker': row[9],
+        'created_at': row[10],
+        'started_at': row[11],
+        'finished_at': row[12]
+    }
+
+
+_JOB_COLUMNS = '''id, subject, requested, chapters, status, generated, saved, batches, error, worker,
+                  created_at, started_at, finished_at'''
+
+
+def job_status(job_id):
+    """Progress of one job, or None if it does not exist"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {_JOB_COLUMNS} FROM generation_jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit=20):
+    """Most recent jobs first"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {_JOB_COLUMNS} FROM generation_jobs ORDER BY created_at DESC, id LIMIT ?',
+                       (limit,))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return [_row_to_job(row) for row in rows]
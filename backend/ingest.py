@@ -0,0 +1,398 @@
+"""Chunked ingestion of uploaded question CSV and XLSX files into the review queue.
+
+The upload is streamed to disk, then read CSV_INGEST_CHUNK_ROWS rows at a
+time: CSVs with pandas' chunked reader, XLSX with openpyxl's read-only
+mode, which streams the first sheet row by row. Each chunk is cleaned and
+validated with column operations. Rows whose question_uid is already in
+the bank, the review queue or earlier in the same file are skipped, and the
+rest are inserted with one executemany per chunk.
+Every job has a row in csv_ingest_jobs holding running counters and a
+row-level report of skipped rows (capped at CSV_INGEST_MAX_REPORTED_ROWS),
+so any worker can answer a progress poll. Files up to
+CSV_INGEST_INLINE_BYTES are ingested inside the request; larger ones run on
+a background thread.
+"""
+import json
+import os
+import re
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+import pandas as pd
+from openpyxl.utils.exceptions import InvalidFileException
+
+import dedupe
+import metrics
+import search_index
+import subject_stats
+from db import get_db_connection
+from question_utils import compute_question_uid
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+CSV_UPLOAD_DIR = os.environ.get('CSV_UPLOAD_DIR', os.path.join(BASE_DIR, 'data', 'uploads'))
+CSV_INGEST_CHUNK_ROWS = int(os.environ.get('CSV_INGEST_CHUNK_ROWS', '2000'))
+CSV_INGEST_INLINE_BYTES = int(os.environ.get('CSV_INGEST_INLINE_BYTES', str(256 * 1024)))
+CSV_INGEST_MAX_REPORTED_ROWS = int(os.environ.get('CSV_INGEST_MAX_REPORTED_ROWS', '500'))
+
+# Normalised header -> column name used in newly_updated_questions
+REQUIRED_COLUMNS = {
+    'subject': 'subject',
+    'question': 'question',
+    'optiona': 'option_a',
+    'optionb': 'option_b',
+    'optionc': 'option_c',
+    'optiond': 'option_d',
+    'correctoption': 'correct_option'
+}
+DISPLAY_NAMES = {
+    'subject': 'Subject',
+    'question': 'Question',
+    'optiona': 'Option A',
+    'optionb': 'Option B',
+    'optionc': 'Option C',
+    'optiond': 'Option D',
+    'correctoption': 'Correct Option'
+}
+OPTIONAL_COLUMNS = {
+    'questiontype': 'question_type',
+    'type': 'question_type',
+    'chaptername': 'chapter_name',
+    'chapter': 'chapter_name',
+    'explanation': 'explanation'
+}
+UPLOAD_TYPES = ('.csv', '.xlsx')
+# "B", "b", "B)", "Option B"
+_CORRECT_OPTION = r'^(?:option\s*)?([a-d])(?:[^a-z0-9]|$)'
+
+INGESTED_ROWS = metrics.counter(
+    'mcq_csv_ingest_rows_total',
+    'Uploaded CSV rows processed, by result (inserted, duplicate, invalid).',
+    ('result',)
+)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Pool threads do not survive fork(); each worker builds its own
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-ingest')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def normalize_header(name):
+    return re.sub(r'[^a-z0-9]', '', str(name).strip().lower())
+
+
+def upload_type(filename):
+    """The file extension an upload is read by; ValueError for anything else"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in UPLOAD_TYPES:
+        raise ValueError('Upload a .csv or .xlsx file')
+    return extension
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _xlsx_rows(path):
+    """(sheet row number, values) for each non-blank row of the first sheet"""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Some exporters write a wrong dimension record, which would cut rows short
+        sheet.reset_dimensions()
+        for row_number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+            if any(_cell_text(value).strip() for value in values):
+                yield row_number, values
+    finally:
+        workbook.close()
+
+
+def _xlsx_columns(values):
+    return [_cell_text(value).strip() or f'Unnamed: {i}' for i, value in enumerate(values)]
+
+
+def _xlsx_chunks(path, chunk_rows):
+    rows = _xlsx_rows(path)
+    _header_row, header = next(rows, (None, ()))
+    columns = _xlsx_columns(header)
+    batch, index = [], []
+    for row_number, values in rows:
+        values = [_cell_text(value) for value in values[:len(columns)]]
+        batch.append(values + [''] * (len(columns) - len(values)))
+        # Indexed so that _row_number() gives the sheet row
+        index.append(row_number - 2)
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame(batch, columns=columns, index=index)
+            batch, index = [], []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, index=index)
+
+
+def iter_chunks(path, chunk_rows=CSV_INGEST_CHUNK_ROWS):
+    """DataFrames of at most ``chunk_rows`` rows, every value a string"""
+    if path.lower().endswith('.xlsx'):
+        return _xlsx_chunks(path, chunk_rows)
+    return pd.read_csv(path, dtype=str, encoding='utf-8-sig', chunksize=chunk_rows)
+
+
+def read_header(path):
+    """Map normalised header names to the file's own; ValueError if unusable"""
+    try:
+        if path.lower().endswith('.xlsx'):
+            _header_row, header = next(_xlsx_rows(path), (None, None))
+            if header is None:
+                raise ValueError('Uploaded file is empty')
+            columns = _xlsx_columns(header)
+        else:
+            columns = pd.read_csv(path, dtype=str, encoding='utf-8-sig', nrows=0).columns
+    except pd.errors.EmptyDataError:
+        raise ValueError('Uploaded file is empty')
+    except UnicodeDecodeError:
+        raise ValueError('Uploaded CSV must be UTF-8 encoded')
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise ValueError('Uploaded file is not a valid .xlsx workbook')
+    col_map = {}
+    for column in columns:
+        col_map.setdefault(normalize_header(column), column)
+    missing = [DISPLAY_NAMES[key] for key in REQUIRED_COLUMNS if key not in col_map]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return col_map
+
+
+def _row_number(index):
+    # As a spreadsheet shows it: the header is row 1
+    return int(index) + 2
+
+
+def prepare_chunk(chunk, col_map):
+    """Clean one chunk; returns (valid rows as a DataFrame, [(row number, reason)])"""
+    wanted = dict(REQUIRED_COLUMNS)
+    wanted.update({key: column for key, column in OPTIONAL_COLUMNS.items() if key in col_map})
+    df = pd.DataFrame(index=chunk.index)
+    for key, column in wanted.items():
+        if column not in df:
+            df[column] = chunk[col_map[key]].fillna('').astype(str).str.strip()
+    if 'question_type' not in df:
+        df['question_type'] = 'Standard'
+    df['question_type'] = df['question_type'].mask(df['question_type'] == '', 'Standard')
+    for column in ('chapter_name', 'explanation'):
+        if column not in df:
+            df[column] = ''
+    df['correct_option'] = df['correct_option'].str.extract(_CORRECT_OPTION, flags=re.IGNORECASE,
+                                                            expand=False).str.upper()
+
+    problems = pd.DataFrame({
+        'Missing Subject': df['subject'] == '',
+        'Missing Question': df['question'] == '',
+        'Missing Option A': df['option_a'] == '',
+        'Missing Option B': df['option_b'] == '',
+        'Missing Option C': df['option_c'] == '',
+        'Missing Option D': df['option_d'] == '',
+        'Correct Option must be A, B, C or D': df['correct_option'].isna()
+    })
+    invalid = problems.any(axis=1)
+    errors = [(_row_number(index), '; '.join(problems.columns[flags])) for index, flags in
+              zip(problems.index[invalid], problems[invalid].to_numpy())]
+    return df[~invalid].copy(), errors
+
+
+class _Job:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.rows_read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.report = []
+
+    def skip(self, row_number, reason):
+        if len(self.report) < CSV_INGEST_MAX_REPORTED_ROWS:
+            self.report.append({'row': row_number, 'reason': reason})
+
+
+def _save_progress(cursor, job):
+    cursor.execute('''
+        UPDATE csv_ingest_jobs
+        SET rows_read = ?, inserted = ?, duplicates = ?, invalid = ?, report = ?
+        WHERE id = ?
+    ''', (job.rows_read, job.inserted, job.duplicates, job.invalid, json.dumps(job.report), job.job_id))
+
+
+def _known_uids():
+    try:
+        dedupe.refresh()
+    except Exception as e:
+        print(f"⚠️ Dedupe index refresh failed: {e}")
+    return dedupe.INDEX
+
+
+def ingest_file(job_id, path, col_map):
+    """Ingest the CSV at ``path`` for job ``job_id``, committing after every chunk"""
+    job = _Job(job_id)
+    index = _known_uids()
+    seen = set()
+    columns = ['subject', 'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option',
+               'question_type', 'chapter_name', 'explanation']
+    last_indexed = 0
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for chunk in iter_chunks(path):
+            job.rows_read += len(chunk)
+            df, errors = prepare_chunk(chunk, col_map)
+            job.invalid += len(errors)
+            skipped = list(errors)
+
+            uids = [compute_question_uid(s, q, [a, b, c, d]) for s, q, a, b, c, d in
+                    df[['subject', 'question', 'option_a', 'option_b', 'option_c', 'option_d']]
+                    .itertuples(index=False, name=None)]
+            keep = []
+            for row_index, uid in zip(df.index, uids):
+                reason = None
+                if uid in seen:
+                    reason = 'Duplicate of an earlier row in this file'
+                elif index.has_uid(uid):
+                    reason = 'Already in the question bank or review queue'
+                if reason:
+                    skipped.append((_row_number(row_index), reason))
+                else:
+                    seen.add(uid)
+                keep.append(reason is None)
+            df = df[keep]
+            job.duplicates += len(keep) - len(df)
+            for row_number, reason in sorted(skipped):
+                job.skip(row_number, reason)
+
+            rows = [row + ('pending_review', 'csv', job_id) for row in
+                    df[columns].itertuples(index=False, name=None)]
+            if rows:
+                cursor.executemany(f'''
+                    INSERT INTO newly_updated_questions
+                    ({', '.join(columns)}, status, source, ingest_batch)
+                    VALUES ({', '.join('?' for _ in columns)}, ?, ?, ?)
+                ''', rows)
+                last_indexed = search_index.add_review_batch(cursor, job_id, last_indexed)
+                subject_stats.record_inserted(cursor, df['subject'], 'pending_review')
+            job.inserted += len(rows)
+            _save_progress(cursor, job)
+            conn.commit()
+            INGESTED_ROWS.inc(len(rows), result='inserted')
+            INGESTED_ROWS.inc(len(keep) - len(df), result='duplicate')
+            INGESTED_ROWS.inc(len(errors), result='invalid')
+    finally:
+        conn.close()
+    return job
+
+
+def save_upload(upload_file):
+    """Stream an uploaded file to disk; returns (job id, path)"""
+    extension = upload_type(upload_file.filename)
+    os.makedirs(CSV_UPLOAD_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex[:16]
+    path = os.path.join(CSV_UPLOAD_DIR, f'{job_id}{extension}')
+    upload_file.save(path)
+    return job_id, path
+
+
+def start_job(job_id, path, filename, admin_user, on_finish=None):
+    """Validate the header, record the job and ingest inline (small files) or in the background.
+
+    Raises ValueError for an unusable file. ``on_finish(job)`` runs after a
+    successful ingest. Returns the job summary.
+    """
+    try:
+        col_map = read_header(path)
+    except Exception:
+        os.remove(path)
+        raise
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('''
+            INSERT INTO csv_ingest_jobs (id, filename, admin_user, status, size_bytes)
+            VALUES (?, ?, ?, 'running', ?)
+        ''', (job_id, filename, admin_user, os.path.getsize(path)))
+        conn.commit()
+    finally:
+        conn.close()
+
+    if os.path.getsize(path) <= CSV_INGEST_INLINE_BYTES:
+        _run_job(job_id, path, col_map, on_finish)
+    else:
+        print(f"📥 CSV ingest job {job_id}: {filename} ({os.path.getsize(path)} bytes) queued")
+        _get_executor().submit(_run_job, job_id, path, col_map, on_finish)
+    return job_status(job_id)
+
+
+def _run_job(job_id, path, col_map, on_finish):
+    error = None
+    try:
+        job = ingest_file(job_id, path, col_map)
+        print(f"📥 CSV ingest job {job_id}: {job.inserted} inserted, {job.duplicates} duplicates, "
+              f"{job.invalid} invalid of {job.rows_read} rows")
+        if on_finish is not None:
+            on_finish(job_status(job_id))
+    except Exception as e:
+        error = str(e)
+        print(f"❌ CSV ingest job {job_id} failed: {error}")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute('''
+            UPDATE csv_ingest_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', ('failed' if error else 'completed', error, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def job_status(job_id):
+    """Counters and the skipped-row report of one job, or None if it does not exist"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, filename, status, size_bytes, rows_read, inserted, duplicates, invalid,
+                   report, error, admin_user, created_at, finished_at
+            FROM csv_ingest_jobs WHERE id = ?
+        ''', (job_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        'job_id': row[0],
+        'filename': row[1],
+        'status': row[2],
+        'size_bytes': row[3],
+        'rows_read': row[4],
+        'inserted': row[5],
+        'duplicates': row[6],
+        'invalid': row[7],
+        'skipped_rows': json.loads(row[8]) if row[8] else [],
+        'error': row[9],
+        'admin_user': row[10],
+        'created_at': row[11],
+        'finished_at': row[12]
+    }
@@ -0,0 +1,321 @@
+"""Tolerant JSON extraction for model output.
+
+Models wrap JSON in prose or code fences, leave trailing commas, forget to
+double LaTeX backslashes (``\\frac``) and get cut off at the token limit.
+extract_json() first doubles every backslash that cannot start a JSON
+escape, so LaTeX alone never leaves the C json decoder. Output that is
+still not valid JSON is parsed in one linear pass that tolerates the rest;
+within it, each array element or object value that is well-formed on its
+own still goes through the C decoder. When the text is truncated it
+returns the outermost container with every element that was complete.
+IncrementalArrayParser does the same for streamed responses, yielding array
+elements as they finish.
+"""
+import json
+import re
+
+_WHITESPACE = ' \t\r\n'
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_STRING_SPECIAL = re.compile(r'["\\]')
+_HEX_DIGITS = set('0123456789abcdefABCDEF')
+# \n followed by letters is usually a real newline; only these are taken as LaTeX
+_LATEX_N_COMMANDS = {
+    'nu', 'ne', 'neq', 'nabla', 'neg', 'not', 'ni', 'nleq', 'ngeq', 'nless', 'ngtr',
+    'nmid', 'nparallel', 'nsubseteq', 'nsupseteq', 'nexists', 'newline', 'normalsize'
+}
+# An escaped backslash pair, or a backslash that cannot start a JSON escape: \alpha, \sqrt, \u
+# without four hex digits, and escapes that are really LaTeX (\frac, \beta, \theta, \rightarrow,
+# \neq). Pairs match so that a run is read left to right; both become exactly two backslashes. A
+# backslash ending the text is left alone, since the text may be cut short there.
+_BACKSLASH = re.compile(
+    r'\\(?:\\|(?=[^"\\/bfnrtu]|u(?![0-9a-fA-F]{4})|[bfrt][a-z]|n(?:%s)(?![a-z])))'
+    % '|'.join(sorted((word[1:] for word in _LATEX_N_COMMANDS), key=len, reverse=True))
+)
+_DECODER = json.JSONDecoder()
+_SKIP = re.compile(r'[ \t\r\n:]+')
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_LITERALS = (('true', True), ('false', False), ('null', None),
+             ('True', True), ('False', False), ('None', None))
+
+
+def _double_lone_backslashes(text, start):
+    """``text`` with every lone backslash from ``start`` on doubled, and whether there were any"""
+    if '\\' not in text:
+        return text, False
+    repaired = _BACKSLASH.sub(r'\\\\', text[start:])
+    if len(repaired) == len(text) - start:
+        return text, False
+    return text[:start] + repaired, True
+
+
+def _decode(text, i):
+    """(value, end) if the JSON at text[i] decodes as it is, else (None, None)"""
+    try:
+        return _DECODER.raw_decode(text, i)
+    except ValueError:
+        return None, None
+
+
+def _scan_string(text, i):
+    """Read a string body starting after its opening quote (lone backslashes already doubled).
+
+    Returns (value, index after the closing quote), with None as the index
+    if the text ends first.
+    """
+    parts = []
+    start = i
+    n = len(text)
+    while True:
+        match = _STRING_SPECIAL.search(text, i)
+        if match is None:
+            break
+        i = match.start()
+        parts.append(text[start:i])
+        if text[i] == '"':
+            return ''.join(parts), i + 1
+        if i + 1 >= n:
+            return ''.join(parts), None
+        escape = text[i + 1]
+        if escape == 'u':
+            code = int(text[i + 2:i + 6], 16)
+            i += 6
+            # Join UTF-16 surrogate pairs the way json.loads does
+            if 0xD800 <= code < 0xDC00 and text[i:i + 2] == '\\u' and i + 6 <= n:
+                low_hex = text[i + 2:i + 6]
+                if all(c in _HEX_DIGITS for c in low_hex) and 0xDC00 <= int(low_hex, 16) < 0xE000:
+                    code = 0x10000 + ((code - 0xD800) << 10) + (int(low_hex, 16) - 0xDC00)
+                    i += 6
+            parts.append(chr(code))
+        else:
+            parts.append(_ESCAPES[escape])
+            i += 2
+        start = i
+    parts.append(text[start:])
+    return ''.join(parts), None
+
+
+def _looks_like_json_start(text, i):
+    """True if the bracket at text[i] opens JSON rather than prose like "[ICSE format]" """
+    j = i + 1
+    while j < len(text) and text[j] in _WHITESPACE:
+        j += 1
+    if j == len(text):
+        return True
+    if text[i] == '{':
+        return text[j] in '"}'
+    return text[j] in '{["]-0123456789tfnTFN'
+
+
+def _find_start(text, notes):
+    """Index of the first JSON '[' or '{', looking inside a code fence first if there is one"""
+    fence = text.find('```')
+    if fence != -1:
+        body = text.find('\n', fence)
+        if body != -1:
+            for i in range(body, len(text)):
+                if text[i] in '[{' and _looks_like_json_start(text, i):
+                    notes.add('code_fence')
+                    return i
+    for i, ch in enumerate(text):
+        if ch in '[{' and _looks_like_json_start(text, i):
+            if text[:i].strip():
+                notes.add('leading_text')
+            return i
+    return -1
+
+
+def extract_json(text):
+    """Parse the first JSON array or object in ``text`` as tolerantly as possible.
+
+    Returns ``(value, notes)``. ``value`` is None if no array or object was
+    found. ``notes`` is a sorted list of the repairs that were needed (e.g.
+    'trailing_comma', 'latex_backslash', 'truncated').
+    """
+    notes = set()
+    if not text:
+        return None, []
+    i = _find_start(text, notes)
+    if i == -1:
+        return None, []
+    text, repaired = _double_lone_backslashes(text, i)
+    if repaired:
+        notes.add('latex_backslash')
+
+    # Well-formed output (the common case) decodes at C speed
+    value, end = _decode(text, i)
+    if end is not None:
+        return value, sorted(notes)
+
+    n = len(text)
+    # Frames are [container, pending_key, after_comma, needs_comma]
+    stack = []
+    root = None
+    done = False
+
+    def emit(value):
+        nonlocal root, done
+        if not stack:
+            root = value
+            done = True
+            return
+        frame = stack[-1]
+        if frame[3]:
+            notes.add('missing_comma')
+        frame[2] = False
+        frame[3] = True
+        container = frame[0]
+        if isinstance(container, list):
+            container.append(value)
+        elif frame[1] is not None:
+            container[frame[1]] = value
+            frame[1] = None
+        else:
+            notes.add('skipped_value')
+
+    while i < n and not done:
+        ch = text[i]
+        if ch in _WHITESPACE or ch == ':':
+            i = _SKIP.match(text, i).end()
+        elif ch == '{' or ch == '[':
+            if stack:
+                # Elements that are fine on their own still decode at C speed
+                value, end = _decode(text, i)
+                if end is not None:
+                    i = end
+                    emit(value)
+                    continue
+            stack.append([{} if ch == '{' else [], None, False, False])
+            i += 1
+        elif ch == '}' or ch == ']':
+            frame = stack.pop()
+            if frame[2]:
+                notes.add('trailing_comma')
+            if frame[1] is not None:
+                notes.add('dangling_key')
+            i += 1
+            emit(frame[0])
+        elif ch == ',':
+            stack[-1][2] = True
+            stack[-1][3] = False
+            i += 1
+        elif ch == '"':
+            value, end = _scan_string(text, i + 1)
+            if end is None:
+                break
+            i = end
+            frame = stack[-1]
+            if isinstance(frame[0], dict) and frame[1] is None:
+                if frame[3]:
+                    notes.add('missing_comma')
+                frame[1] = value
+                frame[2] = False
+            else:
+                emit(value)
+        else:
+            match = _NUMBER.match(text, i)
+            if match:
+                if match.end() == n:
+                    # A number touching the end of the text may be cut short
+                    break
+                literal = match.group()
+                emit(float(literal) if any(c in literal for c in '.eE') else int(literal))
+                i = match.end()
+                continue
+            for word, value in _LITERALS:
+                if text.startswith(word, i):
+                    emit(value)
+                    i += len(word)
+                    break
+            else:
+                notes.add('skipped_text')
+                i += 1
+
+    if not done:
+        notes.add('truncated')
+        # Incomplete inner containers are dropped; the root keeps finished elements
+        root = stack[0][0]
+    return root, sorted(notes)
+
+
+def extract_question_list(text):
+    """Extract a list of question objects from a model response.
+
+    Accepts a bare array or an object with a "questions" array. Returns
+    ``(questions, notes)``; ``questions`` is None when nothing usable was found.
+    """
+    value, notes = extract_json(text)
+    if isinstance(value, dict) and isinstance(value.get('questions'), list):
+        value = value['questions']
+    if not isinstance(value, list):
+        return None, notes
+    return [q for q in value if isinstance(q, dict)], notes
+
+
+class IncrementalArrayParser:
+    """Feed text chunks; get back each top-level array element object once it is complete.
+
+    Anything before the first ``[`` (prose, code fences) is skipped. The
+    scanner tracks string and escape state, so brackets inside strings do
+    not confuse it; each finished object goes through extract_json().
+    """
+
+    def __init__(self):
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+        self._text = ''
+        self._pos = 0
+        self.errors = []
+        self.notes = set()
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        self._text += chunk
+        found = []
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif not self._started:
+                if ch == '[':
+                    self._started = True
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                if ch == '{' and self._depth == 1:
+                    self._object_start = i
+                self._depth += 1
+            elif ch in ']}':
+                self._depth -= 1
+                if ch == '}' and self._depth == 1 and self._object_start is not None:
+                    value, notes = extract_json(text[self._object_start:i + 1])
+                    self._object_start = None
+                    self.notes.update(notes)
+                    if isinstance(value, dict) and 'truncated' not in notes:
+                        found.append(value)
+                    else:
+                        self.errors.append(f'unparseable object ({", ".join(notes) or "not an object"})')
+            i += 1
+
+        # Drop consumed text so long responses do not grow the buffer
+        keep_from = self._object_start if self._object_start is not None else i
+        self._text = text[keep_from:]
+        if self._object_start is not None:
+            self._object_start = 0
+        self._pos = i - keep_from
+        return found
+
+    @property
+    def finished(self):
+        return self._started and self._depth == 0
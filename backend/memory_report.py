@@ -0,0 +1,97 @@
+"""tracemalloc-based memory introspection for the admin memory endpoint.
+
+Tracing is off by default because it slows allocations down. Start it with
+MEMORY_TRACE=1, or on demand from the admin endpoint.
+"""
+import os
+import threading
+import tracemalloc
+
+TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', '10'))
+
+_lock = threading.Lock()
+_baseline = None
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+
+
+def stop():
+    global _baseline
+    with _lock:
+        _baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_tracing():
+    return tracemalloc.is_tracing()
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+
+
+def _format_stat(stat):
+    frame = stat.traceback[0]
+    return {
+        'location': f'{frame.filename}:{frame.lineno}',
+        'size_bytes': stat.size,
+        'count': stat.count
+    }
+
+
+def take_baseline():
+    """Start tracing if needed and remember a snapshot for later diffs"""
+    global _baseline
+    start()
+    with _lock:
+        _baseline = _snapshot()
+
+
+def has_baseline():
+    return _baseline is not None
+
+
+def top_allocations(limit=20, key_type='lineno'):
+    if not tracemalloc.is_tracing():
+        return []
+    return [_format_stat(stat) for stat in _snapshot().statistics(key_type)[:limit]]
+
+
+def diff_allocations(limit=20, key_type='lineno'):
+    """Largest allocation changes since take_baseline()"""
+    with _lock:
+        baseline = _baseline
+    if baseline is None or not tracemalloc.is_tracing():
+        return []
+    diffs = _snapshot().compare_to(baseline, key_type)[:limit]
+    return [dict(_format_stat(stat), size_diff_bytes=stat.size_diff, count_diff=stat.count_diff)
+            for stat in diffs]
+
+
+def traced_memory():
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    return {'current_bytes': current, 'peak_bytes': peak}
+
+
+def process_max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return rss if os.uname().sysname == 'Darwin' else rss * 1024
+
+
+if os.environ.get('MEMORY_TRACE', '').lower() in ('1', 'true', 'yes'):
+    start()
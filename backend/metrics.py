@@ -0,0 +1,242 @@
+"""Lightweight in-process metrics exposed in the Prometheus text format.
+
+Each worker process keeps its own registry; scrape every worker (or sum the
+series) when running under gunicorn with several workers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}'
+        ]
+        for name, key, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}'
+        ]
+        with self._lock:
+            snapshot = [(key, dict(state, buckets=list(state['buckets'])))
+                        for key, state in self._values.items()]
+        for key, state in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{le} {state["count"]}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+HTTP_REQUESTS = counter(
+    'mcq_http_requests_total',
+    'HTTP requests handled, by route, method and status code.',
+    ('route', 'method', 'status')
+)
+HTTP_LATENCY = histogram(
+    'mcq_http_request_duration_seconds',
+    'HTTP request latency in seconds, by route and method.',
+    ('route', 'method')
+)
+HTTP_IN_FLIGHT = gauge(
+    'mcq_http_requests_in_flight',
+    'HTTP requests currently being handled, by route.',
+    ('route',)
+)
+HTTP_REQUEST_BYTES = counter(
+    'mcq_http_request_bytes_total',
+    'Request payload bytes received, by route.',
+    ('route',)
+)
+HTTP_RESPONSE_BYTES = counter(
+    'mcq_http_response_bytes_total',
+    'Response payload bytes sent (non-streamed responses only), by route.',
+    ('route',)
+)
+OPERATION_LATENCY = histogram(
+    'mcq_operation_duration_seconds',
+    'Latency of instrumented internal operations in seconds.',
+    ('operation',)
+)
+STAGE_LATENCY = histogram(
+    'mcq_request_stage_duration_seconds',
+    'Latency of named stages inside request handlers, by route and stage.',
+    ('route', 'stage')
+)
+
+
+@contextmanager
+def timed(operation):
+    """Time a block (or, used as a decorator, a function) into OPERATION_LATENCY"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        OPERATION_LATENCY.observe(time.perf_counter() - start, operation=operation)
+
+
+@contextmanager
+def span(stage):
+    """Time a named stage of the current request.
+
+    Stage timings are aggregated into STAGE_LATENCY and, inside a request,
+    kept on ``g.metrics_spans`` so they can be reported in a Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        route = 'background'
+        if has_request_context():
+            route = g.get('metrics_route', 'unmatched')
+            g.setdefault('metrics_spans', []).append((stage, elapsed))
+        STAGE_LATENCY.observe(elapsed, route=route, stage=stage)
+
+
+def server_timing_header(spans, total=None):
+    """Format recorded (stage, seconds) spans as a Server-Timing header value"""
+    entries = [f'{stage};dur={elapsed * 1000:.2f}' for stage, elapsed in spans]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def render_latest():
+    """Render every registered metric in the Prometheus text exposition format"""
+    return REGISTRY.render()
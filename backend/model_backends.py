@@ -0,0 +1,228 @@
+"""Pluggable model backends for QuestionGenerator.
+
+AI_BACKEND picks what QuestionGenerator talks to:
+
+- ``gemini`` (default): the real Gemini model.
+- ``record``: Gemini behind a disk cache. Each response is stored under a
+  hash of the model name, generation config and prompt, and later identical
+  calls are answered from disk.
+- ``replay``: the disk cache only. A prompt that was never recorded raises
+  CacheMiss, so nothing touches the network.
+- ``fake``: FakeModel, a deterministic local model that returns
+  schema-valid questions and verdicts. AI_FAKE_* set its latency and error
+  rates.
+
+Every backend exposes ``generate_content(prompt, stream=False)`` and returns
+objects with a ``.text`` attribute (an iterable of them when streaming),
+like google.generativeai.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import metrics
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+AI_BACKEND = os.environ.get('AI_BACKEND', 'gemini').strip().lower()
+AI_CACHE_DIR = os.environ.get('AI_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'ai_cache'))
+AI_FAKE_LATENCY = float(os.environ.get('AI_FAKE_LATENCY', '0'))
+AI_FAKE_LATENCY_PER_QUESTION = float(os.environ.get('AI_FAKE_LATENCY_PER_QUESTION', '0'))
+AI_FAKE_ERROR_RATE = float(os.environ.get('AI_FAKE_ERROR_RATE', '0'))
+AI_FAKE_QUOTA_ERROR_RATE = float(os.environ.get('AI_FAKE_QUOTA_ERROR_RATE', '0'))
+AI_FAKE_SEED = int(os.environ.get('AI_FAKE_SEED', '0'))
+BACKENDS = ('gemini', 'record', 'replay', 'fake')
+# Streamed replays are cut into chunks of about this many characters
+STREAM_CHUNK_CHARS = 200
+
+CACHE_REQUESTS = metrics.counter(
+    'mcq_ai_cache_requests_total',
+    'Model calls answered by the record/replay cache, by result (hit, miss, stored).',
+    ('result',)
+)
+
+_GENERATE_PROMPT = re.compile(r'Generate (\d+) high-quality Multiple Choice Questions \(MCQs\) for the subject: ([^\n.]+)')
+_CHAPTER_FOCUS = re.compile(r'the chapter "([^"]+)"')
+_BATCH_VERIFY_PROMPT = re.compile(r'Questions \(JSON\):\s*(\[.*\])\s*\n', re.DOTALL)
+_SUGGESTED = re.compile(r'suggests the correct answer is option: *([A-D])')
+
+
+class ModelResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class CacheMiss(LookupError):
+    """Replay mode was asked for a prompt that was never recorded"""
+
+
+def _chunks(text):
+    return [ModelResponse(text[i:i + STREAM_CHUNK_CHARS]) for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [ModelResponse('')]
+
+
+class FakeModel:
+    """Deterministic offline stand-in for Gemini.
+
+    The same prompt always gets the same answer. Generation prompts get
+    the requested number of valid questions, and verification prompts get
+    a verdict per question. Latency and failures are configurable, and
+    failures are drawn from a per-call sequence so runs repeat exactly.
+    """
+
+    def __init__(self, latency=AI_FAKE_LATENCY, latency_per_question=AI_FAKE_LATENCY_PER_QUESTION,
+                 error_rate=AI_FAKE_ERROR_RATE, quota_error_rate=AI_FAKE_QUOTA_ERROR_RATE, seed=AI_FAKE_SEED):
+        self.latency = latency
+        self.latency_per_question = latency_per_question
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.seed = seed
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(f'{self.seed}:{prompt}'.encode('utf-8')).hexdigest()
+        return random.Random(int(digest[:16], 16)), digest[:8]
+
+    def _questions(self, prompt, count, subject):
+        rng, tag = self._rng(prompt)
+        chapter_match = _CHAPTER_FOCUS.search(prompt)
+        questions = []
+        for i in range(count):
+            a, b = rng.randint(2, 99), rng.randint(2, 99)
+            answers = [a + b, a + b + rng.randint(1, 9), abs(a - b) + 1, a * b]
+            correct = rng.randrange(4)
+            answers[0], answers[correct] = answers[correct], answers[0]
+            questions.append({
+                'Question': f'[{tag}-{i + 1}] In a {subject} experiment, what is {a} + {b}?',
+                'Option A': str(answers[0]),
+                'Option B': str(answers[1]),
+                'Option C': str(answers[2]),
+                'Option D': str(answers[3]),
+                'Correct Option': 'ABCD'[correct],
+                'Explanation': f'{a} + {b} = {a + b}.',
+                'Type': rng.choice(['Standard', 'Reasoning', 'Assertion']),
+                'Chapter Name': chapter_match.group(1) if chapter_match else f'Chapter {rng.randint(1, 12)}',
+                'Subject': subject
+            })
+        return questions
+
+    def _answer(self, prompt):
+        """Return (response text, number of questions it covers)"""
+        match = _GENERATE_PROMPT.search(prompt)
+        if match:
+            count = int(match.group(1))
+            return json.dumps(self._questions(prompt, count, match.group(2).strip())), count
+
+        match = _BATCH_VERIFY_PROMPT.search(prompt)
+        if match:
+            try:
+                items = json.loads(match.group(1))
+            except ValueError:
+                items = []
+            verdicts = [{
+                'id': item.get('id'),
+                'is_correct': True,
+                'correct_option': item.get('suggested_answer') or 'A',
+                'explanation': 'Checked by the offline fake model.'
+            } for item in items if isinstance(item, dict)]
+            return json.dumps(verdicts), len(verdicts)
+
+        match = _SUGGESTED.search(prompt)
+        return json.dumps({
+            'is_correct': True,
+            'correct_option': match.group(1) if match else 'A',
+            'explanation': 'Checked by the offline fake model.'
+        }), 1
+
+    def generate_content(self, prompt, stream=False, **_kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        text, size = self._answer(prompt)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        roll = random.Random(f'{self.seed}:call:{call}').random()
+        if roll < self.quota_error_rate:
+            raise Exception('429 Resource has been exhausted (e.g. check quota). [fake model]')
+        if roll < self.quota_error_rate + self.error_rate:
+            raise Exception('503 The service is currently unavailable. [fake model]')
+        output_time = self.latency_per_question * size
+        if stream:
+            return self._stream(_chunks(text), output_time)
+        if output_time > 0:
+            time.sleep(output_time)
+        return ModelResponse(text)
+
+    @staticmethod
+    def _stream(chunks, output_time):
+        # Output time is spread over the chunks, as a real stream would deliver them
+        for chunk in chunks:
+            if output_time > 0:
+                time.sleep(output_time / len(chunks))
+            yield chunk
+
+
+class CachingModel:
+    """Record/replay wrapper: answers repeated prompts from a content-addressed disk cache"""
+
+    def __init__(self, model=None, cache_dir=AI_CACHE_DIR, model_name='', model_config=None, replay_only=False):
+        self.model = model
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.model_config = model_config or {}
+        self.replay_only = replay_only or model is None
+
+    def cache_key(self, prompt):
+        material = json.dumps({'model': self.model_name, 'config': self.model_config, 'prompt': prompt},
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)['text']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key, prompt, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent workers never read half a file
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'config': self.model_config, 'recorded_at': time.time(),
+                       'prompt': prompt, 'text': text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        key = self.cache_key(prompt)
+        text = self._load(key)
+        if text is not None:
+            CACHE_REQUESTS.inc(result='hit')
+            return _chunks(text) if stream else ModelResponse(text)
+        CACHE_REQUESTS.inc(result='miss')
+        if self.replay_only:
+            raise CacheMiss(f'No recorded model response for prompt {key[:12]} in {self.cache_dir}')
+
+        response = self.model.generate_content(prompt, stream=stream, **kwargs)
+        if stream:
+            # Record the full text while still handing chunks through as they arrive
+            return self._record_stream(key, prompt, response)
+        text = getattr(response, 'text', None) or ''
+        self._store(key, prompt, text)
+        CACHE_REQUESTS.inc(result='stored')
+        return response
+
+    def _record_stream(self, key, prompt, response):
+        parts = []
+        for chunk in response:
+            parts.append(getattr(chunk, 'text', None) or '')
+            yield chunk
+        self._store(key, prompt, ''.join(parts))
+        CACHE_REQUESTS.inc(result='stored')
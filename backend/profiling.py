@@ -0,0 +1,112 @@
+"""On-demand request profiling backed by a bounded on-disk ring buffer.
+
+A request is profiled when an admin asks for it explicitly or when it is
+picked by PROFILE_SAMPLE_RATE. Only one request is profiled at a time per
+worker; everything else pays a single flag check.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'data', 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0)
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+
+_PROFILE_NAME = re.compile(r'^[0-9]+-[A-Za-z0-9_.-]+\.prof$')
+_active_lock = threading.Lock()
+
+
+class ProfileRingBuffer:
+    """Keeps at most ``max_files`` cProfile dumps, dropping the oldest first"""
+
+    def __init__(self, directory, max_files):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, profiler, label):
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_')[:80] or 'request'
+        name = f'{int(time.time() * 1000)}-{slug}.prof'
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, name))
+            self._prune()
+        return name
+
+    def _prune(self):
+        names = sorted(n for n in os.listdir(self.directory) if _PROFILE_NAME.match(n))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not _PROFILE_NAME.match(name):
+                continue
+            path = os.path.join(self.directory, name)
+            profiles.append({
+                'name': name,
+                'size_bytes': os.path.getsize(path),
+                'created_at': int(name.split('-', 1)[0]) / 1000.0
+            })
+        return profiles
+
+    def path_for(self, name):
+        if not _PROFILE_NAME.match(name or ''):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+    def render_text(self, name, limit=40, sort='cumulative'):
+        path = self.path_for(name)
+        if not path:
+            return None
+        stream = io.StringIO()
+        stats = pstats.Stats(path, stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+PROFILES = ProfileRingBuffer(PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+def should_profile(requested=False):
+    """Return True if the current request should run under the profiler"""
+    if requested:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start():
+    """Start profiling the current thread, or return None if a profile is already running"""
+    if not _active_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except Exception:
+        _active_lock.release()
+        return None
+    return profiler
+
+
+def stop(profiler, label=None):
+    """Stop a profiler from start(); save it under ``label`` and return the profile name"""
+    try:
+        profiler.disable()
+        if label is None:
+            return None
+        return PROFILES.save(profiler, label)
+    finally:
+        _active_lock.release()
@@ -1,79 +1,114 @@
 import os
 import json
-import sqlite3
+import threading
+import uuid
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import google.generativeai as genai
+import dedupe
+import metrics
+import model_backends
+import search_index
+import subject_stats
+from db import USE_POSTGRES, get_db_connection
+from json_stream import IncrementalArrayParser, extract_json, extract_question_list
+from question_utils import generated_question_uid
+from rate_limiter import LIMITER, PRIORITY_LIVE, RateLimitExceeded
+
+# Using Gemini 3 Flash Preview (Active in Feb 2026)
+MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview')
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+AI_FANOUT_ENABLED = os.environ.get('AI_FANOUT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+AI_FANOUT_BATCH_SIZE = int(os.environ.get('AI_FANOUT_BATCH_SIZE', '5'))
+AI_FANOUT_MAX_WORKERS = int(os.environ.get('AI_FANOUT_MAX_WORKERS', '4'))
+AI_SAVE_BATCH_SIZE = int(os.environ.get('AI_SAVE_BATCH_SIZE', '500'))
+
+@lru_cache(maxsize=None)
+def load_api_key():
+    """Read GEMINI_API_KEY from the environment or the first .env file that has it (once per process)"""
+    api_key = os.getenv('GEMINI_API_KEY')
+    
+    # Try to load from .env if not in environment
+    if not api_key:
+        env_paths = [
+            '.env',
+            'backend/.env',
+            '../.env',
+            os.path.join(os.path.dirname(__file__), '.env')
+        ]
+        for path in env_paths:
+            if os.path.exists(path):
+                with open(path) as f:
+                    for line in f:
+                        if line.strip().startswith('GEMINI_API_KEY='):
+                            api_key = line.split('=', 1)[1].strip().strip('"').strip("'")
+                            os.environ['GEMINI_API_KEY'] = api_key
+                            break
+            if api_key: break
+    return api_key
+
+def is_valid_question(q):
+    """True if a generated question has text, four options and a correct letter A-D"""
+    if not isinstance(q, dict):
+        return False
+    for key in ('Question', 'Option A', 'Option B', 'Option C', 'Option D'):
+        if not str(q.get(key) or '').strip():
+            return False
+    return str(q.get('Correct Option') or '').strip().upper() in ('A', 'B', 'C', 'D')
+
+_configured_key = None
+_configure_lock = threading.Lock()
+
+def _configure(api_key):
+    """Call genai.configure() only when the key changes, so the transport is reused"""
+    global _configured_key
+    with _configure_lock:
+        if _configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
 
 class QuestionGenerator:
-    def __init__(self):
-        """Initialize the question generator with Gemini API"""
-        api_key = os.getenv('GEMINI_API_KEY')
-        
-        # Try to load from .env if not in environment
-        if not api_key:
-            env_paths = [
-                '.env',
-                'backend/.env',
-                '../.env',
-                os.path.join(os.path.dirname(__file__), '.env')
-            ]
-            for path in env_paths:
-                if os.path.exists(path):
-                    with open(path) as f:
-                        for line in f:
-                            if line.strip().startswith('GEMINI_API_KEY='):
-                                api_key = line.split('=', 1)[1].strip().strip('"').strip("'")
-                                os.environ['GEMINI_API_KEY'] = api_key
-                                break
-                if api_key: break
+    def __init__(self, model=None):
+        """Initialize the question generator with the AI_BACKEND model (or an injected model for tests/benchmarks)"""
+        if model is not None:
+            self.model = model
+            return
 
+        backend = model_backends.AI_BACKEND
+        if backend not in model_backends.BACKENDS:
+            raise ValueError(f"Unknown AI_BACKEND '{backend}' (expected one of {', '.join(model_backends.BACKENDS)})")
+        if backend == 'fake':
+            self.model = model_backends.FakeModel()
+            return
+        if backend == 'replay':
+            self.model = model_backends.CachingModel(model_name=MODEL_NAME, model_config=GENERATION_CONFIG)
+            return
+
+        api_key = load_api_key()
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment or .env file")
             
-        genai.configure(api_key=api_key)
-        # Using Gemini 3 Flash Preview (Active in Feb 2026)
+        _configure(api_key)
         self.model = genai.GenerativeModel(
-            'gemini-3-flash-preview',
-            generation_config={"response_mime_type": "application/json"}
+            MODEL_NAME,
+            generation_config=GENERATION_CONFIG
         )
+        if backend == 'record':
+            self.model = model_backends.CachingModel(self.model, model_name=MODEL_NAME,
+                                                     model_config=GENERATION_CONFIG)
 
-    def _strip_code_fences(self, text):
-        if not text:
-            return text
-        if "```" not in text:
-            return text
-        # Extract the first fenced block if present
-        parts = text.split("```")
-        if len(parts) >= 3:
-            return parts[1].lstrip("json\n").lstrip("JSON\n").strip()
-        return text
-
-    def _clean_json_text(self, text):
-        if not text:
-            return text
-        # Remove trailing commas that break JSON parsing
-        import re
-        return re.sub(r",\s*([}\]])", r"\1", text)
-
-    def _extract_json_candidate(self, text):
-        if not text:
-            return None
-        text = text.strip()
-        text = self._strip_code_fences(text)
-        if text.startswith('[') and text.endswith(']'):
-            return text
-        if text.startswith('{') and 'questions' in text:
-            return text
-        start = text.find('[')
-        end = text.rfind(']') + 1
-        if start != -1 and end > start:
-            return text[start:end]
-        return text
-
-    def generate_questions(self, subject, count=20):
-        """Generate MCQ questions for a given subject using Gemini AI with specific conditions"""
-        prompt = f"""
+    def _generate(self, prompt, operation, priority=None, **kwargs):
+        """One model call, paced and retried by the shared rate limiter"""
+        def call():
+            with metrics.timed(operation):
+                return self.model.generate_content(prompt, **kwargs)
+        return LIMITER.call(call, PRIORITY_LIVE if priority is None else priority)
+
+    def _build_prompt(self, subject, count, focus=None):
+        focus_line = f"\n        Batch Focus: {focus}\n" if focus else ""
+        return f"""
         System Role: You are an expert ICSE (Indian Certificate of Secondary Education) Board Examiner for Grade 10.
         
         Task: Generate {count} high-quality Multiple Choice Questions (MCQs) for the subject: {subject}.
@@ -117,66 +152,32 @@ class QuestionGenerator:
         - "Subject": "{subject}"
         
         Return ONLY the JSON array starting with [ and ending with ].
-        """
+        {focus_line}"""
+
+    def generate_questions(self, subject, count=20, focus=None, priority=None):
+        """Generate MCQ questions for a given subject using Gemini AI with specific conditions"""
+        prompt = self._build_prompt(subject, count, focus)
         
         try:
             print(f"🤖 AI generating {count} questions for {subject}...")
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt, 'gemini_generate', priority)
             
             # Extract JSON from the response text
             text = getattr(response, 'text', None) or ''
-            candidate = self._extract_json_candidate(text)
-            candidate = self._clean_json_text(candidate or '')
-
-            questions = None
-            parse_errors = []
-            for raw in [candidate, text]:
-                if not raw:
-                    continue
-                raw = self._clean_json_text(self._strip_code_fences(raw.strip()))
-                try:
-                    parsed = json.loads(raw)
-                    if isinstance(parsed, dict) and 'questions' in parsed:
-                        questions = parsed.get('questions')
-                    else:
-                        questions = parsed
-                    break
-                except Exception as parse_err:
-                    parse_errors.append(str(parse_err))
-
+            questions, notes = extract_question_list(text)
             if questions is None:
-                # If there's "Extra data" or truncated JSON, try to fix it
-                bracket_count = 0
-                first_array_end = -1
-                start_idx = text.find('[')
-                if start_idx != -1:
-                    for i, char in enumerate(text[start_idx:], start_idx):
-                        if char == '[':
-                            bracket_count += 1
-                        elif char == ']':
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                first_array_end = i + 1
-                                break
-
-                if first_array_end != -1:
-                    questions_json = self._clean_json_text(text[start_idx:first_array_end])
-                    try:
-                        questions = json.loads(questions_json)
-                    except Exception as parse_err:
-                        parse_errors.append(str(parse_err))
-                else:
-                    print(f"❌ Failed to parse JSON. Errors: {parse_errors}")
-                    print(f"DEBUG - Full response text from AI:\n{text}\n--- END DEBUG ---")
-                    return []
-            
-            if not isinstance(questions, list):
-                print("❌ Response is not a list of questions")
+                print(f"❌ Failed to parse a question list from the response ({', '.join(notes) or 'no JSON array found'})")
+                print(f"DEBUG - Full response text from AI:\n{text}\n--- END DEBUG ---")
                 return []
+            if notes:
+                print(f"🩹 Repaired model JSON: {', '.join(notes)}")
                 
             print(f"✅ Successfully generated {len(questions)} questions")
             return questions
             
+        except RateLimitExceeded:
+            # Already says whether the daily budget or just the pace ran out
+            raise
         except Exception as e:
             error_str = str(e)
             print(f"❌ Error during generation: {error_str}")
@@ -184,12 +185,84 @@ class QuestionGenerator:
                 raise Exception("AI API Quota Exceeded. Please try again later or wait 1-2 minutes.")
             return []
     
+    def generate_questions_fanout(self, subject, count=20, batch_size=None, priority=None):
+        """Generate ``count`` questions as concurrent smaller calls and merge them.
+
+        Sub-batches run on a shared bounded thread pool. Results are deduped
+        by question_uid; a failed sub-batch only loses its own questions.
+        """
+        batch_size = max(1, batch_size or AI_FANOUT_BATCH_SIZE)
+        sizes = [min(batch_size, count - start) for start in range(0, count, batch_size)]
+        if not AI_FANOUT_ENABLED or len(sizes) <= 1:
+            return self.generate_questions(subject, count=count, priority=priority)
+
+        executor = _get_fanout_executor()
+        futures = [
+            executor.submit(
+                self.generate_questions, subject, size,
+                f"This is batch {i + 1} of {len(sizes)}. Cover different chapters and "
+                f"sub-topics than the other batches would; avoid the most common textbook examples.",
+                priority
+            )
+            for i, size in enumerate(sizes)
+        ]
+
+        merged, seen, errors = [], set(), []
+        with metrics.timed('gemini_generate_fanout'):
+            for future in futures:
+                try:
+                    batch = future.result() or []
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                for q in batch:
+                    if not isinstance(q, dict):
+                        continue
+                    uid = generated_question_uid(q, subject)
+                    if uid in seen:
+                        continue
+                    seen.add(uid)
+                    merged.append(q)
+
+        print(f"✅ Fan-out merged {len(merged)} questions from {len(sizes) - len(errors)}/{len(sizes)} sub-batches")
+        if not merged and errors:
+            # Every sub-batch failed: surface the first error (e.g. quota) as before
+            raise errors[0]
+        return merged
+
+    def generate_questions_stream(self, subject, count=20, priority=None):
+        """Yield question dicts one by one as each completes in a streamed model response"""
+        prompt = self._build_prompt(subject, count)
+        parser = IncrementalArrayParser()
+        produced = 0
+        try:
+            print(f"🤖 AI streaming {count} questions for {subject}...")
+            with metrics.timed('gemini_generate_stream'):
+                response = LIMITER.call(lambda: self.model.generate_content(prompt, stream=True),
+                                        PRIORITY_LIVE if priority is None else priority)
+                for chunk in response:
+                    for q in parser.feed(getattr(chunk, 'text', None) or ''):
+                        if isinstance(q, dict):
+                            produced += 1
+                            yield q
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            error_str = str(e)
+            print(f"❌ Error during streamed generation: {error_str}")
+            if "429" in error_str or "quota" in error_str.lower():
+                raise Exception("AI API Quota Exceeded. Please try again later or wait 1-2 minutes.")
+            raise
+        if parser.errors:
+            print(f"⚠️ Skipped {len(parser.errors)} unparseable streamed objects: {parser.errors[:3]}")
+        print(f"✅ Streamed {produced} questions")
+
     def append_to_question_bank(self, questions):
         """Append questions to the CSV question bank"""
         # Your implementation
         pass
     
-    def verify_answer(self, question, options, suggested_answer):
+    def verify_answer(self, question, options, suggested_answer, priority=None):
         """Verify the correct answer for a given question using Gemini"""
         if not options:
             return None
@@ -216,26 +289,13 @@ class QuestionGenerator:
         
         try:
             print(f"🤖 AI Verifying answer for: {question[:50]}...")
-            response = self.model.generate_content(prompt)
-            # Find JSON in response
-            text = response.text
-            
-            # Use robust JSON extraction
-            import re
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(0))
-                except json.JSONDecodeError:
-                    # Try finding balanced braces if extra text exists
-                    start = text.find('{')
-                    bracket_count = 0
-                    for i in range(start, len(text)):
-                        if text[i] == '{': bracket_count += 1
-                        elif text[i] == '}': 
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                return json.loads(text[start:i+1])
+            response = self._generate(prompt, 'gemini_verify', priority)
+            text = getattr(response, 'text', None) or ''
+            verdict, notes = extract_json(text)
+            if isinstance(verdict, dict):
+                if notes:
+                    print(f"🩹 Repaired verification JSON: {', '.join(notes)}")
+                return verdict
             
             print(f"❌ Failed to extract JSON from AI verification response: {text}")
             return None
@@ -243,55 +303,292 @@ class QuestionGenerator:
             print(f"❌ Error verifying answer with Gemini: {e}")
             return None
 
+    def verify_answers_batch(self, items, priority=None):
+        """Verify several questions in one model call.
+
+        ``items`` are dicts with id, question, options (A-D) and
+        suggested_answer. Returns {str(id): verdict} for every question the
+        model answered; quota errors are raised.
+        """
+        if not items:
+            return {}
+        payload = [{
+            'id': str(item['id']),
+            'question': item['question'],
+            'options': {letter: (item.get('options') or {}).get(letter, '') for letter in 'ABCD'},
+            'suggested_answer': item.get('suggested_answer')
+        } for item in items]
+
+        prompt = f"""
+        Review each of the following {len(payload)} Multiple Choice Questions (MCQs) and determine the correct answer.
+        "suggested_answer" is the option currently marked as correct.
+
+        Questions (JSON):
+        {json.dumps(payload, ensure_ascii=False)}
+
+        Respond strictly with a JSON array containing ONE object per question, with these keys:
+        1. "id": string (copy the question's "id" exactly)
+        2. "is_correct": boolean (true if the suggested answer is actually correct)
+        3. "correct_option": string (The correct letter A, B, C, or D)
+        4. "explanation": string (Short explanation of why this is the correct answer)
+
+        Return ONLY valid JSON.
+        """
+
+        print(f"🤖 AI Verifying a batch of {len(payload)} questions...")
+        try:
+            response = self._generate(prompt, 'gemini_verify_batch', priority)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            error_str = str(e)
+            print(f"❌ Error verifying batch with Gemini: {error_str}")
+            if "429" in error_str or "quota" in error_str.lower():
+                raise Exception("AI API Quota Exceeded. Please try again later or wait 1-2 minutes.")
+            return {}
+
+        text = getattr(response, 'text', None) or ''
+        verdicts, notes = extract_json(text)
+        if isinstance(verdicts, dict):
+            verdicts = verdicts.get('results') or verdicts.get('questions') or [verdicts]
+        if not isinstance(verdicts, list):
+            print(f"❌ Failed to extract JSON from AI batch verification response: {text[:500]}")
+            return {}
+        if notes:
+            print(f"🩹 Repaired batch verification JSON: {', '.join(notes)}")
+
+        wanted = {item['id'] for item in payload}
+        results = {}
+        for verdict in verdicts:
+            if isinstance(verdict, dict) and str(verdict.get('id')) in wanted:
+                results[str(verdict['id'])] = verdict
+        print(f"✅ Batch verification answered {len(results)}/{len(payload)} questions")
+        return results
+
     def save_questions_to_db(self, questions, status='pending_review'):
-        """Save generated questions to the ai_generated_questions table"""
-        basedir = os.path.abspath(os.path.dirname(__file__))
-        db_path = os.path.join(basedir, 'data', 'history.db')
-        conn = sqlite3.connect(db_path)
+        """Save generated questions for admin review; returns the new row ids, or None on error"""
+        return save_generated_questions(questions, status=status)
+
+# Generated question keys (and the variants models sometimes use) -> newly_updated_questions columns
+_QUESTION_COLUMNS = [
+    ('subject', ('Subject', 'subject'), 'Unknown'),
+    ('question', ('Question', 'question'), ''),
+    ('option_a', ('Option A', 'option_a'), ''),
+    ('option_b', ('Option B', 'option_b'), ''),
+    ('option_c', ('Option C', 'option_c'), ''),
+    ('option_d', ('Option D', 'option_d'), ''),
+    ('correct_option', ('Correct Option', 'correct_option', 'Correct Answer'), 'A'),
+    ('question_type', ('Type', 'question_type'), 'Standard'),
+    ('chapter_name', ('Chapter Name', 'chapter_name'), 'General'),
+    ('explanation', ('Explanation', 'explanation'), '')
+]
+
+def normalize_generated_questions(questions, subject=None):
+    """One DataFrame with a column per newly_updated_questions field; rows without question text are dropped"""
+    df = pd.DataFrame.from_records(list(questions))
+    out = pd.DataFrame(index=df.index)
+    for column, keys, default in _QUESTION_COLUMNS:
+        values = pd.Series(None, index=df.index, dtype=object)
+        for key in keys:
+            if key in df.columns:
+                values = values.combine_first(df[key])
+        out[column] = values.fillna(default).astype(str).str.strip()
+    if subject:
+        out['subject'] = subject
+    out['correct_option'] = out['correct_option'].str.upper().str[:1].replace('', 'A')
+    return out[out['question'] != '']
+
+def save_generated_questions(questions, status='pending_review', source='ai', subject=None):
+    """Dedupe, normalize and bulk-insert generated questions into the review table.
+
+    Returns the ids of the inserted rows, or None if the insert failed.
+    """
+    questions = [q for q in questions or [] if isinstance(q, dict)]
+    kept, _dropped = dedupe.filter_questions(questions, subject)
+    if not kept:
+        return []
+    df = normalize_generated_questions([q for q, _note in kept], subject)
+    # The frame keeps kept-list positions as its index, so notes line up after empty rows are dropped
+    df['duplicate_note'] = [kept[i][1] for i in df.index]
+    # Tags this call's rows so their ids can be read back on SQLite and Postgres alike
+    batch = uuid.uuid4().hex
+    rows = [row + (status, source, batch) for row in df.itertuples(index=False, name=None)]
+
+    conn = None
+    try:
+        conn = get_db_connection()
         cursor = conn.cursor()
-        
-        saved_count = 0
-        try:
-            # Store individual questions
-            for q in questions:
-                try:
-                    # Map keys robustly (handle variations in AI output keys)
-                    subject = q.get('Subject', q.get('subject', 'Unknown'))
-                    question_text = q.get('Question', q.get('question', ''))
-                    opt_a = q.get('Option A', q.get('option_a', ''))
-                    opt_b = q.get('Option B', q.get('option_b', ''))
-                    opt_c = q.get('Option C', q.get('option_c', ''))
-                    opt_d = q.get('Option D', q.get('option_d', ''))
-                    correct = q.get('Correct Option', q.get('correct_option', q.get('Correct Answer', 'A')))
-                    q_type = q.get('Type', q.get('question_type', 'Standard'))
-                    chapter = q.get('Chapter Name', q.get('chapter_name', 'General'))
-                    expl = q.get('Explanation', q.get('explanation', ''))
-
-                    if not question_text:
-                        continue
+        for start in range(0, len(rows), AI_SAVE_BATCH_SIZE):
+            cursor.executemany('''
+                INSERT INTO newly_updated_questions
+                (subject, question, option_a, option_b, option_c, option_d, correct_option,
+                 question_type, chapter_name, explanation, duplicate_note, status, source, ingest_batch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows[start:start + AI_SAVE_BATCH_SIZE])
+        search_index.add_review_batch(cursor, batch)
+        subject_stats.record_inserted(cursor, df['subject'], status)
+        cursor.execute('SELECT id FROM newly_updated_questions WHERE ingest_batch = ? ORDER BY id', (batch,))
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        dedupe.discard([q for q, _note in kept], subject)
+        print(f"❌ Critical error saving generated questions: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+    print(f"✅ Saved {len(ids)}/{len(questions)} AI questions for review with status '{status}'")
+    return ids
 
-                    cursor.execute('''
-                        INSERT INTO ai_generated_questions 
-                        (subject, question, option_a, option_b, option_c, option_d, 
-                         correct_option, question_type, chapter_name, explanation, status)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        subject, question_text, opt_a, opt_b, opt_c, opt_d, 
-                        correct, q_type, chapter, expl, status
-                    ))
-                    saved_count += 1
-                except Exception as item_err:
-                    print(f"⚠️ Error saving single question to DB: {item_err}")
-                    continue
-            
+_STRANDED_TABLE = 'ai_generated_questions_migrated'
+
+def _prepare_stranded_table():
+    """Rename ai_generated_questions aside and give it a claim column; False if there is nothing to migrate"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'ALTER TABLE ai_generated_questions RENAME TO {_STRANDED_TABLE}')
             conn.commit()
-            print(f"✅ Automatically backed up {saved_count}/{len(questions)} AI questions to DB with status '{status}'")
-            return True
-            
-        except Exception as e:
-            if conn: conn.rollback()
-            print(f"❌ Critical error in save_questions_to_db: {e}")
+        except Exception:
+            # Renamed on an earlier start (or by another worker), or never existed
+            conn.rollback()
+        try:
+            if USE_POSTGRES:
+                cursor.execute(f'ALTER TABLE {_STRANDED_TABLE} ADD COLUMN IF NOT EXISTS migrated_by TEXT')
+            else:
+                cursor.execute(f"PRAGMA table_info({_STRANDED_TABLE})")
+                existing_columns = [row[1] for row in cursor.fetchall()]
+                if not existing_columns:
+                    return False
+                if 'migrated_by' not in existing_columns:
+                    cursor.execute(f'ALTER TABLE {_STRANDED_TABLE} ADD COLUMN migrated_by TEXT')
+            conn.commit()
+        except Exception:
+            conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
\ No newline at end of file
+        return True
+    finally:
+        conn.close()
+
+def _claim_stranded(token):
+    """Claim the next batch of unmigrated rows for ``token``; (rows seen, rows claimed)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT id FROM {_STRANDED_TABLE} WHERE migrated_by IS NULL ORDER BY id LIMIT ?',
+                       (AI_SAVE_BATCH_SIZE,))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return 0, []
+        placeholders = ', '.join('?' for _ in ids)
+        # Rows another worker claimed in the meantime are left to it
+        cursor.execute(f'''
+            UPDATE {_STRANDED_TABLE} SET migrated_by = ?
+            WHERE id IN ({placeholders}) AND migrated_by IS NULL
+        ''', (token, *ids))
+        conn.commit()
+        cursor.execute(f'''
+            SELECT subject, question, option_a, option_b, option_c, option_d,
+                   correct_option, question_type, chapter_name, explanation
+            FROM {_STRANDED_TABLE}
+            WHERE migrated_by = ? AND id IN ({placeholders})
+            ORDER BY id
+        ''', (token, *ids))
+        return len(ids), cursor.fetchall()
+    finally:
+        conn.close()
+
+def _release_stranded(token):
+    """Give back the rows claimed for ``token``, for the next start to retry"""
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute(f'UPDATE {_STRANDED_TABLE} SET migrated_by = NULL WHERE migrated_by = ?', (token,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def migrate_stranded_questions():
+    """Move rows that older versions saved to ai_generated_questions into the review table.
+
+    The old table is renamed to ai_generated_questions_migrated, which keeps
+    the originals. Each batch is claimed before it goes through the normal
+    save path, so two workers never save the same rows, and a batch whose
+    save fails is released for the next start to retry. Rows renamed by
+    older versions have no claim and are offered again; exact duplicates of
+    rows that were already migrated are dropped at save.
+    """
+    try:
+        if not _prepare_stranded_table():
+            return 0
+    except Exception as e:
+        print(f"⚠️ Could not check for stranded AI questions: {e}")
+        return 0
+
+    columns = [column for column, _keys, _default in _QUESTION_COLUMNS]
+    moved = migrated = 0
+    while True:
+        token = uuid.uuid4().hex
+        try:
+            seen, rows = _claim_stranded(token)
+        except Exception as e:
+            print(f"⚠️ Could not claim stranded AI questions, will retry on next start: {e}")
+            break
+        if not seen:
+            break
+        ids = save_generated_questions([dict(zip(columns, row)) for row in rows]) if rows else []
+        if ids is None:
+            try:
+                _release_stranded(token)
+            except Exception as e:
+                print(f"⚠️ Could not release stranded AI questions: {e}")
+            print(f"⚠️ Saving stranded AI questions failed; {len(rows)} rows are left for the next start")
+            break
+        migrated += len(rows)
+        moved += len(ids)
+    if migrated:
+        print(f"📦 Migrated {moved}/{migrated} stranded AI questions from ai_generated_questions "
+              f"(originals kept in {_STRANDED_TABLE})")
+    return moved
+
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+def _get_fanout_executor():
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(max_workers=AI_FANOUT_MAX_WORKERS,
+                                                  thread_name_prefix='ai-fanout')
+        return _fanout_executor
+
+_generator = None
+_generator_lock = threading.Lock()
+
+def get_question_generator():
+    """Return the process-wide QuestionGenerator, creating it on first use"""
+    global _generator
+    generator = _generator
+    if generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = QuestionGenerator()
+            generator = _generator
+    return generator
+
+def reset_question_generator():
+    """Drop the shared generator (e.g. after a fork or a config change)"""
+    global _generator, _generator_lock, _configured_key, _configure_lock
+    global _fanout_executor, _fanout_lock
+    _fanout_executor = None
+    _fanout_lock = threading.Lock()
+    _generator = None
+    _generator_lock = threading.Lock()
+    _configured_key = None
+    _configure_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    # gRPC channels do not survive fork(); give each worker its own model handle
+    os.register_at_fork(after_in_child=reset_question_generator)
@@ -0,0 +1,199 @@
+"""Per-subject warm pool of pre-generated, validated AI questions.
+
+A daemon thread keeps every subject that has been asked for (plus any in
+AI_POOL_SUBJECTS) filled to AI_POOL_DEPTH questions. Only subjects accepted
+by ``allow_fn`` get a pool, and a subject nobody has taken questions from
+for AI_POOL_IDLE_SECONDS is no longer refilled until it is asked for again.
+Refills are paced by AI_POOL_MIN_REFILL_INTERVAL and pause for
+AI_POOL_QUOTA_BACKOFF_SECONDS after a quota error. Questions older than
+AI_POOL_TTL_SECONDS are discarded. Pools are per worker process.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+from rate_limiter import is_quota_error
+
+AI_POOL_ENABLED = os.environ.get('AI_POOL_ENABLED', '1').lower() in ('1', 'true', 'yes')
+AI_POOL_DEPTH = int(os.environ.get('AI_POOL_DEPTH', '30'))
+AI_POOL_BATCH_SIZE = int(os.environ.get('AI_POOL_BATCH_SIZE', '10'))
+AI_POOL_TTL_SECONDS = int(os.environ.get('AI_POOL_TTL_SECONDS', str(6 * 3600)))
+AI_POOL_MIN_REFILL_INTERVAL = float(os.environ.get('AI_POOL_MIN_REFILL_INTERVAL', '15'))
+AI_POOL_QUOTA_BACKOFF_SECONDS = float(os.environ.get('AI_POOL_QUOTA_BACKOFF_SECONDS', '300'))
+AI_POOL_IDLE_SECONDS = float(os.environ.get('AI_POOL_IDLE_SECONDS', '1800'))
+AI_POOL_SUBJECTS = [s.strip() for s in os.environ.get('AI_POOL_SUBJECTS', '').split(',') if s.strip()]
+
+POOL_DEPTH = metrics.gauge(
+    'mcq_ai_pool_depth',
+    'Pre-generated AI questions currently available, by subject.',
+    ('subject',)
+)
+POOL_REQUESTS = metrics.counter(
+    'mcq_ai_pool_requests_total',
+    'AI question requests served from the pool (hit) or not (miss), by subject.',
+    ('subject', 'result')
+)
+POOL_REFILLS = metrics.counter(
+    'mcq_ai_pool_refills_total',
+    'Background pool refill attempts, by subject and outcome.',
+    ('subject', 'outcome')
+)
+
+
+class QuestionPool:
+    def __init__(self, generate_fn, validate_fn=None, allow_fn=None,
+                 depth=AI_POOL_DEPTH, batch_size=AI_POOL_BATCH_SIZE, ttl_seconds=AI_POOL_TTL_SECONDS,
+                 min_refill_interval=AI_POOL_MIN_REFILL_INTERVAL,
+                 quota_backoff_seconds=AI_POOL_QUOTA_BACKOFF_SECONDS, idle_seconds=AI_POOL_IDLE_SECONDS):
+        self.generate_fn = generate_fn
+        self.validate_fn = validate_fn
+        self.allow_fn = allow_fn
+        self.depth = depth
+        self.batch_size = batch_size
+        self.ttl_seconds = ttl_seconds
+        self.min_refill_interval = min_refill_interval
+        self.quota_backoff_seconds = quota_backoff_seconds
+        self.idle_seconds = idle_seconds
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pools = {}
+        self._subjects = {}
+        self._last_taken = {}
+        self._paused_until = 0.0
+        self._last_call = 0.0
+        self._worker = None
+        self._worker_pid = None
+
+    @staticmethod
+    def _key(subject):
+        return str(subject or '').strip().lower()
+
+    def _purge_expired(self, key):
+        pool = self._pools.get(key)
+        if not pool:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        while pool and pool[0][0] < cutoff:
+            pool.popleft()
+
+    def _update_gauge(self, key):
+        POOL_DEPTH.set(len(self._pools.get(key, ())), subject=self._subjects.get(key, key))
+
+    def _idle(self, key, now):
+        return now - self._last_taken.get(key, now) > self.idle_seconds
+
+    def take(self, subject, count):
+        """Pop ``count`` fresh questions, or return None (and schedule a refill) if the pool is short"""
+        if self.allow_fn is not None and not self.allow_fn(subject):
+            return None
+        key = self._key(subject)
+        with self._lock:
+            self._subjects.setdefault(key, str(subject).strip())
+            self._pools.setdefault(key, deque())
+            self._last_taken[key] = time.monotonic()
+            self._purge_expired(key)
+            pool = self._pools[key]
+            taken = None
+            if len(pool) >= count:
+                taken = [pool.popleft()[1] for _ in range(count)]
+            self._update_gauge(key)
+        POOL_REQUESTS.inc(subject=self._subjects[key], result='hit' if taken else 'miss')
+        self.request_refill(subject)
+        return taken
+
+    def request_refill(self, subject):
+        key = self._key(subject)
+        with self._lock:
+            self._subjects.setdefault(key, str(subject).strip())
+            self._pools.setdefault(key, deque())
+            # A pre-warmed subject counts as wanted until it has been idle for idle_seconds
+            self._last_taken.setdefault(key, time.monotonic())
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self):
+        with self._lock:
+            alive = self._worker is not None and self._worker.is_alive()
+            if alive and self._worker_pid == os.getpid():
+                return
+            # Threads do not survive fork(); each worker process starts its own
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name='ai-question-pool', daemon=True)
+            self._worker.start()
+
+    def _next_subject(self):
+        with self._lock:
+            now = time.monotonic()
+            shortest = None
+            for key, pool in self._pools.items():
+                self._purge_expired(key)
+                if self._idle(key, now):
+                    continue
+                if len(pool) < self.depth and (shortest is None or len(pool) < len(self._pools[shortest])):
+                    shortest = key
+            return shortest
+
+    def _run(self):
+        while True:
+            key = self._next_subject()
+            if key is None:
+                self._wakeup.wait(timeout=60)
+                self._wakeup.clear()
+                continue
+
+            now = time.monotonic()
+            wait = max(self._paused_until - now, self._last_call + self.min_refill_interval - now)
+            if wait > 0:
+                self._wakeup.wait(timeout=wait)
+                self._wakeup.clear()
+                continue
+
+            self._refill(key)
+
+    def _refill(self, key):
+        subject = self._subjects.get(key, key)
+        self._last_call = time.monotonic()
+        try:
+            questions = self.generate_fn(subject, self.batch_size) or []
+        except Exception as e:
+            if is_quota_error(e):
+                self._paused_until = time.monotonic() + self.quota_backoff_seconds
+                POOL_REFILLS.inc(subject=subject, outcome='quota')
+                print(f"⏸️ AI pool paused for {self.quota_backoff_seconds:.0f}s after quota error: {e}")
+            else:
+                POOL_REFILLS.inc(subject=subject, outcome='error')
+                print(f"⚠️ AI pool refill failed for {subject}: {e}")
+            return
+
+        if self.validate_fn:
+            questions = [q for q in questions if self.validate_fn(q)]
+        if not questions:
+            POOL_REFILLS.inc(subject=subject, outcome='empty')
+            return
+
+        stamped = time.monotonic()
+        with self._lock:
+            self._pools[key].extend((stamped, q) for q in questions)
+            self._update_gauge(key)
+        POOL_REFILLS.inc(subject=subject, outcome='ok')
+        print(f"🧊 AI pool: +{len(questions)} {subject} questions (depth {len(self._pools[key])})")
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            subjects = {}
+            for key, pool in self._pools.items():
+                subjects[self._subjects.get(key, key)] = {
+                    'depth': len(pool),
+                    'target_depth': self.depth,
+                    'idle': self._idle(key, now),
+                    'oldest_age_seconds': round(now - pool[0][0], 1) if pool else None
+                }
+            return {
+                'enabled': True,
+                'subjects': subjects,
+                'paused_for_seconds': round(max(0.0, self._paused_until - now), 1)
+            }
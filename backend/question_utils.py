@@ -0,0 +1,21 @@
+"""Question helpers shared by the Flask app, the generator and background workers."""
+import hashlib
+
+
+def normalize_text(value):
+    text = str(value or '')
+    text = ' '.join(text.strip().split())
+    return text.lower()
+
+
+def compute_question_uid(subject, question, options):
+    parts = [normalize_text(subject), normalize_text(question)]
+    parts.extend([normalize_text(opt) for opt in (options or [])])
+    signature = '|'.join(parts)
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+
+
+def generated_question_uid(q, subject=None):
+    """question_uid of a model-generated question dict (keys as in the generation prompt)"""
+    options = [q.get('Option A', ''), q.get('Option B', ''), q.get('Option C', ''), q.get('Option D', '')]
+    return compute_question_uid(subject or q.get('Subject', ''), q.get('Question', ''), options)
@@ -0,0 +1,304 @@
+"""Shared, quota-aware pacing and retries for Gemini calls.
+
+Every model call goes through LIMITER.call(). A per-minute token bucket
+(AI_RPM) and a daily budget (AI_RPD) live in a small SQLite file, so all
+gunicorn workers on the host draw from the same budget. A 429 from the
+API pauses every worker for the backoff period. Inside a worker, waiting
+calls are served in priority order, and lower priorities leave a few
+tokens in the bucket so live student requests in other workers still get
+one.
+"""
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+import metrics
+from db import connect_sqlite_file
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+AI_RATE_LIMIT_ENABLED = os.environ.get('AI_RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+AI_RATE_LIMIT_FILE = os.environ.get('AI_RATE_LIMIT_FILE', os.path.join(BASE_DIR, 'data', 'ai_rate_limit.db'))
+AI_RPM = float(os.environ.get('AI_RPM', '15'))
+AI_RPD = int(os.environ.get('AI_RPD', '1500'))
+# Gemini daily quotas reset at midnight Pacific time
+AI_QUOTA_RESET_UTC_HOUR = int(os.environ.get('AI_QUOTA_RESET_UTC_HOUR', '8'))
+AI_RETRY_MAX_ATTEMPTS = int(os.environ.get('AI_RETRY_MAX_ATTEMPTS', '4'))
+AI_RETRY_BASE_DELAY = float(os.environ.get('AI_RETRY_BASE_DELAY', '2'))
+AI_RETRY_MAX_DELAY = float(os.environ.get('AI_RETRY_MAX_DELAY', '60'))
+
+PRIORITY_LIVE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_BULK = 3
+PRIORITY_NAMES = {
+    PRIORITY_LIVE: 'live',
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_BACKGROUND: 'background',
+    PRIORITY_BULK: 'bulk'
+}
+# Longest a call waits for a request slot before giving up, in seconds
+MAX_WAIT_SECONDS = {
+    PRIORITY_LIVE: float(os.environ.get('AI_RATE_LIMIT_LIVE_MAX_WAIT', '20')),
+    PRIORITY_INTERACTIVE: 60.0,
+    PRIORITY_BACKGROUND: 300.0,
+    PRIORITY_BULK: 900.0
+}
+# Tokens each priority must leave in the bucket for higher priorities
+RESERVED_TOKENS = {
+    PRIORITY_LIVE: 0,
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_BACKGROUND: 1,
+    PRIORITY_BULK: 2
+}
+
+QUOTA_MINUTE_TOKENS = metrics.gauge(
+    'mcq_ai_quota_minute_tokens',
+    'Requests left in the shared per-minute Gemini bucket (as last seen by this worker).'
+)
+QUOTA_DAY_USED = metrics.gauge(
+    'mcq_ai_quota_day_used',
+    'Gemini requests made today across all workers (as last seen by this worker).'
+)
+QUOTA_DAY_BUDGET = metrics.gauge(
+    'mcq_ai_quota_day_budget',
+    'Configured daily Gemini request budget.'
+)
+RATE_LIMIT_WAIT = metrics.histogram(
+    'mcq_ai_rate_limit_wait_seconds',
+    'Time Gemini calls spent waiting for a request slot, by priority.',
+    ('priority',)
+)
+AI_CALLS = metrics.counter(
+    'mcq_ai_calls_total',
+    'Gemini calls by priority and outcome.',
+    ('priority', 'outcome')
+)
+AI_RETRIES = metrics.counter(
+    'mcq_ai_retries_total',
+    'Gemini call retries by priority and reason.',
+    ('priority', 'reason')
+)
+
+_TRANSIENT = re.compile(r'\b(500|502|503|504)\b|unavailable|deadline exceeded|internal error', re.IGNORECASE)
+
+
+class RateLimitExceeded(Exception):
+    """No request slot in time; the message mentions quota so callers treat it like a 429.
+
+    ``daily`` is True when the daily budget is used up, False when the
+    per-minute pace just had no slot free in time (``retry_after`` seconds).
+    """
+
+    def __init__(self, message, daily=False, retry_after=None):
+        super().__init__(message)
+        self.daily = daily
+        self.retry_after = retry_after
+
+
+def is_quota_error(error):
+    text = str(error).lower()
+    return '429' in text or 'quota' in text or 'resource_exhausted' in text
+
+
+def retry_reason(error):
+    if isinstance(error, RateLimitExceeded):
+        return None
+    if is_quota_error(error):
+        return 'quota'
+    if _TRANSIENT.search(str(error)):
+        return 'transient'
+    return None
+
+
+class SharedQuota:
+    """Token bucket, daily counter and pause-until time in a SQLite file shared by all workers"""
+
+    def __init__(self, path, rpm, rpd, reset_utc_hour=0):
+        self.path = path
+        self.rpm = rpm
+        self.rpd = rpd
+        self.reset_utc_hour = reset_utc_hour
+        self._local = threading.local()
+        QUOTA_DAY_BUDGET.set(rpd)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = connect_sqlite_file(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS quota_state (key TEXT PRIMARY KEY, value REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS quota_daily (day TEXT PRIMARY KEY, used INTEGER NOT NULL)')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _day(self, now):
+        return time.strftime('%Y-%m-%d', time.gmtime(now - self.reset_utc_hour * 3600))
+
+    def _read(self, conn, now):
+        state = dict(conn.execute('SELECT key, value FROM quota_state').fetchall())
+        tokens = state.get('tokens', self.rpm)
+        updated = state.get('updated', now)
+        tokens = min(self.rpm, tokens + max(0.0, now - updated) * self.rpm / 60.0)
+        row = conn.execute('SELECT used FROM quota_daily WHERE day = ?', (self._day(now),)).fetchone()
+        return tokens, (row[0] if row else 0), state.get('paused_until', 0.0)
+
+    def try_acquire(self, reserve=0):
+        """Take one request slot.
+
+        Returns 0 on success, the seconds to wait before trying again, or
+        None when today's budget is spent.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            tokens, used, paused_until = self._read(conn, now)
+            if used >= self.rpd:
+                wait = None
+            elif now < paused_until:
+                wait = paused_until - now
+            elif tokens >= 1 + reserve:
+                tokens -= 1
+                used += 1
+                day = self._day(now)
+                conn.execute('DELETE FROM quota_daily WHERE day != ?', (day,))
+                conn.execute('INSERT OR REPLACE INTO quota_daily (day, used) VALUES (?, ?)', (day, used))
+                wait = 0
+            else:
+                wait = (1 + reserve - tokens) * 60.0 / self.rpm
+            conn.executemany('INSERT OR REPLACE INTO quota_state (key, value) VALUES (?, ?)',
+                             [('tokens', tokens), ('updated', now)])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        QUOTA_MINUTE_TOKENS.set(round(tokens, 2))
+        QUOTA_DAY_USED.set(used)
+        return wait
+
+    def pause(self, seconds):
+        """Stop every worker from calling the API for ``seconds``"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT value FROM quota_state WHERE key = 'paused_until'").fetchone()
+            paused_until = max(row[0] if row else 0.0, time.time() + seconds)
+            conn.execute("INSERT OR REPLACE INTO quota_state (key, value) VALUES ('paused_until', ?)",
+                         (paused_until,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def snapshot(self):
+        now = time.time()
+        tokens, used, paused_until = self._read(self._connect(), now)
+        return {
+            'minute_tokens': round(tokens, 2),
+            'requests_per_minute': self.rpm,
+            'day_used': used,
+            'day_budget': self.rpd,
+            'day': self._day(now),
+            'paused_for_seconds': round(max(0.0, paused_until - now), 1)
+        }
+
+
+class RateLimiter:
+    """Priority-ordered access to a SharedQuota, with retries and backoff"""
+
+    def __init__(self, quota, max_attempts=AI_RETRY_MAX_ATTEMPTS,
+                 base_delay=AI_RETRY_BASE_DELAY, max_delay=AI_RETRY_MAX_DELAY):
+        self.quota = quota
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._tickets = itertools.count()
+
+    def acquire(self, priority=PRIORITY_LIVE, timeout=None):
+        """Block until this call may hit the API, or raise RateLimitExceeded"""
+        if timeout is None:
+            timeout = MAX_WAIT_SECONDS[priority]
+        started = time.monotonic()
+        deadline = started + timeout
+        ticket = (priority, next(self._tickets))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            self._cond.notify_all()
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if self._waiters[0] == ticket:
+                        wait = self.quota.try_acquire(RESERVED_TOKENS[priority])
+                        if wait == 0:
+                            break
+                        if wait is None:
+                            raise RateLimitExceeded(
+                                f"AI daily quota budget of {self.quota.rpd} requests is used up", daily=True)
+                        if wait > remaining:
+                            raise RateLimitExceeded(
+                                f"AI quota: no request slot free within {timeout:.0f}s", retry_after=wait)
+                    elif remaining <= 0:
+                        raise RateLimitExceeded(
+                            f"AI quota: no request slot free within {timeout:.0f}s", retry_after=timeout)
+                    else:
+                        # Not at the head of the queue; woken when it changes
+                        wait = remaining
+                    self._cond.wait(min(wait, remaining))
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+        RATE_LIMIT_WAIT.observe(time.monotonic() - started, priority=PRIORITY_NAMES[priority])
+
+    def call(self, fn, priority=PRIORITY_LIVE):
+        """Run ``fn`` once a request slot is free, retrying quota and transient errors with backoff"""
+        if not AI_RATE_LIMIT_ENABLED:
+            return fn()
+        name = PRIORITY_NAMES[priority]
+        attempt = 0
+        while True:
+            try:
+                self.acquire(priority)
+            except RateLimitExceeded:
+                AI_CALLS.inc(priority=name, outcome='rate_limited')
+                raise
+            try:
+                result = fn()
+            except Exception as e:
+                reason = retry_reason(e)
+                attempt += 1
+                if reason is None or attempt >= self.max_attempts:
+                    AI_CALLS.inc(priority=name, outcome=reason or 'error')
+                    raise
+                # Equal jitter: at least half the exponential step, never more than max_delay
+                step = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = step / 2 + random.uniform(0, step / 2)
+                AI_RETRIES.inc(priority=name, reason=reason)
+                print(f"🔁 Gemini {reason} error ({e}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                if reason == 'quota':
+                    # Back every worker off, then wait for the pause in acquire()
+                    self.quota.pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            AI_CALLS.inc(priority=name, outcome='ok')
+            return result
+
+    def snapshot(self):
+        with self._cond:
+            waiting = {}
+            for priority, _ticket in self._waiters:
+                waiting[PRIORITY_NAMES[priority]] = waiting.get(PRIORITY_NAMES[priority], 0) + 1
+        return dict(self.quota.snapshot(), enabled=AI_RATE_LIMIT_ENABLED, waiting_in_this_worker=waiting)
+
+
+LIMITER = RateLimiter(SharedQuota(AI_RATE_LIMIT_FILE, AI_RPM, AI_RPD, AI_QUOTA_RESET_UTC_HOUR))
@@ -0,0 +1,366 @@
+"""Set-based admin actions on the review queue (newly_updated_questions).
+
+approve_questions, reject_questions and edit_questions each take a list of
+ids. Each runs a single ``UPDATE ... WHERE id IN (...)`` in one transaction
+and reads the affected rows back with RETURNING. Approval then appends all
+approved rows to the bank CSV in one write as its last step before the
+commit, and truncates the file back if the commit fails, so the bank and
+the review table always agree.
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+import caches
+import dedupe
+import search_index
+import subject_stats
+from db import USE_POSTGRES, get_db_connection
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BANK_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
+# RETURNING needs SQLite 3.35+; older libraries re-read the rows instead
+SUPPORTS_RETURNING = USE_POSTGRES or sqlite3.sqlite_version_info >= (3, 35, 0)
+EDITABLE_FIELDS = ('subject', 'question', 'option_a', 'option_b', 'option_c', 'option_d',
+                   'correct_option', 'question_type', 'chapter_name', 'explanation')
+# Editable fields that may be cleared (set to null)
+OPTIONAL_FIELDS = ('explanation',)
+LIST_PAGE_SIZE = int(os.environ.get('ADMIN_LIST_PAGE_SIZE', '50'))
+LIST_MAX_PAGE_SIZE = 500
+# Query parameter: column it filters on
+LIST_FILTERS = {'subject': 'subject', 'chapter': 'chapter_name', 'source': 'source', 'verdict': 'ai_verdict'}
+
+REVIEW_COLUMNS = '''id, subject, question, option_a, option_b, option_c, option_d,
+                   correct_option, question_type, created_at, status, chapter_name, explanation,
+                   ai_verdict, ai_correct_option, ai_explanation, ai_verified_at, duplicate_note,
+                   source, reviewed_at, reviewed_by'''
+_QUESTION_FIELDS = ('id', 'subject', 'question', 'option_a', 'option_b', 'option_c', 'option_d',
+                    'correct_option', 'chapter_name')
+
+# Postgres advisory lock held by approving transactions
+BANK_APPEND_LOCK_ID = 7460211
+_bank_lock = threading.Lock()
+
+
+def review_row_to_dict(row):
+    """A REVIEW_COLUMNS row as the admin UI expects it"""
+    return {
+        'id': row[0],
+        'subject': row[1],
+        'question': row[2],
+        'option_a': row[3],
+        'option_b': row[4],
+        'option_c': row[5],
+        'option_d': row[6],
+        'correct_option': row[7],
+        'question_type': row[8],
+        'created_at': row[9],
+        'status': row[10],
+        'chapter_name': row[11] if row[11] is not None else 'General',
+        'explanation': row[12] or '',
+        'ai_verdict': row[13],
+        'ai_correct_option': row[14],
+        'ai_explanation': row[15],
+        'ai_verified_at': row[16],
+        'duplicate_note': row[17],
+        'source': row[18],
+        'reviewed_at': row[19],
+        'reviewed_by': row[20]
+    }
+
+
+def clean_ids(question_ids):
+    """Unique integer ids in their original order; ValueError/TypeError for junk"""
+    ids = []
+    for question_id in question_ids:
+        question_id = int(question_id)
+        if question_id not in ids:
+            ids.append(question_id)
+    return ids
+
+
+def clean_changes(changes):
+    """The EDITABLE_FIELDS of an edit, checked; ValueError naming the first bad field"""
+    cleaned = {}
+    for field in EDITABLE_FIELDS:
+        if field not in changes:
+            continue
+        value = changes[field]
+        if value is None and field in OPTIONAL_FIELDS:
+            cleaned[field] = None
+            continue
+        if value is None:
+            raise ValueError(f'{field} is required')
+        if not isinstance(value, str):
+            raise ValueError(f'{field} must be a string')
+        if not value.strip():
+            raise ValueError(f'{field} cannot be blank')
+        if field == 'correct_option':
+            value = value.strip().upper()
+            if value not in ('A', 'B', 'C', 'D'):
+                raise ValueError('correct_option must be A, B, C or D')
+        cleaned[field] = value
+    return cleaned
+
+
+def encode_cursor(*values):
+    """Opaque page cursor for a keyset position"""
+    values = [None if value is None else str(value) for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Values of a cursor made by encode_cursor; ValueError if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def filter_clause(status, filters):
+    """WHERE clause and params for one status plus any LIST_FILTERS values.
+
+    verdict=unverified matches questions the AI has not checked yet.
+    """
+    clauses = ['status = ?', 'is_active = 1']
+    params = [status]
+    for name, column in LIST_FILTERS.items():
+        value = filters.get(name)
+        if not value:
+            continue
+        if name == 'verdict' and value == 'unverified':
+            clauses.append('ai_verdict IS NULL')
+        else:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    return ' AND '.join(clauses), params
+
+
+def list_questions(status, filters, cursor=None, limit=LIST_PAGE_SIZE):
+    """One page of questions with ``status``, newest first by (created_at, id).
+
+    Returns (questions, next_cursor, total). next_cursor is None on the last
+    page, and total is only counted for the first page.
+    """
+    limit = max(1, min(int(limit), LIST_MAX_PAGE_SIZE))
+    where, params = filter_clause(status, filters)
+    total = None
+    conn = get_db_connection()
+    try:
+        db_cursor = conn.cursor()
+        if cursor is None:
+            db_cursor.execute(f'SELECT COUNT(*) FROM newly_updated_questions WHERE {where}', tuple(params))
+            total = db_cursor.fetchone()[0]
+        else:
+            created_at, last_id = decode_cursor(cursor)
+            where += ' AND (created_at, id) < (?, ?)'
+            params += [created_at, int(last_id)]
+        db_cursor.execute(f'''
+            SELECT {REVIEW_COLUMNS} FROM newly_updated_questions
+            WHERE {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit + 1))
+        rows = db_cursor.fetchall()
+    finally:
+        conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][9], rows[-1][0])
+    return [review_row_to_dict(row) for row in rows], next_cursor, total
+
+
+def matching_ids(status, filters):
+    """Ids of every question a listing with these filters would show"""
+    where, params = filter_clause(status, filters)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT id FROM newly_updated_questions WHERE {where} ORDER BY id', tuple(params))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def get_question(question_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {REVIEW_COLUMNS} FROM newly_updated_questions WHERE id = ?', (question_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return review_row_to_dict(row) if row else None
+
+
+def _update_returning(cursor, assignments, params, ids, condition):
+    """Run one set-based UPDATE over ``ids`` and return the updated rows as dicts"""
+    placeholders = ', '.join('?' for _ in ids)
+    where = f'id IN ({placeholders}) AND {condition}'
+    returning = ', '.join(_QUESTION_FIELDS)
+    if SUPPORTS_RETURNING:
+        cursor.execute(f'UPDATE newly_updated_questions SET {assignments} WHERE {where} RETURNING {returning}',
+                       (*params, *ids))
+        rows = cursor.fetchall()
+    else:
+        cursor.execute(f'SELECT {returning} FROM newly_updated_questions WHERE {where}', tuple(ids))
+        rows = cursor.fetchall()
+        matched = [row[0] for row in rows]
+        if matched:
+            cursor.execute(f"UPDATE newly_updated_questions SET {assignments} "
+                           f"WHERE id IN ({', '.join('?' for _ in matched)})", (*params, *matched))
+    return [dict(zip(_QUESTION_FIELDS, row)) for row in rows]
+
+
+def _append_to_bank(rows):
+    """Append approved rows to the bank CSV in one write, in the file's own column order.
+
+    Call with _bank_lock held. Returns the file size before the write, for _truncate_bank.
+    """
+    header = list(pd.read_csv(BANK_FILE, encoding='utf-8', dtype=str, nrows=0).columns)
+    new_rows = pd.DataFrame([{
+        'Subject': row['subject'],
+        'Question': row['question'],
+        'Option A': row['option_a'],
+        'Option B': row['option_b'],
+        'Option C': row['option_c'],
+        'Option D': row['option_d'],
+        'Correct Option': row['correct_option'],
+        'Chapter Name': row['chapter_name']
+    } for row in rows]).reindex(columns=header)
+    needs_newline = False
+    with open(BANK_FILE, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b'\n', b'\r')
+    try:
+        with open(BANK_FILE, 'a', encoding='utf-8', newline='') as f:
+            if needs_newline:
+                f.write('\n')
+            new_rows.to_csv(f, index=False, header=False)
+    except Exception:
+        _truncate_bank(size)
+        raise
+    return size
+
+
+def _truncate_bank(size):
+    """Undo an append to the bank CSV"""
+    with open(BANK_FILE, 'r+b') as f:
+        f.truncate(size)
+
+
+def approve_questions(question_ids, admin_user):
+    """Approve pending questions and append them to the bank; returns the approved rows.
+
+    Every database write comes first and the CSV append last, just before
+    the commit. If the commit fails the file is truncated back, so the bank
+    never holds questions that are still pending.
+    """
+    ids = clean_ids(question_ids)
+    if not ids:
+        return []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            # Workers approve one at a time, so bank row numbers and appends never interleave.
+            # SQLite gets the same from the write lock its UPDATE takes.
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (BANK_APPEND_LOCK_ID,))
+        approved = _update_returning(
+            cursor, "status = 'approved', reviewed_at = CURRENT_TIMESTAMP, reviewed_by = ?",
+            (admin_user,), ids, "status = 'pending_review'")
+        if approved:
+            subject_stats.record_moved(cursor, approved, 'pending_review', 'approved')
+            with _bank_lock:
+                # The appended rows' numbers in the bank, which key them in the search index
+                first_row = search_index.bank_row_count() + 1
+                search_index.move_to_bank(cursor, approved, first_row)
+                bank_before = caches.file_signature(BANK_FILE)
+                size = _append_to_bank(approved)
+                bank_after = caches.file_signature(BANK_FILE)
+                try:
+                    signature = search_index.record_bank_signature(cursor)
+                    conn.commit()
+                except Exception:
+                    _truncate_bank(size)
+                    raise
+                search_index.bank_rows_appended(signature, first_row - 1 + len(approved))
+                dedupe.record_approved(approved, first_row, bank_before, bank_after)
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return approved
+
+
+def reject_questions(question_ids, admin_user, reason):
+    """Reject (soft delete) pending questions; returns the rejected rows"""
+    ids = clean_ids(question_ids)
+    if not ids:
+        return []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        rejected = _update_returning(
+            cursor, "status = 'rejected', is_active = 0, reviewed_at = CURRENT_TIMESTAMP, "
+                    "reviewed_by = ?, review_notes = ?",
+            (admin_user, reason), ids, "status = 'pending_review'")
+        search_index.remove_review(cursor, [row['id'] for row in rejected])
+        subject_stats.record_moved(cursor, rejected, 'pending_review', 'rejected')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    dedupe.forget(rejected)
+    return rejected
+
+
+def edit_questions(question_ids, changes):
+    """Apply the same field changes to pending questions; returns the edited rows.
+
+    Only EDITABLE_FIELDS present in ``changes`` are written.
+    """
+    ids = clean_ids(question_ids)
+    fields = [field for field in EDITABLE_FIELDS if field in changes]
+    if not ids or not fields:
+        return []
+    placeholders = ', '.join('?' for _ in ids)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(_QUESTION_FIELDS)} FROM newly_updated_questions
+            WHERE id IN ({placeholders}) AND status = 'pending_review'
+        ''', tuple(ids))
+        originals = {row[0]: dict(zip(_QUESTION_FIELDS, row)) for row in cursor.fetchall()}
+        edited = _update_returning(cursor, ', '.join(f'{field} = ?' for field in fields),
+                                   tuple(changes[field] for field in fields), ids, "status = 'pending_review'")
+        search_index.update_review(cursor, edited)
+        subject_stats.record_resubjected(
+            cursor, [(originals[row['id']]['subject'], row['subject']) for row in edited if row['id'] in originals],
+            'pending_review')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    for row in edited:
+        if row['id'] in originals:
+            dedupe.record_edited(originals[row['id']], row, row['id'])
+    return edited
@@ -0,0 +1,340 @@
+"""Full-text search over the question bank and the review queue.
+
+Both live in one question_search table in the app database: an FTS5 table
+on SQLite, and a table with a weighted tsvector column and a GIN index on
+Postgres. Each entry's key tells where it came from:
+- a positive key is the id of a newly_updated_questions row still awaiting
+  review;
+- a negative key is the row number of a bank CSV row (-1 is the first row).
+
+Review actions update the index with the cursor of their own transaction.
+Approval moves entries to the bank side, rejection drops them, edits
+rewrite them, and uploads and generated batches add them. The index stays
+exact without rebuilds. ensure_built() rebuilds it at startup only when the
+bank CSV was changed by something else.
+"""
+import os
+import re
+import time
+
+import pandas as pd
+
+import metrics
+from db import USE_POSTGRES, get_db_connection
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BANK_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_TERMS = 12
+SEARCH_RANK_MAX_MATCHES = int(os.environ.get('SEARCH_RANK_MAX_MATCHES', '20000'))
+REBUILD_BATCH_ROWS = 5000
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+TEXT_COLUMNS = ('question', 'option_a', 'option_b', 'option_c', 'option_d')
+COLUMNS = TEXT_COLUMNS + ('subject', 'chapter_name', 'correct_option', 'status')
+KEY = 'doc_id' if USE_POSTGRES else 'rowid'
+BANK_STATUS = 'bank'
+# Review rows that belong in the index; approved ones are indexed as bank rows
+INDEXED_REVIEW_ROWS = "is_active = 1 AND status != 'approved'"
+
+SEARCH_SECONDS = metrics.histogram(
+    'mcq_search_seconds',
+    'Time to run a question search, by whether results were relevance ranked.',
+    ('ranked',)
+)
+
+# (signature, row count) of the bank CSV as last counted
+_bank_rows = (None, 0)
+
+
+def create_tables(cursor):
+    """Create the index tables; called from init_db on both backends"""
+    if USE_POSTGRES:
+        question_vector = "setweight(to_tsvector('english', coalesce(question, '')), 'A')"
+        options_vector = ("setweight(to_tsvector('english', coalesce(option_a, '') || ' ' || coalesce(option_b, '')"
+                          " || ' ' || coalesce(option_c, '') || ' ' || coalesce(option_d, '')), 'B')")
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS question_search (
+                doc_id BIGINT PRIMARY KEY,
+                question TEXT,
+                option_a TEXT,
+                option_b TEXT,
+                option_c TEXT,
+                option_d TEXT,
+                subject TEXT,
+                chapter_name TEXT,
+                correct_option TEXT,
+                status TEXT,
+                document tsvector GENERATED ALWAYS AS ({question_vector} || {options_vector}) STORED
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_search_document ON question_search USING GIN (document)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_search_subject ON question_search (subject)')
+    else:
+        # Only the question and option text is searchable; the rest is carried for results and filters
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5(
+                question, option_a, option_b, option_c, option_d,
+                subject UNINDEXED, chapter_name UNINDEXED, correct_option UNINDEXED, status UNINDEXED,
+                tokenize = 'porter unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_index_meta (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+
+def _bank_signature():
+    stat = os.stat(BANK_FILE)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def record_bank_signature(cursor):
+    """Remember the bank file as indexed, so startup does not rebuild for our own appends; returns the signature"""
+    signature = _bank_signature()
+    cursor.execute('DELETE FROM search_index_meta WHERE name = ?', ('bank_signature',))
+    cursor.execute('INSERT INTO search_index_meta (name, value) VALUES (?, ?)', ('bank_signature', signature))
+    return signature
+
+
+def _read_bank():
+    return pd.read_csv(BANK_FILE, dtype=str, encoding='utf-8', keep_default_na=False, on_bad_lines='skip')
+
+
+def bank_row_count():
+    """Rows of the bank CSV as the index numbers them (unparseable lines skipped).
+
+    Counted again only when the file changed since the last count or append.
+    """
+    global _bank_rows
+    signature = _bank_signature()
+    if _bank_rows[0] != signature:
+        _bank_rows = (signature, len(_read_bank()))
+    return _bank_rows[1]
+
+
+def bank_rows_appended(signature, count):
+    """The bank file now has ``count`` rows and ``signature``, after an append by this process"""
+    global _bank_rows
+    _bank_rows = (signature, count)
+
+
+def _insert(cursor, entries):
+    """entries: (key, question, option_a..d, subject, chapter_name, correct_option, status) tuples"""
+    placeholders = ', '.join('?' for _ in range(len(COLUMNS) + 1))
+    cursor.executemany(f'INSERT INTO question_search ({KEY}, {", ".join(COLUMNS)}) VALUES ({placeholders})', entries)
+
+
+def _remove(cursor, keys):
+    keys = list(keys)
+    if keys:
+        cursor.execute(f'DELETE FROM question_search WHERE {KEY} IN ({", ".join("?" for _ in keys)})', tuple(keys))
+
+
+def add_review_batch(cursor, batch, after_id=0):
+    """Index the review rows inserted under ``batch`` with ids above ``after_id``; returns the highest id"""
+    cursor.execute(f'''
+        INSERT INTO question_search ({KEY}, {", ".join(COLUMNS)})
+        SELECT id, {", ".join(COLUMNS)} FROM newly_updated_questions
+        WHERE ingest_batch = ? AND id > ? AND {INDEXED_REVIEW_ROWS}
+    ''', (batch, after_id))
+    cursor.execute('SELECT MAX(id) FROM newly_updated_questions WHERE ingest_batch = ?', (batch,))
+    return cursor.fetchone()[0] or after_id
+
+
+def update_review(cursor, rows):
+    """Re-index edited review rows (dicts with id and the COLUMNS fields, status excepted)"""
+    _remove(cursor, [row['id'] for row in rows])
+    _insert(cursor, [(row['id'],) + tuple(row.get(column) for column in COLUMNS[:-1]) + ('pending_review',)
+                     for row in rows])
+
+
+def remove_review(cursor, ids):
+    _remove(cursor, ids)
+
+
+def move_to_bank(cursor, rows, first_row):
+    """Re-key approved review rows as the bank rows just appended for them, numbered from ``first_row``"""
+    _remove(cursor, [row['id'] for row in rows])
+    _insert(cursor, [(-number,) + tuple(row.get(column) for column in COLUMNS[:-1]) + (BANK_STATUS,)
+                     for number, row in enumerate(rows, start=first_row)])
+
+
+def _bank_entries():
+    df = _read_bank()
+    df = df.reindex(columns=['Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Subject',
+                             'Chapter Name', 'Correct Option', 'Correct Answer'], fill_value='')
+    df['Subject'] = df['Subject'].str.strip()
+    # Older bank rows only fill Correct Answer, rows approved in the app only Correct Option
+    df['Correct Option'] = df['Correct Option'].str.strip().where(df['Correct Option'].str.strip() != '',
+                                                                 df['Correct Answer'].str.strip())
+    df = df.drop(columns='Correct Answer')
+    for number, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        yield (-number,) + row + (BANK_STATUS,)
+
+
+def rebuild():
+    """Re-index the whole bank CSV and review queue in one transaction; returns the entry count"""
+    start = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM question_search')
+        batch = []
+        bank_count = 0
+        for entry in _bank_entries():
+            bank_count += 1
+            batch.append(entry)
+            if len(batch) >= REBUILD_BATCH_ROWS:
+                _insert(cursor, batch)
+                batch = []
+        if batch:
+            _insert(cursor, batch)
+        cursor.execute(f'''
+            INSERT INTO question_search ({KEY}, {", ".join(COLUMNS)})
+            SELECT id, {", ".join(COLUMNS)} FROM newly_updated_questions WHERE {INDEXED_REVIEW_ROWS}
+        ''')
+        signature = record_bank_signature(cursor)
+        cursor.execute('SELECT COUNT(*) FROM question_search')
+        count = cursor.fetchone()[0]
+        if not USE_POSTGRES:
+            cursor.execute("INSERT INTO question_search (question_search) VALUES ('optimize')")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    bank_rows_appended(signature, bank_count)
+    print(f"🔎 Search index rebuilt: {count} questions in {time.perf_counter() - start:.1f}s")
+    return count
+
+
+def ensure_built():
+    """Rebuild at startup if the bank CSV changed outside the app or the index is empty"""
+    try:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT value FROM search_index_meta WHERE name = ?', ('bank_signature',))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if row is None or row[0] != _bank_signature():
+            rebuild()
+    except Exception as e:
+        print(f"⚠️ Could not build the search index: {e}")
+
+
+def _terms(query):
+    return re.findall(r'[^\W_]+', (query or '').lower())[:SEARCH_MAX_TERMS]
+
+
+def _fts5_query(terms):
+    # Every term quoted, so user input cannot use FTS5 syntax; the last one also matches as a prefix
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= 2:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _tsquery(terms):
+    parts = list(terms)
+    if len(parts[-1]) >= 2:
+        parts[-1] += ':*'
+    return ' & '.join(parts)
+
+
+def _result(row):
+    key = row[0]
+    return {
+        'source': 'bank' if key < 0 else 'review',
+        'id': key if key > 0 else None,
+        'bank_row': -key if key < 0 else None,
+        'subject': row[1],
+        'chapter_name': row[2],
+        'correct_option': row[3],
+        'status': row[4],
+        'highlight': dict(zip(TEXT_COLUMNS, row[5:10])),
+        'score': round(float(row[10]), 4) if row[10] is not None else None
+    }
+
+
+def search(query, subject=None, source=None, limit=20):
+    """Matches for ``query`` as (results, ranked); ValueError if it has no searchable words.
+
+    Highlighted question and option text wraps matched words in <mark>.
+    source is 'bank' or 'review' to search only one side. Queries matching
+    more than SEARCH_RANK_MAX_MATCHES questions are too broad for relevance
+    to mean much, and scoring every match would take far longer than the
+    search itself. They come back unscored with ranked False: the newest
+    review questions first, then the bank in file order.
+    """
+    terms = _terms(query)
+    if not terms:
+        raise ValueError('Search query must contain at least one word')
+    limit = max(1, min(int(limit), SEARCH_MAX_RESULTS))
+    filters = []
+    params = []
+    if subject:
+        filters.append('subject = ?')
+        params.append(subject)
+    if source == 'bank':
+        filters.append(f'{KEY} < 0')
+    elif source == 'review':
+        filters.append(f'{KEY} > 0')
+    where = ''.join(f' AND {clause}' for clause in filters)
+
+    start = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            tsquery = _tsquery(terms)
+            cursor.execute("SELECT COUNT(*) FROM question_search WHERE document @@ to_tsquery('english', ?)",
+                           (tsquery,))
+            ranked = cursor.fetchone()[0] <= SEARCH_RANK_MAX_MATCHES
+            options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, HighlightAll=true'
+            headlines = ', '.join(f"ts_headline('english', coalesce({column}, ''), q, ?)" for column in TEXT_COLUMNS)
+            score = 'ts_rank(document, q)' if ranked else 'NULL::real'
+            order = 'score DESC, doc_id DESC' if ranked else 'doc_id DESC'
+            cursor.execute(f'''
+                SELECT doc_id, subject, chapter_name, correct_option, status, {headlines}, score
+                FROM (
+                    SELECT doc_id, subject, chapter_name, correct_option, status, {", ".join(TEXT_COLUMNS)},
+                           {score} AS score, q
+                    FROM question_search, to_tsquery('english', ?) AS q
+                    WHERE document @@ q{where}
+                    ORDER BY {order}
+                    LIMIT ?
+                ) AS top
+                ORDER BY {order}
+            ''', (*[options] * len(TEXT_COLUMNS), tsquery, *params, limit))
+        else:
+            match = _fts5_query(terms)
+            cursor.execute('SELECT COUNT(*) FROM question_search WHERE question_search MATCH ?', (match,))
+            ranked = cursor.fetchone()[0] <= SEARCH_RANK_MAX_MATCHES
+            highlights = ', '.join(f'highlight(question_search, {index}, ?, ?)' for index in range(len(TEXT_COLUMNS)))
+            # bm25 is lower for better matches; the question text counts more than the options
+            cursor.execute(f'''
+                SELECT rowid, subject, chapter_name, correct_option, status, {highlights},
+                       -bm25(question_search, 3.0, 1.0, 1.0, 1.0, 1.0) AS score
+                FROM question_search
+                WHERE question_search MATCH ?{where}
+                ORDER BY {'score DESC' if ranked else 'rowid DESC'}
+                LIMIT ?
+            ''', (*[HIGHLIGHT_START, HIGHLIGHT_END] * len(TEXT_COLUMNS), match, *params, limit))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    SEARCH_SECONDS.observe(time.perf_counter() - start, ranked=str(ranked).lower())
+    results = [_result(row) for row in rows]
+    if not ranked:
+        for result in results:
+            result['score'] = None
+    return results, ranked
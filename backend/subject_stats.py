@@ -0,0 +1,255 @@
+"""Per-subject review-queue counters for the admin dashboard.
+
+subject_stats holds one row per normalized subject with its pending,
+approved and rejected counts and a display label. The code paths that
+insert review questions or change their status bump the counters with the
+cursor of their own transaction: generation, CSV upload, approve, reject,
+and edits that change the subject. The counters therefore never disagree
+with the rows they count, and /api/admin/stats reads them directly.
+
+Run ``python subject_stats.py`` to compare the counters with a fresh
+GROUP BY over newly_updated_questions, or ``python subject_stats.py
+--rebuild`` to recompute them (labels come from the bank CSV, as the
+dashboard always showed them).
+"""
+import os
+import re
+import sys
+from collections import Counter
+
+import pandas as pd
+
+from db import get_db_connection
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BANK_FILE = os.path.join(BASE_DIR, 'data', 'MCQ_Quesbank.csv')
+# Review status: counter column
+STATUS_COLUMNS = {'pending_review': 'pending', 'approved': 'approved', 'rejected': 'rejected'}
+# What each counter counts; rejected questions are also deactivated
+COUNTED_ROWS = {
+    'pending': "status = 'pending_review' AND is_active = 1",
+    'approved': "status = 'approved' AND is_active = 1",
+    'rejected': "status = 'rejected'",
+}
+_INVISIBLE = ('\ufeff', '\u200b')
+
+
+def clean_label(value):
+    text = str(value or '')
+    for char in _INVISIBLE:
+        text = text.replace(char, '')
+    return text.replace('\u00a0', ' ').strip()
+
+
+def subject_key(value):
+    """Subjects that differ only in case, spacing or punctuation share one counter"""
+    return re.sub(r'[^a-z0-9]', '', clean_label(value).lower())
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS subject_stats (
+            subject_key TEXT PRIMARY KEY,
+            label TEXT NOT NULL,
+            pending INTEGER NOT NULL DEFAULT 0,
+            approved INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _upsert(cursor, counts, labels):
+    """Add {key: {column: delta}} to the counters, creating subjects as needed"""
+    if not counts:
+        return
+    cursor.executemany('''
+        INSERT INTO subject_stats (subject_key, label, pending, approved, rejected)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (subject_key) DO UPDATE SET
+            pending = subject_stats.pending + excluded.pending,
+            approved = subject_stats.approved + excluded.approved,
+            rejected = subject_stats.rejected + excluded.rejected
+    ''', [(key, labels[key], c['pending'], c['approved'], c['rejected']) for key, c in sorted(counts.items())])
+
+
+def _apply(cursor, deltas, labels):
+    """Add {(key, column): delta} to the counters"""
+    counts = {}
+    for (key, column), delta in deltas.items():
+        if key and delta:
+            counts.setdefault(key, {'pending': 0, 'approved': 0, 'rejected': 0})[column] += delta
+    _upsert(cursor, counts, labels)
+
+
+def record_inserted(cursor, subjects, status):
+    """Count newly inserted review questions (an iterable of their subjects)"""
+    column = STATUS_COLUMNS.get(status)
+    if column is None:
+        return
+    deltas = Counter()
+    labels = {}
+    for subject in subjects:
+        key = subject_key(subject)
+        deltas[(key, column)] += 1
+        labels.setdefault(key, clean_label(subject))
+    _apply(cursor, deltas, labels)
+
+
+def record_moved(cursor, rows, old_status, new_status):
+    """Move questions (dicts with a subject) from one status counter to another"""
+    deltas = Counter()
+    labels = {}
+    for row in rows:
+        key = subject_key(row['subject'])
+        labels.setdefault(key, clean_label(row['subject']))
+        if old_status in STATUS_COLUMNS:
+            deltas[(key, STATUS_COLUMNS[old_status])] -= 1
+        if new_status in STATUS_COLUMNS:
+            deltas[(key, STATUS_COLUMNS[new_status])] += 1
+    _apply(cursor, deltas, labels)
+
+
+def record_resubjected(cursor, pairs, status):
+    """Move questions whose subject was edited; pairs are (old_subject, new_subject)"""
+    column = STATUS_COLUMNS.get(status)
+    if column is None:
+        return
+    deltas = Counter()
+    labels = {}
+    for old_subject, new_subject in pairs:
+        old_key, new_key = subject_key(old_subject), subject_key(new_subject)
+        if old_key == new_key:
+            continue
+        deltas[(old_key, column)] -= 1
+        deltas[(new_key, column)] += 1
+        labels.setdefault(old_key, clean_label(old_subject))
+        labels.setdefault(new_key, clean_label(new_subject))
+    _apply(cursor, deltas, labels)
+
+
+def read():
+    """Dashboard stats: {label: {pending, approved, rejected, total}} for subjects with questions"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT label, pending, approved, rejected FROM subject_stats
+            WHERE pending + approved > 0
+            ORDER BY subject_key
+        ''')
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    stats = {}
+    for label, pending, approved, rejected in rows:
+        counts = stats.setdefault(label, {'pending': 0, 'approved': 0, 'rejected': 0, 'total': 0})
+        counts['pending'] += pending
+        counts['approved'] += approved
+        counts['rejected'] += rejected
+        counts['total'] = counts['pending'] + counts['approved']
+    return stats
+
+
+def _bank_labels():
+    """Normalized subject -> first spelling used in the bank CSV"""
+    labels = {}
+    try:
+        subjects = pd.read_csv(BANK_FILE, encoding='utf-8', dtype=str, usecols=['Subject'])['Subject']
+    except Exception:
+        return {'physics': 'Physics', 'chemistry': 'Chemistry', 'maths': 'Maths', 'biology': 'Biology'}
+    for subject in subjects.fillna('').str.replace('Physcis', 'Physics', case=False):
+        key = subject_key(subject)
+        if key:
+            labels.setdefault(key, clean_label(subject))
+    return labels
+
+
+def _computed(cursor):
+    """Counters recomputed from newly_updated_questions: {key: {column: count}}, plus row labels"""
+    counts = {}
+    labels = {}
+    for column, condition in COUNTED_ROWS.items():
+        cursor.execute(f'SELECT subject, COUNT(*) FROM newly_updated_questions WHERE {condition} GROUP BY subject')
+        for subject, count in cursor.fetchall():
+            key = subject_key(subject)
+            if not key:
+                continue
+            counts.setdefault(key, {'pending': 0, 'approved': 0, 'rejected': 0})[column] += count
+            labels.setdefault(key, clean_label(subject))
+    return counts, labels
+
+
+def verify():
+    """Differences between the counters and a recount: [(key, column, stored, actual)]"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        actual, _labels = _computed(cursor)
+        cursor.execute('SELECT subject_key, pending, approved, rejected FROM subject_stats')
+        stored = {row[0]: dict(zip(('pending', 'approved', 'rejected'), row[1:])) for row in cursor.fetchall()}
+    finally:
+        conn.close()
+    zero = {'pending': 0, 'approved': 0, 'rejected': 0}
+    return [(key, column, stored.get(key, zero)[column], actual.get(key, zero)[column])
+            for key in sorted(set(actual) | set(stored))
+            for column in ('pending', 'approved', 'rejected')
+            if stored.get(key, zero)[column] != actual.get(key, zero)[column]]
+
+
+def rebuild():
+    """Recompute every counter in one transaction; returns the number of subjects"""
+    bank_labels = _bank_labels()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Deleting first makes writers that commit during the recount wait and then add on top of it
+        cursor.execute('DELETE FROM subject_stats')
+        counts, row_labels = _computed(cursor)
+        _upsert(cursor, counts, {key: bank_labels.get(key) or row_labels[key] for key in counts})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"📊 Subject stats rebuilt for {len(counts)} subjects")
+    return len(counts)
+
+
+def ensure_built():
+    """Fill the counters on first start after the table is added"""
+    try:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM subject_stats')
+            empty = cursor.fetchone()[0] == 0
+        finally:
+            conn.close()
+        if empty:
+            rebuild()
+    except Exception as e:
+        print(f"⚠️ Could not build subject stats: {e}")
+
+
+def main(argv):
+    conn = get_db_connection()
+    try:
+        create_table(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    if '--rebuild' in argv:
+        rebuild()
+    drift = verify()
+    for key, column, stored, actual in drift:
+        print(f"❌ {key}.{column}: counter {stored}, actual {actual}")
+    if drift:
+        print(f"{len(drift)} counters differ; run with --rebuild to fix them")
+        return 1
+    print("✅ Subject stats match the review queue")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
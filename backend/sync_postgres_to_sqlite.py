@@ -10,7 +10,8 @@ TABLES = [
     'visitor_logs',
     'user_sessions',
     'test_attempts',
-    'ai_generated_questions',
+    'newly_updated_questions',
+    'subject_stats',
     'admin_actions'
 ]
 
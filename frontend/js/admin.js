@@ -56,182 +56,332 @@ async function loadStats() {
     }
 }
 
-async function loadPendingQuestions() {
-    const subject = document.getElementById('subject-select').value;
-    const url = subject ? 
-        `${API_URL}/admin/pending-questions?subject=${subject}` :
-        `${API_URL}/admin/pending-questions`;
-    
+const PAGE_SIZE = 50;
+// Paging state per tab; generation discards responses that a filter change made stale
+const reviewLists = {
+    pending: { cursor: null, done: true, loading: false, generation: 0 },
+    approved: { cursor: null, done: true, loading: false, generation: 0 }
+};
+
+// Fetch the next page when a list's end marker comes within reach of the viewport
+const pageObserver = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+    entries.filter(entry => entry.isIntersecting).forEach(entry => loadNextPage(entry.target.dataset.list));
+}, { rootMargin: '800px 0px' }) : null;
+
+// Typeset each card once, when it first scrolls near the viewport
+const mathObserver = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+    entries.filter(entry => entry.isIntersecting).forEach(entry => {
+        mathObserver.unobserve(entry.target);
+        renderMath(entry.target);
+    });
+}, { rootMargin: '400px 0px' }) : null;
+
+function listFilters() {
+    const params = new URLSearchParams();
+    const filters = {
+        subject: document.getElementById('subject-select').value,
+        chapter: document.getElementById('chapter-filter').value.trim(),
+        source: document.getElementById('source-filter').value,
+        verdict: document.getElementById('verdict-filter').value
+    };
+    for (const [name, value] of Object.entries(filters)) {
+        if (value) params.set(name, value);
+    }
+    return params;
+}
+
+function reloadQuestionList() {
+    if (document.getElementById('approved-tab').classList.contains('active')) {
+        loadApprovedQuestions();
+    } else {
+        loadPendingQuestions();
+    }
+}
+
+function resetQuestionList(kind) {
+    const state = reviewLists[kind];
+    state.generation += 1;
+    state.cursor = null;
+    state.done = false;
+    state.loading = false;
+    const questionsList = document.getElementById(`${kind}-questions-list`);
+    if (mathObserver) {
+        questionsList.querySelectorAll('.question-card').forEach(card => mathObserver.unobserve(card));
+    }
+    questionsList.innerHTML = '';
+}
+
+async function loadNextPage(kind) {
+    const state = reviewLists[kind];
+    if (state.loading || state.done) return;
+    state.loading = true;
+    const generation = state.generation;
+
+    const params = listFilters();
+    params.set('limit', PAGE_SIZE);
+    if (state.cursor) params.set('cursor', state.cursor);
+
     try {
-        const response = await fetch(url);
+        const response = await fetch(`${API_URL}/admin/${kind}-questions?${params}`);
         const data = await response.json();
-        pendingQuestions = data.pending_questions;
-        
-        document.getElementById('pending-count').textContent = data.count;
-        
-        const questionsList = document.getElementById('pending-questions-list');
-        
-        if (data.count === 0) {
-            questionsList.innerHTML = `
-                <div style="text-align: center; padding: 60px;">
-                    <h3>No pending questions for review</h3>
-                    <p style="color: #666; margin: 20px 0;">Generate new questions to start reviewing</p>
-                    <button class="btn btn-primary" onclick="showGenerateModal()">
-                        ✨ Generate Questions
-                    </button>
-                </div>
-            `;
-            return;
+        if (generation !== state.generation) return;
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP ${response.status}`);
         }
-        
-        questionsList.innerHTML = data.pending_questions.map(q => `
-            <div class="question-card" id="question-${q.id}">
-                <div class="question-header">
-                    <input type="checkbox" class="question-checkbox" 
-                           value="${q.id}" 
-                           onchange="toggleQuestionSelection(${q.id})"
-                           style="margin-right: 15px;">
-                    <div style="flex: 1;">
-                        <div class="question-meta">
-                            <span class="badge badge-subject">${q.subject}</span>
-                            <span class="badge badge-type">${q.question_type}</span>
-                            <span class="badge" style="background: #667eea; color: white;">
-                                📖 ${q.chapter_name || 'General'}
-                            </span>
-                            <span class="badge badge-pending">Pending Review</span>
+
+        state.cursor = data.next_cursor;
+        state.done = !data.next_cursor;
+        if (data.total !== null) {
+            document.getElementById(`${kind}-count`).textContent = data.total;
+        }
+        appendQuestionCards(kind, data[`${kind}_questions`], data.total === 0);
+    } catch (error) {
+        console.error(`Error loading ${kind} questions:`, error);
+    } finally {
+        if (generation === state.generation) state.loading = false;
+    }
+}
+
+function appendQuestionCards(kind, questions, empty) {
+    const questionsList = document.getElementById(`${kind}-questions-list`);
+    const oldSentinel = questionsList.querySelector('.list-sentinel');
+    if (oldSentinel) {
+        if (pageObserver) pageObserver.unobserve(oldSentinel);
+        oldSentinel.remove();
+    }
+
+    if (empty) {
+        questionsList.innerHTML = kind === 'pending' ? `
+            <div style="text-align: center; padding: 60px;">
+                <h3>No pending questions for review</h3>
+                <p style="color: #666; margin: 20px 0;">Generate new questions to start reviewing</p>
+                <button class="btn btn-primary" onclick="showGenerateModal()">
+                    ✨ Generate Questions
+                </button>
+            </div>
+        ` : `
+            <div style="text-align: center; padding: 60px; color: #666;">
+                <h3>No approved questions yet</h3>
+                <p>Approve pending questions to see them here</p>
+            </div>
+        `;
+        return;
+    }
+
+    const template = document.createElement('template');
+    template.innerHTML = questions.map(kind === 'pending' ? pendingCardHtml : approvedCardHtml).join('');
+    const cards = Array.from(template.content.children);
+    questionsList.appendChild(template.content);
+
+    if (kind === 'pending') {
+        pendingQuestions.push(...questions);
+        questions.filter(q => selectedQuestions.has(q.id)).forEach(q => {
+            const card = document.getElementById(`question-${q.id}`);
+            card.classList.add('selected');
+            card.querySelector('.question-checkbox').checked = true;
+        });
+        // Verdicts stored by earlier batch verification runs
+        questions.filter(q => q.ai_verdict).forEach(q => renderAIVerdict(q.id, {
+            verdict: q.ai_verdict,
+            is_correct: q.ai_verdict === 'correct',
+            correct_option: q.ai_correct_option,
+            explanation: q.ai_explanation
+        }));
+    }
+    cards.forEach(card => mathObserver ? mathObserver.observe(card) : renderMath(card));
+
+    if (!reviewLists[kind].done) {
+        const sentinel = document.createElement('div');
+        sentinel.className = 'list-sentinel';
+        sentinel.dataset.list = kind;
+        sentinel.innerHTML = `<button class="btn btn-secondary btn-small" onclick="loadNextPage('${kind}')">Load more</button>`;
+        questionsList.appendChild(sentinel);
+        if (pageObserver) pageObserver.observe(sentinel);
+    }
+}
+
+function pendingCardHtml(q) {
+    return `
+        <div class="question-card" id="question-${q.id}">
+            <div class="question-header">
+                <input type="checkbox" class="question-checkbox" 
+                       value="${q.id}" 
+                       onchange="toggleQuestionSelection(${q.id})"
+                       style="margin-right: 15px;">
+                <div style="flex: 1;">
+                    <div class="question-meta">
+                        <span class="badge badge-subject">${q.subject}</span>
+                        <span class="badge badge-type">${q.question_type}</span>
+                        <span class="badge" style="background: #667eea; color: white;">
+                            📖 ${q.chapter_name || 'General'}
+                        </span>
+                        <span class="badge badge-pending">Pending Review</span>
+                        ${q.duplicate_note ? '<span class="badge" style="background: #f39c12; color: white;">⚠️ Possible duplicate</span>' : ''}
+                    </div>
+                    <div class="question-text">${q.question}</div>
+                    ${q.duplicate_note ? `
+                    <div style="margin-top: 10px; padding: 10px; background: #fff8e6; border-radius: 8px; font-size: 0.9em; border-left: 4px solid #f39c12;">
+                        ${q.duplicate_note}
+                    </div>
+                    ` : ''}
+                    <div class="question-options">
+                        <div class="option-item ${q.correct_option === 'A' ? 'correct' : ''}">
+                            A. ${q.option_a}
                         </div>
-                        <div class="question-text">${q.question}</div>
-                        <div class="question-options">
-                            <div class="option-item ${q.correct_option === 'A' ? 'correct' : ''}">
-                                A. ${q.option_a}
-                            </div>
-                            <div class="option-item ${q.correct_option === 'B' ? 'correct' : ''}">
-                                B. ${q.option_b}
-                            </div>
-                            <div class="option-item ${q.correct_option === 'C' ? 'correct' : ''}">
-                                C. ${q.option_c}
-                            </div>
-                            <div class="option-item ${q.correct_option === 'D' ? 'correct' : ''}">
-                                D. ${q.option_d}
-                            </div>
+                        <div class="option-item ${q.correct_option === 'B' ? 'correct' : ''}">
+                            B. ${q.option_b}
                         </div>
-
-                        ${q.explanation ? `
-                        <div class="explanation-box" style="margin-top: 15px; padding: 12px; background: #f0f2ff; border-radius: 8px; font-size: 0.9em; border-left: 4px solid #667eea;">
-                            <strong>💡 AI Explanation:</strong> ${q.explanation}
+                        <div class="option-item ${q.correct_option === 'C' ? 'correct' : ''}">
+                            C. ${q.option_c}
                         </div>
-                        ` : ''}
-
-                        <div id="ai-feedback-${q.id}" class="ai-feedback" style="display: none; margin-top: 15px; padding: 12px; border-radius: 8px; border-left: 4px solid #6c5ce7; background: #fff;">
-                            <!-- AI feedback will be injected here -->
+                        <div class="option-item ${q.correct_option === 'D' ? 'correct' : ''}">
+                            D. ${q.option_d}
                         </div>
+                    </div>
 
-                        <div class="question-actions">
-                            <button class="btn btn-ai btn-small" onclick="verifyWithAI(${q.id})" style="background: #6c5ce7; color: white;">
-                                ✨ Verify with AI
-                            </button>
-                            <button class="btn btn-success btn-small" onclick="approveQuestion(${q.id})">
-                                ✓ Approve & Add to CSV
-                            </button>
-                            <button class="btn btn-edit btn-small" onclick="editQuestion(${q.id})">
-                                ✎ Edit
-                            </button>
-                            <button class="btn btn-danger btn-small" onclick="rejectQuestion(${q.id})">
-                                ✗ Reject
-                            </button>
-                        </div>
+                    ${q.explanation ? `
+                    <div class="explanation-box" style="margin-top: 15px; padding: 12px; background: #f0f2ff; border-radius: 8px; font-size: 0.9em; border-left: 4px solid #667eea;">
+                        <strong>💡 AI Explanation:</strong> ${q.explanation}
+                    </div>
+                    ` : ''}
+
+                    <div id="ai-feedback-${q.id}" class="ai-feedback" style="display: none; margin-top: 15px; padding: 12px; border-radius: 8px; border-left: 4px solid #6c5ce7; background: #fff;">
+                        <!-- AI feedback will be injected here -->
+                    </div>
+
+                    <div class="question-actions">
+                        <button class="btn btn-ai btn-small" onclick="verifyWithAI(${q.id})" style="background: #6c5ce7; color: white;">
+                            ✨ Verify with AI
+                        </button>
+                        <button class="btn btn-success btn-small" onclick="approveQuestion(${q.id})">
+                            ✓ Approve & Add to CSV
+                        </button>
+                        <button class="btn btn-edit btn-small" onclick="editQuestion(${q.id})">
+                            ✎ Edit
+                        </button>
+                        <button class="btn btn-danger btn-small" onclick="rejectQuestion(${q.id})">
+                            ✗ Reject
+                        </button>
                     </div>
                 </div>
             </div>
-        `).join('');
-        
-        renderMath();
-    } catch (error) {
-        console.error('Error loading pending questions:', error);
-    }
+        </div>
+    `;
 }
 
-async function loadApprovedQuestions() {
-    const subject = document.getElementById('subject-select').value;
-    const url = subject ?
-        `${API_URL}/admin/approved-questions?subject=${subject}` :
-        `${API_URL}/admin/approved-questions`;
-    
-    try {
-        const response = await fetch(url);
-        const data = await response.json();
-        
-        document.getElementById('approved-count').textContent = data.count;
-        
-        const questionsList = document.getElementById('approved-questions-list');
-        
-        if (data.count === 0) {
-            questionsList.innerHTML = `
-                <div style="text-align: center; padding: 60px; color: #666;">
-                    <h3>No approved questions yet</h3>
-                    <p>Approve pending questions to see them here</p>
+function approvedCardHtml(q) {
+    return `
+        <div class="question-card">
+            <div class="question-meta">
+                <span class="badge badge-subject">${q.subject}</span>
+                <span class="badge badge-type">${q.question_type}</span>
+                <span class="badge" style="background: #27ae60; color: white;">Approved & Added to CSV</span>
+            </div>
+            <div class="question-text">${q.question}</div>
+            <div class="question-options">
+                <div class="option-item ${q.correct_option === 'A' ? 'correct' : ''}">
+                    A. ${q.option_a}
                 </div>
-            `;
-            return;
-        }
-        
-        questionsList.innerHTML = data.approved_questions.map(q => `
-            <div class="question-card">
-                <div class="question-meta">
-                    <span class="badge badge-subject">${q.subject}</span>
-                    <span class="badge badge-type">${q.question_type}</span>
-                    <span class="badge" style="background: #27ae60; color: white;">Approved & Added to CSV</span>
+                <div class="option-item ${q.correct_option === 'B' ? 'correct' : ''}">
+                    B. ${q.option_b}
                 </div>
-                <div class="question-text">${q.question}</div>
-                <div class="question-options">
-                    <div class="option-item ${q.correct_option === 'A' ? 'correct' : ''}">
-                        A. ${q.option_a}
-                    </div>
-                    <div class="option-item ${q.correct_option === 'B' ? 'correct' : ''}">
-                        B. ${q.option_b}
-                    </div>
-                    <div class="option-item ${q.correct_option === 'C' ? 'correct' : ''}">
-                        C. ${q.option_c}
-                    </div>
-                    <div class="option-item ${q.correct_option === 'D' ? 'correct' : ''}">
-                        D. ${q.option_d}
-                    </div>
+                <div class="option-item ${q.correct_option === 'C' ? 'correct' : ''}">
+                    C. ${q.option_c}
+                </div>
+                <div class="option-item ${q.correct_option === 'D' ? 'correct' : ''}">
+                    D. ${q.option_d}
                 </div>
-                <p style="margin-top: 10px; color: #666; font-size: 0.9em;">
-                    ✓ Reviewed by: ${q.reviewed_by || 'Admin'} on ${new Date(q.reviewed_at).toLocaleString()}
-                </p>
             </div>
-        `).join('');
-        
-        renderMath();
-    } catch (error) {
-        console.error('Error loading approved questions:', error);
-    }
+            <p style="margin-top: 10px; color: #666; font-size: 0.9em;">
+                ✓ Reviewed by: ${q.reviewed_by || 'Admin'} on ${new Date(q.reviewed_at).toLocaleString()}
+            </p>
+        </div>
+    `;
+}
+
+function loadPendingQuestions() {
+    resetQuestionList('pending');
+    pendingQuestions = [];
+    return loadNextPage('pending');
+}
+
+function loadApprovedQuestions() {
+    resetQuestionList('approved');
+    return loadNextPage('approved');
 }
 
 async function verifyBulkAI() {
-    if (pendingQuestions.length === 0) {
+    const total = parseInt(document.getElementById('pending-count').textContent, 10) || 0;
+    if (total === 0) {
         alert('No pending questions to verify.');
         return;
     }
     
-    if (!confirm(`This will verify all ${pendingQuestions.length} pending questions with AI. Continue?`)) return;
+    if (!confirm(`This will verify all ${total} pending questions matching the current filters with AI. Continue?`)) return;
     
-    // Trigger verification for each question
-    for (const q of pendingQuestions) {
-        verifyWithAI(q.id);
-        // Small delay to prevent overwhelming the browser/API
-        await new Promise(r => setTimeout(r, 1000));
+    const button = document.getElementById('verify-all-btn');
+    pendingQuestions.forEach(q => showAIVerifying(q.id));
+
+    try {
+        // One server-side job verifies every matching question in packed batches
+        const response = await fetch(`${API_URL}/admin/verify-batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(Object.fromEntries(listFilters()))
+        });
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || `HTTP ${response.status}`);
+        }
+
+        button.disabled = true;
+        pollBatchVerification(job.job_id, new Set());
+    } catch (error) {
+        console.error('Batch verification failed to start:', error);
+        alert(`Could not start AI verification: ${error.message}`);
+        loadPendingQuestions();
     }
 }
 
-async function verifyWithAI(id) {
-    const feedbackDiv = document.getElementById(`ai-feedback-${id}`);
-    const question = pendingQuestions.find(q => q.id === id);
-    
-    if (!question) return;
+async function pollBatchVerification(jobId, rendered) {
+    const button = document.getElementById('verify-all-btn');
+    try {
+        const response = await fetch(`${API_URL}/admin/verify-batch/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || `HTTP ${response.status}`);
+        }
 
-    // Show loading state
+        const fresh = job.results.filter(result => !rendered.has(result.id));
+        fresh.forEach(result => {
+            rendered.add(result.id);
+            renderAIVerdict(result.id, result);
+        });
+        fresh.forEach(result => {
+            const feedbackDiv = document.getElementById(`ai-feedback-${result.id}`);
+            if (feedbackDiv) renderMath(feedbackDiv);
+        });
+        button.textContent = `✨ Verifying ${job.verified + job.failed}/${job.total}...`;
+
+        if (job.status === 'running') {
+            setTimeout(() => pollBatchVerification(jobId, rendered), 2000);
+            return;
+        }
+        if (job.error) {
+            alert(`AI verification stopped early: ${job.error}`);
+        }
+    } catch (error) {
+        console.error('Batch verification polling failed:', error);
+    }
+    button.disabled = false;
+    button.textContent = '✨ AI Verify All';
+}
+
+function showAIVerifying(id) {
+    const feedbackDiv = document.getElementById(`ai-feedback-${id}`);
+    if (!feedbackDiv) return;
     feedbackDiv.style.display = 'block';
     feedbackDiv.innerHTML = `
         <div style="display: flex; align-items: center; gap: 10px; color: #666;">
@@ -239,6 +389,52 @@ async function verifyWithAI(id) {
             <span>AI is analyzing the question...</span>
         </div>
     `;
+}
+
+function renderAIVerdict(id, data) {
+    const feedbackDiv = document.getElementById(`ai-feedback-${id}`);
+    if (!feedbackDiv) return;
+    feedbackDiv.style.display = 'block';
+
+    if (data.verdict === 'error') {
+        feedbackDiv.innerHTML = `<p style="color: red;">Error: ${data.explanation}</p>`;
+        return;
+    }
+
+    const isMatch = data.is_correct;
+    let html = `
+        <div style="margin-bottom: 10px;">
+            <strong style="color: ${isMatch ? '#2e7d32' : '#c62828'};">
+                ${isMatch ? '⭐ AI confirms this answer is correct!' : '⚠️ AI suggests a different answer!'}
+            </strong>
+        </div>
+        <div style="font-size: 0.95em; color: #444; margin-bottom: 12px; line-height: 1.5;">
+            ${data.explanation}
+        </div>
+    `;
+
+    if (!isMatch) {
+        html += `
+            <div style="background: #fff3e0; padding: 10px; border-radius: 6px; border: 1px solid #ffe0b2;">
+                <p style="margin: 0 0 8px 0; font-weight: bold; color: #e65100;">AI Suggestion: Option ${data.correct_option}</p>
+                <button class="btn btn-small" onclick="applyAISuggestion(${id}, '${data.correct_option}')" style="background: #ff9800; color: white;">
+                    Update answer to ${data.correct_option}
+                </button>
+            </div>
+        `;
+    }
+
+    feedbackDiv.innerHTML = html;
+}
+
+async function verifyWithAI(id) {
+    const feedbackDiv = document.getElementById(`ai-feedback-${id}`);
+    const question = pendingQuestions.find(q => q.id === id);
+    
+    if (!question) return;
+
+    // Show loading state
+    showAIVerifying(id);
 
     try {
         const response = await fetch(`${API_URL}/admin/verify-with-ai`, {
@@ -261,33 +457,8 @@ async function verifyWithAI(id) {
         const result = await response.json();
         
         if (result.success) {
-            const data = result.analysis;
-            const isMatch = data.is_correct;
-            
-            let html = `
-                <div style="margin-bottom: 10px;">
-                    <strong style="color: ${isMatch ? '#2e7d32' : '#c62828'};">
-                        ${isMatch ? '⭐ AI confirms this answer is correct!' : '⚠️ AI suggests a different answer!'}
-                    </strong>
-                </div>
-                <div style="font-size: 0.95em; color: #444; margin-bottom: 12px; line-height: 1.5;">
-                    ${data.explanation}
-                </div>
-            `;
-
-            if (!isMatch) {
-                html += `
-                    <div style="background: #fff3e0; padding: 10px; border-radius: 6px; border: 1px solid #ffe0b2;">
-                        <p style="margin: 0 0 8px 0; font-weight: bold; color: #e65100;">AI Suggestion: Option ${data.correct_option}</p>
-                        <button class="btn btn-small" onclick="applyAISuggestion(${id}, '${data.correct_option}')" style="background: #ff9800; color: white;">
-                            Update answer to ${data.correct_option}
-                        </button>
-                    </div>
-                `;
-            }
-
-            feedbackDiv.innerHTML = html;
-            renderMath(); // Render LaTeX in explanation
+            renderAIVerdict(id, result.analysis);
+            renderMath(feedbackDiv); // Render LaTeX in explanation
         } else {
             feedbackDiv.innerHTML = `<p style="color: red;">Error: ${result.error}</p>`;
         }
@@ -324,9 +495,9 @@ async function applyAISuggestion(id, correctOption) {
     }
 }
 
-function renderMath() {
+function renderMath(element = document.body) {
     if (typeof renderMathInElement === 'function') {
-        renderMathInElement(document.body, {
+        renderMathInElement(element, {
             delimiters: [
                 {left: '$$', right: '$$', display: true},
                 {left: '$', right: '$', display: false},
@@ -398,6 +569,10 @@ async function approveSelected() {
         });
         
         const data = await response.json();
+        if (!response.ok) {
+            alert('❌ ' + data.error);
+            return;
+        }
         alert('✅ ' + data.message);
         
         selectedQuestions.clear();
@@ -443,18 +618,37 @@ async function rejectSelected() {
     const reason = prompt('Enter reason for rejection:');
     if (!reason) return;
     
-    for (const qId of selectedQuestions) {
-        await rejectQuestion(qId);
+    try {
+        const response = await fetch(`${API_URL}/admin/reject-bulk`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                question_ids: Array.from(selectedQuestions),
+                admin_user: 'admin',
+                reason: reason
+            })
+        });
+        
+        const data = await response.json();
+        if (!response.ok) {
+            alert('❌ ' + data.error);
+            return;
+        }
+        alert('✅ ' + data.message);
+        
+        selectedQuestions.clear();
+        loadStats();
+        loadPendingQuestions();
+    } catch (error) {
+        console.error('Error rejecting questions:', error);
+        alert('❌ Failed to reject questions');
     }
-    
-    selectedQuestions.clear();
 }
 
 function editQuestion(questionId) {
-    fetch(`${API_URL}/admin/pending-questions`)
-        .then(res => res.json())
-        .then(data => {
-            const question = data.pending_questions.find(q => q.id === questionId);
+    fetch(`${API_URL}/admin/questions/${questionId}`)
+        .then(res => res.ok ? res.json() : null)
+        .then(question => {
             if (!question) return;
             
             currentEditQuestionId = questionId;
@@ -503,6 +697,66 @@ async function saveEdit() {
     }
 }
 
+let searchTimer = null;
+let searchController = null;
+
+function scheduleSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(searchQuestions, 250);
+}
+
+async function searchQuestions() {
+    const query = document.getElementById('search-input').value.trim();
+    const resultsDiv = document.getElementById('search-results');
+    if (searchController) searchController.abort();
+    if (!query) {
+        resultsDiv.innerHTML = '';
+        return;
+    }
+
+    searchController = new AbortController();
+    const params = new URLSearchParams({ q: query, limit: 20 });
+    const subject = document.getElementById('subject-select').value;
+    if (subject) params.set('subject', subject);
+
+    try {
+        const response = await fetch(`${API_URL}/admin/search?${params}`, { signal: searchController.signal });
+        const data = await response.json();
+        if (!response.ok) {
+            resultsDiv.innerHTML = `<p style="color: #666;">${data.error}</p>`;
+            return;
+        }
+        if (data.count === 0) {
+            resultsDiv.innerHTML = '<p style="color: #666;">No matching questions.</p>';
+            return;
+        }
+        resultsDiv.innerHTML = (data.ranked ? '' : '<p style="color: #666;">Very common words: showing the newest matches. Add another word to rank by relevance.</p>') +
+            data.results.map(r => `
+            <div class="search-result">
+                <div class="question-meta">
+                    <span class="badge badge-subject">${r.subject}</span>
+                    <span class="badge" style="background: ${r.source === 'bank' ? '#27ae60' : '#f39c12'}; color: white;">
+                        ${r.source === 'bank' ? 'In question bank' : 'Pending review'}
+                    </span>
+                    ${r.chapter_name ? `<span class="badge" style="background: #667eea; color: white;">📖 ${r.chapter_name}</span>` : ''}
+                </div>
+                <div class="question-text">${r.highlight.question}</div>
+                <div style="color: #555; margin-top: 6px;">
+                    A. ${r.highlight.option_a} &nbsp; B. ${r.highlight.option_b} &nbsp;
+                    C. ${r.highlight.option_c} &nbsp; D. ${r.highlight.option_d}
+                    ${r.correct_option ? `&nbsp; <strong>(${r.correct_option})</strong>` : ''}
+                </div>
+                ${r.source === 'review' ? `<button class="btn btn-edit btn-small" style="margin-top: 8px;" onclick="editQuestion(${r.id})">✎ Edit</button>` : ''}
+            </div>
+        `).join('');
+        renderMath(resultsDiv);
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Search failed:', error);
+        }
+    }
+}
+
 function showGenerateModal() {
     document.getElementById('generate-modal').style.display = 'block';
 }
@@ -523,17 +777,24 @@ function showUploadModal() {
 
 function closeUploadModal() {
     document.getElementById('upload-modal').style.display = 'none';
+    clearTimeout(csvUploadTimer);
     document.getElementById('upload-status').innerHTML = '';
     const fileInput = document.getElementById('upload-csv-file');
     if (fileInput) fileInput.value = '';
 }
 
+function exportQuestions(dataset, format) {
+    window.location.href = `${API_URL}/admin/export/${dataset}?format=${format}`;
+}
+
+let csvUploadTimer = null;
+
 async function uploadCsvQuestions() {
     const fileInput = document.getElementById('upload-csv-file');
     const statusDiv = document.getElementById('upload-status');
 
     if (!fileInput || !fileInput.files || fileInput.files.length === 0) {
-        alert('Please select a CSV file to upload.');
+        alert('Please select a CSV or XLSX file to upload.');
         return;
     }
 
@@ -541,7 +802,7 @@ async function uploadCsvQuestions() {
     formData.append('file', fileInput.files[0]);
     formData.append('admin_user', 'admin');
 
-    statusDiv.innerHTML = '<p style="color: #667eea;">⏳ Uploading CSV...</p>';
+    statusDiv.innerHTML = '<p style="color: #667eea;">⏳ Uploading file...</p>';
 
     try {
         const response = await fetch(`${API_URL}/admin/upload-csv`, {
@@ -551,21 +812,17 @@ async function uploadCsvQuestions() {
 
         const data = await response.json();
 
-        if (response.ok) {
-            statusDiv.innerHTML = `
-                <p style="color: #27ae60;">✅ ${data.message}</p>
-                <p>${data.added_count} questions uploaded and are now <b>pending for review</b>. Please review and approve them to add to the question bank.</p>
-            `;
-
-            setTimeout(() => {
-                closeUploadModal();
-                loadStats();
-                loadPendingQuestions();
-                // Switch to pending tab automatically
-                document.querySelector('.tab-btn[onclick*="pending"]').click();
-            }, 2000);
+        if (response.status === 202) {
+            renderCsvUpload(data);
+            pollCsvUpload(data.job_id);
+        } else if (response.ok) {
+            renderCsvUpload(data);
+            finishCsvUpload(data);
         } else {
             statusDiv.innerHTML = `<p style="color: #ff6b6b;">❌ ${data.error}</p>`;
+            if (data.skipped_rows) {
+                statusDiv.innerHTML += renderSkippedRows(data);
+            }
         }
     } catch (error) {
         console.error('Error uploading CSV:', error);
@@ -573,32 +830,100 @@ async function uploadCsvQuestions() {
     }
 }
 
+function renderSkippedRows(job) {
+    const skipped = job.duplicates + job.invalid;
+    if (!skipped) {
+        return '';
+    }
+    const rows = job.skipped_rows.map(item => `<li>Row ${item.row}: ${item.reason}</li>`).join('');
+    const more = skipped > job.skipped_rows.length ? `<li>… and ${skipped - job.skipped_rows.length} more</li>` : '';
+    return `
+        <details style="margin-top: 10px;">
+            <summary>${job.duplicates} duplicate and ${job.invalid} invalid rows skipped</summary>
+            <ul style="max-height: 200px; overflow-y: auto;">${rows}${more}</ul>
+        </details>
+    `;
+}
+
+function renderCsvUpload(job) {
+    const statusDiv = document.getElementById('upload-status');
+    if (job.status === 'running') {
+        statusDiv.innerHTML = `
+            <p style="color: #667eea;">⏳ Processing upload: ${job.rows_read} rows read, ${job.inserted} added for review...</p>
+            ${renderSkippedRows(job)}
+        `;
+    } else if (job.status === 'failed') {
+        statusDiv.innerHTML = `
+            <p style="color: #ff6b6b;">❌ Upload stopped after ${job.rows_read} rows (${job.inserted} added): ${job.error}</p>
+            ${renderSkippedRows(job)}
+        `;
+    } else {
+        statusDiv.innerHTML = `
+            <p style="color: #27ae60;">✅ ${job.inserted} questions uploaded and are now <b>pending for review</b>. Please review and approve them to add to the question bank.</p>
+            ${renderSkippedRows(job)}
+        `;
+    }
+}
+
+function finishCsvUpload(job) {
+    loadStats();
+    loadPendingQuestions();
+    // Leave the report open when rows were skipped; otherwise go straight to review
+    if (job.status === 'completed' && !job.duplicates && !job.invalid) {
+        setTimeout(() => {
+            closeUploadModal();
+            document.querySelector('.tab-btn[onclick*="pending"]').click();
+        }, 2000);
+    }
+}
+
+function pollCsvUpload(jobId) {
+    clearTimeout(csvUploadTimer);
+    csvUploadTimer = setTimeout(async () => {
+        try {
+            const response = await fetch(`${API_URL}/admin/upload-csv/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error);
+            }
+            renderCsvUpload(job);
+            if (job.status === 'running') {
+                pollCsvUpload(jobId);
+            } else {
+                finishCsvUpload(job);
+            }
+        } catch (error) {
+            console.error('Error polling CSV upload:', error);
+            pollCsvUpload(jobId);
+        }
+    }, 2000);
+}
+
+let generationJobTimer = null;
+
 async function generateQuestions() {
     const subject = document.getElementById('generate-subject').value;
+    const count = parseInt(document.getElementById('generate-count').value, 10) || 20;
+    const chapters = document.getElementById('generate-chapters').value
+        .split(',')
+        .map(chapter => chapter.trim())
+        .filter(chapter => chapter);
     const statusDiv = document.getElementById('generate-status');
     
-    statusDiv.innerHTML = '<p style="color: #667eea;">⏳ Generating questions... This may take up to 60 seconds.</p>';
+    statusDiv.innerHTML = '<p style="color: #667eea;">⏳ Queuing generation job...</p>';
     
     try {
-        const response = await fetch(`${API_URL}/admin/generate/${subject}`, {
-            method: 'POST'
+        const response = await fetch(`${API_URL}/admin/generate-jobs`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ subject, count, chapters, admin_user: 'admin' })
         });
         
         const data = await response.json();
         
         if (response.ok) {
-            statusDiv.innerHTML = `
-                <p style="color: #27ae60;">✅ ${data.message}</p>
-                <p>Generated ${data.question_count} questions for review.</p>
-            `;
-            
-            setTimeout(() => {
-                closeGenerateModal();
-                loadStats();
-                loadPendingQuestions();
-                // Switch to pending tab automatically
-                document.querySelector('.tab-btn[onclick*="pending"]').click();
-            }, 2000);
+            renderGenerationJob(data);
+            pollGenerationJob(data.job_id);
         } else {
             statusDiv.innerHTML = `<p style="color: #ff6b6b;">❌ ${data.error}</p>`;
         }
@@ -608,6 +933,59 @@ async function generateQuestions() {
     }
 }
 
+function renderGenerationJob(job) {
+    const statusDiv = document.getElementById('generate-status');
+    const percent = job.requested ? Math.round((job.saved / job.requested) * 100) : 0;
+    const active = job.status === 'queued' || job.status === 'running';
+    const colors = { completed: '#27ae60', failed: '#ff6b6b', cancelled: '#f39c12' };
+    
+    statusDiv.innerHTML = `
+        <p style="color: ${colors[job.status] || '#667eea'};">
+            ${job.status === 'completed' ? '✅' : active ? '⏳' : '⏹️'}
+            ${job.subject}: ${job.saved}/${job.requested} questions saved for review (${job.status})
+        </p>
+        <div style="background: #eee; border-radius: 4px; height: 8px;">
+            <div style="background: #667eea; width: ${percent}%; height: 8px; border-radius: 4px;"></div>
+        </div>
+        ${job.error ? `<p style="color: #ff6b6b;">${job.error}</p>` : ''}
+        ${active ? `<button class="btn btn-secondary" style="margin-top: 10px;" onclick="cancelGenerationJob('${job.job_id}')">Cancel</button>` : ''}
+    `;
+}
+
+function pollGenerationJob(jobId) {
+    clearTimeout(generationJobTimer);
+    generationJobTimer = setTimeout(async () => {
+        try {
+            const response = await fetch(`${API_URL}/admin/generate-jobs/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error);
+            }
+            renderGenerationJob(job);
+            if (job.status === 'queued' || job.status === 'running' || job.status === 'cancelling') {
+                pollGenerationJob(jobId);
+            } else {
+                loadStats();
+                loadPendingQuestions();
+            }
+        } catch (error) {
+            console.error('Error polling generation job:', error);
+            pollGenerationJob(jobId);
+        }
+    }, 2000);
+}
+
+async function cancelGenerationJob(jobId) {
+    try {
+        const response = await fetch(`${API_URL}/admin/generate-jobs/${jobId}/cancel`, { method: 'POST' });
+        const data = await response.json();
+        renderGenerationJob(response.ok ? data : data.job);
+    } catch (error) {
+        console.error('Error cancelling generation job:', error);
+        alert('❌ Failed to cancel the job');
+    }
+}
+
 function switchTab(tab) {
     document.querySelectorAll('.tab-btn').forEach(btn => btn.classList.remove('active'));
     event.target.classList.add('active');
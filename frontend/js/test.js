@@ -14,6 +14,8 @@ let questions = [];
 let currentPageIndex = 0;
 const QUESTIONS_PER_PAGE = 5;
 let userAnswers = [];
+// Question total announced by the AI stream (0 when not streaming)
+let streamingExpected = 0;
 
 window.onload = function() {
     console.log('=== TEST PAGE LOADED ===');
@@ -71,6 +73,10 @@ async function loadQuestions() {
         if (source !== 'genai' && userId) {
             apiUrl = `${apiUrl}?user_id=${encodeURIComponent(userId)}`;
         }
+        if (source === 'genai' && typeof EventSource !== 'undefined') {
+            streamAiQuestions(loadingElement);
+            return;
+        }
         if (source === 'genai') {
             apiUrl = `${API_URL}/questions/ai-live/${currentSubject}`;
             loadingElement.innerHTML = `
@@ -167,18 +173,128 @@ async function loadQuestions() {
     }
 }
 
-function displayQuestionsPage() {
+function streamAiQuestions(loadingElement) {
+    loadingElement.innerHTML = `
+        <div style="text-align: center;">
+            <div class="spinner-small" style="width: 40px; height: 40px; margin-bottom: 15px;"></div>
+            <p>🤖 AI is generating fresh questions for you...</p>
+            <p style="font-size: 0.8em; color: #666;">The first question appears in a few seconds</p>
+        </div>
+    `;
+
+    const streamUrl = `${API_URL}/questions/ai-stream/${encodeURIComponent(currentSubject)}`;
+    console.log('🔍 Streaming from:', streamUrl);
+    const source = new EventSource(streamUrl);
+    questions = [];
+    userAnswers = [];
+
+    const finishStream = () => {
+        source.close();
+        streamingExpected = 0;
+        if (questions.length > 0) {
+            displayQuestionsPage(false);
+        }
+    };
+
+    const failStream = (message) => {
+        finishStream();
+        if (questions.length === 0) {
+            alert(message || 'AI generation is unavailable right now. Please try again later or use Question Bank mode.');
+            window.location.href = 'index.html';
+        } else {
+            console.warn(`⚠️ Stream ended early with ${questions.length} questions:`, message);
+        }
+    };
+
+    source.addEventListener('meta', (event) => {
+        const meta = JSON.parse(event.data);
+        streamingExpected = meta.expected || 0;
+        console.log('📡 Stream started:', meta);
+    });
+
+    source.addEventListener('question', (event) => {
+        const question = JSON.parse(event.data);
+        questions.push(question);
+        userAnswers.push(null);
+
+        if (questions.length === 1) {
+            loadingElement.style.display = 'none';
+            document.getElementById('test-container').style.display = 'block';
+            sessionStorage.setItem('testStartTime', Date.now());
+            displayQuestionsPage();
+            return;
+        }
+
+        // Only redraw when the new question lands on the page being viewed
+        const pageStart = currentPageIndex * QUESTIONS_PER_PAGE;
+        if (questions.length - 1 < pageStart + QUESTIONS_PER_PAGE) {
+            displayQuestionsPage(false);
+        } else {
+            updatePageNavigation();
+        }
+    });
+
+    source.addEventListener('done', (event) => {
+        console.log('✅ Stream finished:', JSON.parse(event.data));
+        if (questions.length === 0) {
+            failStream('No questions available for this subject.');
+            return;
+        }
+        finishStream();
+    });
+
+    source.addEventListener('failed', (event) => {
+        const data = JSON.parse(event.data);
+        console.error('❌ Stream error:', data.error);
+        failStream(data.is_quota_error || data.retry_after ? data.error : null);
+    });
+
+    // Connection-level errors; close so EventSource does not reconnect and regenerate
+    source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) {
+            failStream(null);
+        }
+    };
+}
+
+function totalQuestionSlots() {
+    return Math.max(questions.length, streamingExpected);
+}
+
+function updatePageNavigation() {
+    const startIndex = currentPageIndex * QUESTIONS_PER_PAGE;
+    const endIndex = Math.min(startIndex + QUESTIONS_PER_PAGE, questions.length);
+    const total = totalQuestionSlots();
+
+    // Update counter: "Questions 1-5 of 20"
+    document.getElementById('question-counter').textContent = 
+        `Questions ${startIndex + 1}-${endIndex} of ${total}`;
+
+    document.getElementById('prev-btn').disabled = currentPageIndex === 0;
+
+    const totalPages = Math.ceil(total / QUESTIONS_PER_PAGE);
+    const nextBtn = document.getElementById('next-btn');
+    const submitBtn = document.getElementById('submit-btn');
+    if (currentPageIndex === totalPages - 1) {
+        nextBtn.style.display = 'none';
+        submitBtn.style.display = 'block';
+        submitBtn.disabled = streamingExpected > 0;
+    } else {
+        nextBtn.style.display = 'block';
+        submitBtn.style.display = 'none';
+        // The next page may still be generating
+        nextBtn.disabled = (currentPageIndex + 1) * QUESTIONS_PER_PAGE >= questions.length;
+    }
+}
+
+function displayQuestionsPage(scrollToTop = true) {
     const questionsContainer = document.getElementById('questions-page-container');
     questionsContainer.innerHTML = '';
     
     const startIndex = currentPageIndex * QUESTIONS_PER_PAGE;
     const endIndex = Math.min(startIndex + QUESTIONS_PER_PAGE, questions.length);
     
-    // Update counter: "Questions 1-5 of 20"
-    document.getElementById('question-counter').textContent = 
-        `Questions ${startIndex + 1}-${endIndex} of ${questions.length}`;
-    
-    const progressPercent = (endIndex / questions.length) * 100;
+    const progressPercent = (endIndex / totalQuestionSlots()) * 100;
     document.getElementById('progress').style.width = `${progressPercent}%`;
     
     for (let i = startIndex; i < endIndex; i++) {
@@ -223,20 +339,21 @@ function displayQuestionsPage() {
         `;
         questionsContainer.appendChild(questionDiv);
     }
+
+    const pageEnd = Math.min(startIndex + QUESTIONS_PER_PAGE, totalQuestionSlots());
+    if (endIndex < pageEnd) {
+        const pendingDiv = document.createElement('div');
+        pendingDiv.className = 'question-card';
+        pendingDiv.innerHTML = `<p style="color: #666;">⏳ Generating question ${endIndex + 1}...</p>`;
+        questionsContainer.appendChild(pendingDiv);
+    }
     
     // Smooth scroll to top when page changes
-    window.scrollTo({ top: 0, behavior: 'smooth' });
-    
-    document.getElementById('prev-btn').disabled = currentPageIndex === 0;
-    
-    const totalPages = Math.ceil(questions.length / QUESTIONS_PER_PAGE);
-    if (currentPageIndex === totalPages - 1) {
-        document.getElementById('next-btn').style.display = 'none';
-        document.getElementById('submit-btn').style.display = 'block';
-    } else {
-        document.getElementById('next-btn').style.display = 'block';
-        document.getElementById('submit-btn').style.display = 'none';
+    if (scrollToTop) {
+        window.scrollTo({ top: 0, behavior: 'smooth' });
     }
+    
+    updatePageNavigation();
 
     renderMath();
 }
@@ -298,8 +415,8 @@ function selectOption(questionIndex, optionLetter) {
 }
 
 function nextQuestion() {
-    const totalPages = Math.ceil(questions.length / QUESTIONS_PER_PAGE);
-    if (currentPageIndex < totalPages - 1) {
+    // Only move on once the next page has at least one question (streams fill it in later)
+    if ((currentPageIndex + 1) * QUESTIONS_PER_PAGE < questions.length) {
         currentPageIndex++;
         displayQuestionsPage();
     }